@@ -0,0 +1,537 @@
+'''Description: This file contains benchmarks for the scraper's components.  Run it with the name of a benchmark,
+e.g. `python benchmark.py sinks --rows 200000`.  The scrape benchmark runs the scrapers end to end against a local
+stand-in for IMDb, so it needs no network.'''
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import redirect_stdout
+import glob
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import importlib.util
+import json
+import multiprocessing
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zlib
+from bs4 import BeautifulSoup
+import extract
+from fetchers import CAST_SELECTOR, STAR_SELECTOR, STRAINERS
+from parsing import PARSERS, select_fragment, soup_parser
+from sinks import SINKS
+
+# The saved pages the parsing benchmarks run against.
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# The module each parser backend needs.
+PARSER_MODULES = {'html.parser': 'html.parser', 'lxml': 'lxml', 'html5lib': 'html5lib', 'selectolax': 'selectolax'}
+
+# The ids of the title and the stars in the recorded title page, which the stand-in swaps for the requested ones.
+RECORDED_TCONST = 'tt0111161'
+RECORDED_STARS = ('nm0000209', 'nm0000151', 'nm0348409')
+
+
+def synthetic_rows(count: int):
+    """
+    Generates cast rows shaped like the ones StarScraper produces.
+
+    Args:
+        count (int): The number of rows to generate.
+
+    Yields:
+        dict: A cast row.
+    """
+    for i in range(count):
+        nconst = f'nm{i % 50000:07d}'
+        yield {
+            'tconst': f'tt{i // 4:07d}',
+            'actor': f'Actor Number {i % 50000}',
+            'nconst': nconst,
+            'url': f'https://www.imdb.com/name/{nconst}/',
+            'rating': i % 100000 + 1,
+            'ratingChange': (i % 2001) - 1000,
+        }
+
+
+def bench_sinks(args: argparse.Namespace) -> None:
+    """
+    Compares the write throughput of each sink, writing the same rows one at a time.
+    """
+    print(f'{"format":<10}{"rows":>10}{"seconds":>10}{"rows/s":>12}{"MiB":>8}')
+
+    with tempfile.TemporaryDirectory() as directory:
+        # .arrow and .feather share a sink, so we'll only time it once.
+        for sink_class, extension in {sink_class: extension for extension, sink_class in SINKS.items()}.items():
+            # Excel caps a sheet at 1,048,576 rows.
+            rows = min(args.rows, 1_048_575) if extension == '.xlsx' else args.rows
+            filename = os.path.join(directory, f'bench{extension}')
+
+            start = time.perf_counter()
+            with sink_class(filename) as sink:
+                sink.write_rows(synthetic_rows(rows))
+            elapsed = time.perf_counter() - start
+
+            size = os.path.getsize(filename) / 2**20
+            print(f'{extension[1:]:<10}{rows:>10}{elapsed:>10.2f}{rows / elapsed:>12.0f}{size:>8.1f}')
+
+
+def page_selector(path: str) -> str:
+    """
+    Chooses the fragment to look for in a saved page from its file name: title pages are named title*.html or
+    tt*.html, and anything else is treated as a name page.
+    """
+    name = os.path.basename(path)
+    return CAST_SELECTOR if name.startswith(('title', 'tt')) else STAR_SELECTOR
+
+
+def measure(function, repeat: int) -> tuple:
+    """
+    Times a function over several calls and records the peak memory allocated by one call.
+
+    Returns:
+        tuple: The mean seconds per call and the peak MiB allocated.
+    """
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat, peak
+
+
+def bench_parse(args: argparse.Namespace) -> None:
+    """
+    Compares, for each parser backend, the time and peak memory of building a full soup of each saved page against
+    locating only the fragment StarScraper needs, and against reading its fields from the page data.
+    """
+    pages = {path: open(path, encoding='utf-8').read() for path in sorted(glob.glob(os.path.join(args.pages, '*.html')))}
+    print(f'{"page":<16}{"parser":<13}{"mode":<10}{"ms/page":>10}{"peak MiB":>10}')
+
+    for parser in PARSERS:
+        if importlib.util.find_spec(PARSER_MODULES[parser]) is None:
+            print(f'{parser} is not installed; skipping.')
+            continue
+
+        for path, html in pages.items():
+            selector = page_selector(path)
+            modes = {'fragment': lambda: select_fragment(html, selector, parser, STRAINERS[selector])}
+
+            # selectolax doesn't build soups, so there's no full parse to compare against.
+            if parser != 'selectolax':
+                modes['full'] = lambda: BeautifulSoup(html, soup_parser(parser))
+
+            for mode, function in modes.items():
+                seconds, peak = measure(function, args.repeat)
+                print(f'{os.path.basename(path):<16}{parser:<13}{mode:<10}{seconds * 1000:>10.1f}{peak:>10.1f}')
+
+    # The page data path doesn't use a parser backend: the script is found by a regular expression and the JSON
+    # parsed by orjson, if it's installed, or by json.
+    decoder = 'orjson' if extract.loads is not json.loads else 'json'
+    for path, html in pages.items():
+        fields = extract.title_cast if page_selector(path) == CAST_SELECTOR else extract.star_meter
+        seconds, peak = measure(lambda: fields(extract.next_data(html)), args.repeat)
+        print(f'{os.path.basename(path):<16}{decoder:<13}{"json":<10}{seconds * 1000:>10.1f}{peak:>10.1f}')
+
+
+class StandInServer(ThreadingHTTPServer):
+    '''
+    Description: This class serves the recorded title and name pages in place of IMDb, with injected latency and
+    errors.  Each title gets a different cast, drawn from a fixed number of people, so the person index is exercised
+    the way a real title list exercises it.
+    '''
+    daemon_threads = True
+
+    def __init__(self, pages: str=FIXTURES, latency: float=0.05, jitter: float=0.5, error_rate: float=0.0,
+                 persons: int=1000, port: int=0) -> None:
+        """
+        Initializes the StandInServer object, listening on localhost.
+
+        Args:
+            pages (str, optional): The directory holding title.html and name.html. Defaults to FIXTURES.
+            latency (float, optional): The mean seconds each response is delayed by. Defaults to 0.05.
+            jitter (float, optional): The fraction the delay varies by either side of the mean. Defaults to 0.5.
+            error_rate (float, optional): The fraction of requests answered with a 500 or a 503. Defaults to 0.0.
+            persons (int, optional): The number of distinct people the casts are drawn from. Defaults to 1000.
+            port (int, optional): The port to listen on. Defaults to 0 (any free port).
+
+        Attributes:
+            site (str): The URL to pass as the scrapers' site.
+            title (str): The recorded title page.
+            name (str): The recorded name page.
+            requests (int): The number of requests received.
+            errors (int): The number of errors injected.
+        """
+        super().__init__(('127.0.0.1', port), StandInHandler)
+        self.site = f'http://127.0.0.1:{self.server_port}'
+        self.title = open(os.path.join(pages, 'title.html'), encoding='utf-8').read()
+        self.name = open(os.path.join(pages, 'name.html'), encoding='utf-8').read()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.persons = persons
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+
+    def page(self, path: str) -> str:
+        """
+        Renders the page at a path.
+
+        Args:
+            path (str): The requested path, e.g. /title/tt0000042/.
+
+        Returns:
+            str: The page, or None if the path isn't a title or name page.
+        """
+        if match := re.match(r'/title/tt(\d+)', path):
+            number = int(match[1])
+            page = self.title.replace(RECORDED_TCONST, f'tt{number:07d}')
+            for i, nconst in enumerate(RECORDED_STARS):
+                page = page.replace(nconst, f'nm{(number * len(RECORDED_STARS) + i) % self.persons:07d}')
+            return page
+
+        if path.startswith('/name/nm'):
+            return self.name
+
+        return None
+
+
+    def start(self) -> 'StandInServer':
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    # Keep connections alive, as IMDb does, so the HTTP fetcher's connection pool is measured too.
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self) -> None:
+        server = self.server
+        with server._lock:
+            server.requests += 1
+            fail = random.random() < server.error_rate
+            server.errors += fail
+
+        time.sleep(max(0.0, server.latency * (1 + server.jitter * (2 * random.random() - 1))))
+
+        if fail:
+            self.send_response(random.choice((500, 503)))
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if (page := server.page(self.path)) is None:
+            self.send_error(404)
+            return
+
+        # Pages carry an ETag, as a server supporting conditional requests would send, so refreshes can revalidate.
+        body = page.encode()
+        etag = f'"{zlib.crc32(body):08x}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def peak_rss() -> tuple:
+    """
+    Reads the peak resident set size of this process and of its largest finished child (a browser, once its pool
+    has been closed).
+
+    Returns:
+        tuple: The two peaks in MiB.
+    """
+    # ru_maxrss is in KiB on Linux but in bytes on macOS.
+    unit = 1 if sys.platform == 'darwin' else 1024
+    return tuple(resource.getrusage(who).ru_maxrss * unit / 2**20
+                 for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN))
+
+
+def fast_retries() -> object:
+    """
+    Builds a retry policy with the default attempts but millisecond backoffs, so that injected errors cost retries
+    rather than sleeps.
+    """
+    from retry import DEFAULT_RULES, RetryPolicy, RetryRule
+
+    return RetryPolicy({cls: RetryRule(rule.attempts, rule.base / 1000, rule.cap / 1000)
+                        for cls, rule in DEFAULT_RULES.items()})
+
+
+def run_star(site: str, mode: str, workers: int, titles: int, extractor: str='json') -> dict:
+    """
+    Runs StarScraper over a generated title list.  It's run in a fresh process, so its peak RSS is its own.
+
+    Returns:
+        dict: The pages fetched, seconds taken, page latency quantiles (make_data for the json extractor,
+        make_soup for the dom one), failures and peak RSS.
+    """
+    from journal import Journal
+    from metrics import Metrics
+    from retry import DeadLetterQueue
+    from scrapers import StarScraper
+    from throttle import HostScheduler
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'titles.csv')
+        with open(filename, 'w') as file:
+            file.write('tconst\n' + ''.join(f'tt{i:07d}\n' for i in range(titles)))
+
+        metrics = Metrics()
+        # The stand-in is local, so the scheduler shouldn't hold the run back.
+        scraper = StarScraper(filename, workers=workers, fetch_mode=mode, batch_size=max(4, workers),
+                              journal=Journal(os.path.join(directory, 'journal.jsonl')),
+                              failures=DeadLetterQueue(), metrics=metrics, site=site,
+                              scheduler=HostScheduler(rate=10_000, max_rate=10_000, burst=1_000),
+                              retry_policy=fast_retries(), extractor=extractor)
+
+        start = time.perf_counter()
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            scraper.scrape_star_data()
+        elapsed = time.perf_counter() - start
+
+        scraper.journal.close()
+        scraper.pool.close()
+
+    # Each extractor times its page fetches under its own span: make_data reads the page data, make_soup the DOM.
+    histogram = metrics.histograms['make_data' if extractor == 'json' else 'make_soup']
+    return {'pages': histogram.count, 'seconds': elapsed, 'p50': histogram.quantile(0.5),
+            'p99': histogram.quantile(0.99), 'failures': len(scraper.failures), 'rss': peak_rss()}
+
+
+def run_dumb(site: str, mode: str, workers: int, titles: int, extractor: str=None) -> dict:
+    """
+    Runs DumbScraper over the title pages, `workers` at a time, extracting the title and the span text of each.
+    DumbScraper always fetches over plain HTTP and reads the DOM, so the mode and extractor are ignored.
+
+    Returns:
+        dict: The same measurements as run_star.
+    """
+    from metrics import Metrics
+    from scrapers import DumbScraper
+
+    metrics = Metrics()
+
+    def scrape(url: str) -> None:
+        with metrics.span('page'):
+            # DumbScraper doesn't check the response status, so an injected error surfaces when it's extracted from.
+            try:
+                scraper = DumbScraper(url)
+                scraper.get_title()
+                scraper.get_span_text()
+            except Exception:
+                metrics.incr('failures')
+
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull), ThreadPoolExecutor(workers) as executor:
+        list(executor.map(scrape, (f'{site}/title/tt{i:07d}/' for i in range(titles))))
+    elapsed = time.perf_counter() - start
+
+    histogram = metrics.histograms['page']
+    return {'pages': histogram.count, 'seconds': elapsed, 'p50': histogram.quantile(0.5),
+            'p99': histogram.quantile(0.99), 'failures': metrics.counters['failures'], 'rss': peak_rss()}
+
+
+def bench_scrape(args: argparse.Namespace) -> None:
+    """
+    Runs the scrapers end to end against the stand-in server, once per scraper, fetch mode, extractor and
+    concurrency level, each run in a process of its own.
+    """
+    server = StandInServer(args.pages, args.latency / 1000, args.jitter, args.error_rate, args.persons).start()
+    runs = {'star': run_star, 'dumb': run_dumb}
+    results = []
+
+    print(f'{"scraper":<8}{"mode":<9}{"extract":<9}{"workers":>8}{"pages":>7}{"pages/s":>9}{"p50 ms":>9}{"p99 ms":>9}'
+          f'{"RSS MiB":>9}{"child MiB":>10}{"failed":>7}')
+
+    # Spawned, rather than forked, processes start with nothing allocated, so each run's peak RSS is its own.
+    context = multiprocessing.get_context('spawn')
+
+    for scraper in args.scrapers.split(','):
+        for mode in args.modes.split(',') if scraper == 'star' else ['http']:
+            for extractor in args.extractors.split(',') if scraper == 'star' else ['dom']:
+                for workers in map(int, args.concurrency.split(',')):
+                    with ProcessPoolExecutor(1, mp_context=context) as executor:
+                        try:
+                            result = executor.submit(runs[scraper], server.site, mode, workers, args.titles,
+                                                     extractor).result()
+                        except Exception as e:
+                            # A browser mode fails here on a machine without a browser; the other runs can go on.
+                            print(f'{scraper:<8}{mode:<9}{extractor:<9}{workers:>8}  failed: {type(e).__name__}: {e}')
+                            continue
+
+                    result.update(scraper=scraper, mode=mode, extractor=extractor, workers=workers,
+                                  rate=result['pages'] / result['seconds'])
+                    results.append(result)
+                    print(f'{scraper:<8}{mode:<9}{extractor:<9}{workers:>8}{result["pages"]:>7}{result["rate"]:>9.1f}'
+                          f'{result["p50"] * 1000:>9.1f}{result["p99"] * 1000:>9.1f}'
+                          f'{result["rss"][0]:>9.1f}{result["rss"][1]:>10.1f}{result["failures"]:>7}')
+
+    server.shutdown()
+    print(f'{server.requests} requests served, {server.errors} errors injected.')
+
+    if args.out is not None:
+        with open(args.out, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+    # In CI, compare against the results of a known good run and fail the build if anything got slower.
+    if args.baseline is not None:
+        with open(args.baseline, encoding='utf-8') as file:
+            found = regressions(results, json.load(file), args.tolerance)
+
+        for regression in found:
+            print(f'Regression: {regression}')
+
+        if found:
+            raise SystemExit(f'{len(found)} regressions past the {args.tolerance:.0%} tolerance.')
+        print(f'No regressions past the {args.tolerance:.0%} tolerance.')
+
+
+def run_key(result: dict) -> tuple:
+    # The runs of two benchmarks are compared when they ran the same scraper the same way.
+    return result['scraper'], result['mode'], result.get('extractor', 'dom'), result['workers']
+
+
+def regressions(results: list, baseline: list, tolerance: float) -> list:
+    """
+    Compares the runs of a benchmark with those of a baseline, e.g. the --out of the main branch.
+
+    Args:
+        results (list): The results of this benchmark.
+        baseline (list): The results of the baseline.
+        tolerance (float): The fraction pages/s may fall, or p99 latency rise, by before it's a regression.
+
+    Returns:
+        list: A description of each regression; a run of the baseline that didn't complete this time is one too.
+    """
+    found = []
+    runs = {run_key(result): result for result in results}
+
+    for before in baseline:
+        name = ' '.join(map(str, run_key(before)))
+
+        if (after := runs.get(run_key(before))) is None:
+            found.append(f'{name}: failed, or wasn\'t run')
+            continue
+
+        if after['rate'] < before['rate'] * (1 - tolerance):
+            found.append(f'{name}: {after["rate"]:.1f} pages/s, down from {before["rate"]:.1f}')
+        if after['p99'] > before['p99'] * (1 + tolerance):
+            found.append(f'{name}: p99 {after["p99"] * 1000:.1f} ms, up from {before["p99"] * 1000:.1f} ms')
+
+    return found
+
+
+def bench_browser(args: argparse.Namespace) -> None:
+    """
+    Compares browser profiles on the same pages: the seconds, requests and bytes each page costs to load until the
+    fragment appears, and what each profile saves against the first.  Pages come from the stand-in unless a site is
+    given; only a real site shows the full saving, since the recorded pages load few resources of their own.
+    """
+    from drivers import WebDriverPool, get_profile
+    from fetchers import BrowserFetcher
+    from metrics import Metrics
+
+    server = StandInServer(args.pages).start() if args.site is None else None
+    site = args.site if args.site is not None else server.site
+    urls = [f'{site}/name/nm{i:07d}/' for i in range(args.count)]
+    baseline = None
+
+    print(f'{"profile":<10}{"s/page":>9}{"requests":>10}{"KiB/page":>10}{"time saved":>12}{"KiB saved":>11}')
+
+    for name in args.profiles.split(','):
+        metrics = Metrics()
+        pool = WebDriverPool(get_profile(name).factory())
+        fetcher = BrowserFetcher(pool, metrics=metrics)
+
+        try:
+            # The first page also pays for the browser starting, so it isn't counted.
+            fetcher.fetch(urls[0], STAR_SELECTOR)
+            metrics = fetcher.metrics = Metrics()
+            for url in urls[1:]:
+                with metrics.span('page'):
+                    fetcher.fetch(url, STAR_SELECTOR)
+        except Exception as e:
+            print(f'{name:<10}failed: {type(e).__name__}: {e}')
+            continue
+        finally:
+            pool.close()
+
+        pages = metrics.histograms['page'].count
+        seconds = metrics.histograms['page'].sum / pages
+        kib = metrics.counters['browser.bytes'] / pages / 1024
+        baseline = baseline or (seconds, kib)
+        print(f'{name:<10}{seconds:>9.2f}{metrics.counters["browser.requests"] / pages:>10.1f}{kib:>10.1f}'
+              f'{baseline[0] - seconds:>12.2f}{baseline[1] - kib:>11.1f}')
+
+    if server is not None:
+        server.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    benchmarks = parser.add_subparsers(dest='benchmark', required=True)
+
+    sinks = benchmarks.add_parser('sinks', help='compare the write throughput of the output sinks')
+    sinks.add_argument('--rows', type=int, default=100_000, help='the number of rows to write')
+    sinks.set_defaults(run=bench_sinks)
+
+    parse = benchmarks.add_parser('parse', help='compare the parser backends on saved pages')
+    parse.add_argument('--pages', default=FIXTURES, help='the directory of saved title*.html and name*.html pages')
+    parse.add_argument('--repeat', type=int, default=5, help='the number of times to parse each page')
+    parse.set_defaults(run=bench_parse)
+
+    scrape = benchmarks.add_parser('scrape', help='run the scrapers end to end against a local stand-in for IMDb')
+    scrape.add_argument('--pages', default=FIXTURES, help='the directory holding the recorded title.html and name.html')
+    scrape.add_argument('--scrapers', default='star,dumb', help='the scrapers to run, comma-separated')
+    scrape.add_argument('--modes', default='http,auto', help='the fetch modes to run StarScraper in, comma-separated')
+    scrape.add_argument('--extractors', default='json,dom',
+                        help='the extractors to run StarScraper with, comma-separated')
+    scrape.add_argument('--concurrency', default='1,4,8', help='the worker counts to run at, comma-separated')
+    scrape.add_argument('--titles', type=int, default=50, help='the number of titles to scrape per run')
+    scrape.add_argument('--persons', type=int, default=1000, help='the number of distinct people casts are drawn from')
+    scrape.add_argument('--latency', type=float, default=50, help='the mean response latency in milliseconds')
+    scrape.add_argument('--jitter', type=float, default=0.5, help='the fraction the latency varies either side')
+    scrape.add_argument('--error-rate', type=float, default=0.0, help='the fraction of requests answered with 5xx')
+    scrape.add_argument('--out', help='a JSON file to write the results to, for comparing runs')
+    scrape.add_argument('--baseline', help="a JSON file of earlier results (another run's --out) to compare against; "
+                                           'exits non-zero if a run regressed')
+    scrape.add_argument('--tolerance', type=float, default=0.2,
+                        help='with --baseline, the fraction pages/s may fall or p99 latency rise by')
+    scrape.set_defaults(run=bench_scrape)
+
+    browser = benchmarks.add_parser('browser', help='compare the time and bandwidth of the browser profiles')
+    browser.add_argument('--profiles', default='default,lean', help='the profiles to compare, comma-separated')
+    browser.add_argument('--count', type=int, default=10, help='the number of name pages to load per profile')
+    browser.add_argument('--site', help='the site to load pages from, e.g. https://www.imdb.com (default: the stand-in)')
+    browser.add_argument('--pages', default=FIXTURES, help='the directory holding the recorded name.html')
+    browser.set_defaults(run=bench_browser)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+# Call the main function
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+'''Description: This file creates a ResponseCache class that persists fetched HTML to an SQLite database so that
+re-runs don't have to fetch the same pages again.'''
+import hashlib
+import sqlite3
+import threading
+import time
+import zlib
+
+
+class ResponseCache:
+    '''
+    Description: This class stores compressed HTML keyed by URL and selector, with a time-to-live per entry and a
+    total size cap enforced by evicting the least recently used entries.  Entries stored with an ETag or
+    Last-Modified validator are kept after they expire, so that they can be revalidated with a conditional request.
+    '''
+    def __init__(self, path: str='.scraper_cache.sqlite', ttl: float=7 * 24 * 3600,
+                 max_bytes: int=512 * 1024 * 1024) -> None:
+        """
+        Initializes the ResponseCache object.
+
+        Args:
+            path (str, optional): The SQLite database file. Defaults to '.scraper_cache.sqlite'.
+            ttl (float, optional): The default number of seconds an entry stays fresh. None keeps entries until
+                they are evicted. Defaults to one week.
+            max_bytes (int, optional): The maximum total size of the compressed entries. Defaults to 512 MiB.
+
+        Attributes:
+            path (str): The SQLite database file.
+            ttl (float): The default number of seconds an entry stays fresh.
+            max_bytes (int): The maximum total size of the compressed entries.
+            hits (int): The number of lookups answered from the cache.
+            misses (int): The number of lookups that found no fresh entry.
+            evictions (int): The number of entries evicted to stay under max_bytes.
+            size (int): The current total size of the compressed entries.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        # The connection is shared by the fetch workers; the lock above serializes access to it.
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'key TEXT PRIMARY KEY, url TEXT, selector TEXT, body BLOB, '
+            'size INTEGER, expires REAL, accessed REAL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+
+        # Caches created before validators were stored lack their columns.
+        columns = {row[1] for row in self._db.execute('PRAGMA table_info(entries)')}
+        for column in ('etag', 'modified'):
+            if column not in columns:
+                self._db.execute(f'ALTER TABLE entries ADD COLUMN {column} TEXT')
+
+        self.size = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+
+    @staticmethod
+    def key(url: str, selector: str) -> str:
+        """
+        Computes the cache key for a URL and selector.
+
+        Args:
+            url (str): The URL of the web page.
+            selector (str): The CSS selector of the fragment, or '' for the whole page.
+
+        Returns:
+            str: The hex digest identifying the entry.
+        """
+        return hashlib.sha256(f'{url}\0{selector}'.encode()).hexdigest()
+
+
+    def get(self, url: str, selector: str='') -> str:
+        """
+        Looks up a fresh entry.
+
+        Args:
+            url (str): The URL of the web page.
+            selector (str, optional): The CSS selector of the fragment, or '' for the whole page. Defaults to ''.
+
+        Returns:
+            str: The cached HTML, or None if there is no fresh entry.
+        """
+        key = self.key(url, selector)
+        now = time.time()
+
+        with self._lock:
+            row = self._db.execute(
+                'SELECT body, size, expires, etag, modified FROM entries WHERE key = ?', (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            body, size, expires, etag, modified = row
+
+            # Stale entries are dropped on sight so they don't count against the size cap, unless they can be
+            # revalidated.
+            if expires is not None and expires < now:
+                if etag is None and modified is None:
+                    self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+                    self.size -= size
+                self.misses += 1
+                return None
+
+            self._db.execute('UPDATE entries SET accessed = ? WHERE key = ?', (now, key))
+            self.hits += 1
+
+        return zlib.decompress(body).decode()
+
+
+    def validators(self, url: str, selector: str='') -> tuple:
+        """
+        Looks up the validators of an entry, fresh or stale, to make a conditional request with.
+
+        Args:
+            url (str): The URL of the web page.
+            selector (str, optional): The CSS selector of the fragment, or '' for the whole page. Defaults to ''.
+
+        Returns:
+            tuple: The entry's ETag, its Last-Modified date and its HTML, or None if it has no validators.
+        """
+        with self._lock:
+            row = self._db.execute(
+                'SELECT etag, modified, body FROM entries WHERE key = ?', (self.key(url, selector),)
+            ).fetchone()
+
+        if row is None or (row[0] is None and row[1] is None):
+            return None
+
+        return row[0], row[1], zlib.decompress(row[2]).decode()
+
+
+    def put(self, url: str, selector: str, html: str, ttl: float=None, etag: str=None, modified: str=None) -> None:
+        """
+        Stores an entry, evicting the least recently used entries if the cache grows past max_bytes.
+
+        Args:
+            url (str): The URL of the web page.
+            selector (str): The CSS selector of the fragment, or '' for the whole page.
+            html (str): The HTML to store.
+            ttl (float, optional): The number of seconds the entry stays fresh. Defaults to the cache's ttl.
+            etag (str, optional): The page's ETag header. Defaults to None.
+            modified (str, optional): The page's Last-Modified header. Defaults to None.
+        """
+        key = self.key(url, selector)
+        body = zlib.compress(html.encode())
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        expires = now + ttl if ttl is not None else None
+
+        with self._lock:
+            old = self._db.execute('SELECT size FROM entries WHERE key = ?', (key,)).fetchone()
+            self._db.execute(
+                'INSERT OR REPLACE INTO entries (key, url, selector, body, size, expires, accessed, etag, modified) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, url, selector, body, len(body), expires, now, etag, modified)
+            )
+            self.size += len(body) - (old[0] if old else 0)
+            self._evict()
+
+
+    def _evict(self) -> None:
+        # Called with the lock held.  Walk the entries from least to most recently used until we're under the cap.
+        if self.size <= self.max_bytes:
+            return
+
+        victims = []
+        excess = self.size - self.max_bytes
+        for key, size in self._db.execute('SELECT key, size FROM entries ORDER BY accessed'):
+            if excess <= 0:
+                break
+            victims.append((key,))
+            excess -= size
+            self.size -= size
+
+        self._db.executemany('DELETE FROM entries WHERE key = ?', victims)
+        self.evictions += len(victims)
+
+
+    def stats(self) -> dict:
+        """
+        Summarizes the cache's counters.
+
+        Returns:
+            dict: The hits, misses, evictions, number of entries and total size in bytes.
+        """
+        with self._lock:
+            entries = self._db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': entries,
+            'bytes': self.size,
+        }
+
+
+    def close(self) -> None:
+        """
+        Closes the underlying database connection.
+        """
+        with self._lock:
+            self._db.close()
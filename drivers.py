@@ -0,0 +1,351 @@
+'''Description: This file creates a WebDriverPool class that lazily starts, reuses, recycles and shuts down
+the browsers used by the scrapers.'''
+import atexit
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Generator
+from urllib.parse import quote
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from memory import browser_rss
+
+# The URL patterns (shell-style, as a PAC script's shExpMatch takes them) of the ads, trackers and fonts an IMDb
+# page loads that have no bearing on the fragments the scrapers read.
+BLOCKED_PATTERNS = (
+    '*://*.amazon-adsystem.com/*',
+    '*://*.doubleclick.net/*',
+    '*://*.google-analytics.com/*',
+    '*://*.googletagmanager.com/*',
+    '*://*.googlesyndication.com/*',
+    '*://*.scorecardresearch.com/*',
+    '*://fls-na.amazon.com/*',
+    '*://unagi.amazon.com/*',
+    '*://unagi-na.amazon.com/*',
+    '*.woff', '*.woff2', '*.ttf',
+    '*.mp4', '*.webm', '*.m3u8',
+)
+
+# Blocked requests are sent to a proxy at the discard port, where the connection is refused straight away.
+BLACKHOLE = 'PROXY 127.0.0.1:9'
+
+# The script that reports how many requests a page made, how many bytes they transferred, and how long the page
+# has been loading, from the browser's Resource Timing entries.
+PAGE_STATS_SCRIPT = '''
+const entries = performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'));
+return {requests: entries.length,
+        bytes: entries.reduce((total, entry) => total + (entry.transferSize || 0), 0),
+        elapsed: performance.now() / 1000};
+'''
+
+
+@dataclass(frozen=True)
+class BrowserProfile:
+    '''
+    Description: This class describes how the browsers are started: whether they show a window, what they
+    download, which URLs they refuse to request, and how long driver.get waits for a page.
+    '''
+    headless: bool = False
+    images: bool = True
+    media: bool = True
+    fonts: bool = True
+    blocked: tuple = ()
+    page_load_strategy: str = 'normal'
+    window_size: tuple = None
+
+    def options(self) -> webdriver.FirefoxOptions:
+        """
+        Builds the Firefox options of the profile.
+
+        Returns:
+            FirefoxOptions: The options to start Firefox with.
+        """
+        options = webdriver.FirefoxOptions()
+
+        # 'eager' returns from driver.get once the DOM is parsed and 'none' straight away; either way the fetcher
+        # goes on to wait for the fragment it needs, rather than for every image and script on the page.
+        options.page_load_strategy = self.page_load_strategy
+
+        if self.headless:
+            options.add_argument('-headless')
+
+        if self.window_size is not None:
+            width, height = self.window_size
+            options.add_argument(f'--width={width}')
+            options.add_argument(f'--height={height}')
+
+        if not self.images:
+            options.set_preference('permissions.default.image', 2)
+
+        if not self.media:
+            options.set_preference('media.autoplay.default', 5)
+            options.set_preference('media.mediasource.enabled', False)
+
+        if not self.fonts:
+            options.set_preference('browser.display.use_document_fonts', 0)
+            options.set_preference('gfx.downloadable_fonts.enabled', False)
+
+        # Firefox has no request-blocking API, but it will consult a proxy auto-config script for every request,
+        # and the script can send the requests we don't want to a proxy that doesn't exist.
+        if self.blocked:
+            options.set_preference('network.proxy.type', 2)
+            options.set_preference('network.proxy.autoconfig_url',
+                                   'data:application/x-ns-proxy-autoconfig,' + quote(self.pac_script()))
+            # By default Firefox only shows the script the host of an HTTPS URL, and connects directly when the
+            # proxy is unreachable; neither would block anything.
+            options.set_preference('network.proxy.autoconfig_url.include_path', True)
+            options.set_preference('network.proxy.failover_direct', False)
+
+        return options
+
+
+    def pac_script(self) -> str:
+        """
+        Builds the proxy auto-config script that blocks the profile's URL patterns.
+
+        Returns:
+            str: The script.
+        """
+        matches = ' || '.join(f'shExpMatch(url, "{pattern}")' for pattern in self.blocked)
+        return f'function FindProxyForURL(url, host) {{ return ({matches}) ? "{BLACKHOLE}" : "DIRECT"; }}'
+
+
+    def factory(self) -> Callable:
+        """
+        Builds a WebDriverPool factory that starts browsers with the profile.
+
+        Returns:
+            Callable: A callable returning a new webdriver object.
+        """
+        return lambda: webdriver.Firefox(options=self.options())
+
+
+# The profiles that can be selected by name.  'default' is a plain Firefox; 'lean' is headless, downloads no images,
+# media or web fonts, blocks ads and trackers, returns from driver.get as soon as the DOM is parsed, and renders
+# into a small window.
+PROFILES = {
+    'default': BrowserProfile(),
+    'lean': BrowserProfile(headless=True, images=False, media=False, fonts=False, blocked=BLOCKED_PATTERNS,
+                           page_load_strategy='eager', window_size=(800, 600)),
+}
+
+
+def get_profile(profile: object) -> BrowserProfile:
+    """
+    Resolves a browser profile given by name.
+
+    Args:
+        profile (str or BrowserProfile): One of the names in PROFILES, or a BrowserProfile.
+
+    Returns:
+        BrowserProfile: The profile.
+
+    Raises:
+        ValueError: If the name is not in PROFILES.
+    """
+    if isinstance(profile, BrowserProfile):
+        return profile
+
+    if profile not in PROFILES:
+        raise ValueError(f'Unknown browser profile: {profile!r}, expected one of {tuple(PROFILES)}')
+
+    return PROFILES[profile]
+
+
+def page_stats(driver: object) -> dict:
+    """
+    Reports the requests, bytes transferred and seconds elapsed of the page a driver has loaded so far.
+
+    Args:
+        driver (object): A webdriver object.
+
+    Returns:
+        dict: The page's requests, bytes and elapsed seconds, or an empty dict if the browser couldn't report them.
+    """
+    try:
+        return driver.execute_script(PAGE_STATS_SCRIPT) or {}
+    except WebDriverException:
+        return {}
+
+
+class WebDriverPool:
+    '''
+    Description: This class hands out webdriver objects to the scrapers.  No browser is started until a driver
+    is first requested, idle drivers are reused between requests, and a driver is replaced after it has served
+    a number of pages, after it has grown past a memory threshold, or after it crashes.
+    '''
+    def __init__(self, factory: Callable=None, max_drivers: int=1, max_pages: int=200, max_rss: float=None) -> None:
+        """
+        Initializes the WebDriverPool object.
+
+        Args:
+            factory (Callable, optional): A callable returning a new webdriver object. Defaults to webdriver.Firefox.
+            max_drivers (int, optional): The maximum number of browsers running at the same time. Defaults to 1.
+            max_pages (int, optional): The number of pages a browser may load before it is restarted. A value of
+                0 disables restarting. Defaults to 200.
+            max_rss (float, optional): The MiB a browser, with all its processes, may hold before it is restarted.
+                Defaults to None (no threshold).
+
+        Attributes:
+            factory (Callable): The callable used to start a new browser.
+            max_drivers (int): The maximum number of browsers running at the same time.
+            max_pages (int): The number of pages a browser may load before it is restarted.
+            max_rss (float): The MiB a browser may hold before it is restarted, or None.
+            idle (list): The drivers that are started but not currently leased.
+            pages (dict): The number of pages loaded by each running driver, keyed by id().
+            started (int): The total number of browsers started by the pool.
+            recycled (int): The number of browsers restarted for reaching max_pages or max_rss.
+        """
+        self.factory = factory if factory is not None else webdriver.Firefox
+        self.max_drivers = max_drivers
+        self.max_pages = max_pages
+        self.max_rss = max_rss
+        self.idle = []
+        self.pages = {}
+        self.started = 0
+        self.recycled = 0
+        self._drivers = {}
+        self._lock = threading.Condition()
+        self._closed = False
+
+        # Make sure the browsers are shut down when the interpreter exits, even if the caller forgets to.
+        atexit.register(self.close)
+
+
+    def acquire(self) -> object:
+        """
+        Leases a driver from the pool, starting a new browser if none is idle and the cap allows it.
+
+        Returns:
+            object: A webdriver object.
+
+        Raises:
+            RuntimeError: If the pool has been closed.
+        """
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise RuntimeError('WebDriverPool is closed.')
+
+                # Reuse an idle browser if there is one.
+                if self.idle:
+                    return self.idle.pop()
+
+                # Otherwise start a new one, provided we are still under the cap.  We reserve the slot before
+                # releasing the lock so that other threads can't overshoot the cap while the browser starts.
+                if len(self.pages) < self.max_drivers:
+                    slot = object()
+                    self.pages[id(slot)] = 0
+                    break
+
+                # Every browser is busy, so we'll wait for one to be released.
+                self._lock.wait()
+
+        try:
+            driver = self.factory()
+        except BaseException:
+            with self._lock:
+                del self.pages[id(slot)]
+                self._lock.notify()
+            raise
+
+        with self._lock:
+            del self.pages[id(slot)]
+            self.pages[id(driver)] = 0
+            self._drivers[id(driver)] = driver
+            self.started += 1
+        return driver
+
+
+    def release(self, driver: object, healthy: bool=True) -> None:
+        """
+        Returns a leased driver to the pool.  Drivers that crashed or reached max_pages or max_rss are shut down
+        instead.
+
+        Args:
+            driver (object): The webdriver object to return.
+            healthy (bool, optional): Whether the driver is still usable. Defaults to True.
+        """
+        # The browser's memory is read outside the lock, since it means reading every one of its processes.
+        bloated = (healthy and self.max_rss is not None
+                   and (rss := browser_rss(driver)) is not None and rss > self.max_rss * 2**20)
+
+        with self._lock:
+            self.pages[id(driver)] = self.pages.get(id(driver), 0) + 1
+            worn_out = bloated or (self.max_pages and self.pages[id(driver)] >= self.max_pages)
+
+            if healthy and not worn_out and not self._closed:
+                self.idle.append(driver)
+                self._lock.notify()
+                return
+
+            del self.pages[id(driver)]
+            self._drivers.pop(id(driver), None)
+            self.recycled += bool(healthy and worn_out)
+            self._lock.notify()
+
+        self._quit(driver)
+
+
+    @contextmanager
+    def driver(self) -> Generator:
+        """
+        Leases a driver for the duration of a with-block.  If the block raises a WebDriverException other than a
+        timeout, the browser is assumed to have crashed and is replaced.
+
+        Yields:
+            object: A webdriver object.
+        """
+        driver = self.acquire()
+        try:
+            yield driver
+        except TimeoutException:
+            self.release(driver)
+            raise
+        except WebDriverException:
+            self.release(driver, healthy=False)
+            raise
+        except BaseException:
+            self.release(driver)
+            raise
+        else:
+            self.release(driver)
+
+
+    def running(self) -> list:
+        """
+        Lists the browsers the pool has started and not yet shut down, leased or idle.
+
+        Returns:
+            list: The webdriver objects.
+        """
+        with self._lock:
+            return list(self._drivers.values())
+
+
+    def close(self) -> None:
+        """
+        Shuts down every idle browser and stops handing out new ones.  Leased browsers are shut down when released.
+        """
+        with self._lock:
+            self._closed = True
+            idle, self.idle = self.idle, []
+            for driver in idle:
+                del self.pages[id(driver)]
+                self._drivers.pop(id(driver), None)
+            self._lock.notify_all()
+
+        for driver in idle:
+            self._quit(driver)
+
+
+    def _quit(self, driver: object) -> None:
+        # A crashed browser may refuse to quit cleanly; there's nothing more we can do about it at that point.
+        try:
+            driver.quit()
+        except Exception as e:
+            print(e)
+
+
+# The pool shared by scrapers that aren't given one of their own.  Creating it does not start a browser.
+DRIVER_POOL = WebDriverPool()
@@ -0,0 +1,91 @@
+'''Description: This file contains the extractors that read the cast of a title and the STARmeter data of a person
+from the JSON that IMDb's pages embed in a __NEXT_DATA__ script, rather than from the rendered DOM.'''
+import json
+import re
+
+# orjson parses the page data several times faster than the json module; it's optional, and json is used without it.
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+# The selector of the script holding the page data.  parsing.select_fragment locates it without parsing the page.
+NEXT_DATA_SELECTOR = 'script#__NEXT_DATA__'
+
+# The script element, wherever its id attribute falls among its attributes.
+NEXT_DATA_SCRIPT = re.compile(r'<script\b[^>]*\bid=["\']?__NEXT_DATA__["\']?[^>]*>(.*?)</script>', re.S)
+
+# The sign of the net change in STARmeter rank for each direction IMDb reports.
+DIRECTIONS = {'UP': 1, 'DOWN': -1, 'FLAT': 0}
+
+
+def next_data(fragment: str) -> dict:
+    """
+    Parses the page data out of a page, or out of the script element select_fragment returned.
+
+    Args:
+        fragment (str): The HTML holding the __NEXT_DATA__ script.
+
+    Returns:
+        dict: The page data.
+
+    Raises:
+        ValueError: If there is no __NEXT_DATA__ script, or its contents aren't JSON.
+    """
+    match = NEXT_DATA_SCRIPT.search(fragment)
+    if match is None:
+        raise ValueError('No __NEXT_DATA__ script found.')
+
+    # orjson raises its own JSONDecodeError, which is a ValueError like json's.
+    return loads(match[1])
+
+
+def title_cast(data: dict) -> list:
+    """
+    Reads the starring cast of a title from its page data.
+
+    Args:
+        data (dict): The page data of a title page.
+
+    Returns:
+        list: The (nconst, name) of each star, in billing order.
+
+    Raises:
+        KeyError, TypeError: If the page data isn't shaped as expected.
+        ValueError: If the page data lists no stars.
+    """
+    credits = data['props']['pageProps']['aboveTheFoldData']['principalCredits']
+
+    for group in credits:
+        # The stars are the 'cast' group of the principal credits, labelled 'Stars' on the page.
+        if group['category']['id'] == 'cast' or group['category']['text'] == 'Stars':
+            cast = [(credit['name']['id'], credit['name']['nameText']['text']) for credit in group['credits']]
+            if cast:
+                return cast
+
+    raise ValueError('No stars in the principal credits.')
+
+
+def star_meter(data: dict) -> tuple:
+    """
+    Reads a person's STARmeter rank and its net change from their page data.
+
+    Args:
+        data (dict): The page data of a name page.
+
+    Returns:
+        tuple: The rank and the net change, or (None, None) if the person isn't ranked.
+
+    Raises:
+        KeyError, TypeError: If the page data isn't shaped as expected.
+    """
+    ranking = data['props']['pageProps']['aboveTheFoldData']['meterRanking']
+
+    # An unranked person has no ranking, which the page renders as 'See rank'.
+    if not ranking or ranking.get('currentRank') is None:
+        return None, None
+
+    change = ranking.get('rankChange') or {}
+    direction = DIRECTIONS[change.get('changeDirection', 'FLAT')]
+    return int(ranking['currentRank']), direction * int(change.get('difference') or 0)
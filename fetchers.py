@@ -0,0 +1,433 @@
+'''Description: This file creates fetcher classes that retrieve the HTML fragment matching a CSS selector from a
+url, either over plain HTTP or through a browser, and a FetchStrategy class that tries them in turn.'''
+from abc import ABC, abstractmethod
+from collections import Counter
+import re
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from bs4 import SoupStrainer
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+from cache import ResponseCache
+from drivers import WebDriverPool, page_stats
+from extract import NEXT_DATA_SELECTOR
+from metrics import METRICS, Metrics
+from parsing import select_fragment
+from retry import FetchFailed, HttpStatusError, RetryPolicy, ServerError, ThrottledError
+from throttle import THROTTLE_STATUSES, HostScheduler
+
+# The fragments StarScraper needs from the title pages and the name pages respectively.
+CAST_SELECTOR = '.ipc-metadata-list__item:last-of-type'
+STAR_SELECTOR = '.starmeter-content'
+
+# Returned by conditional_fetch when the server confirms that the page hasn't changed since it was cached.
+NOT_MODIFIED = object()
+
+# The subtrees worth parsing when looking for each fragment in a full page.  The cast fragment is the last item of
+# a metadata list, so we keep whole lists to preserve the :last-of-type relationship.  While parsing, the strainer
+# sees the class attribute as one unsplit string, hence the patterns rather than plain class names.
+STRAINERS = {
+    CAST_SELECTOR: SoupStrainer('ul', class_=re.compile(r'(?:^|\s)ipc-metadata-list(?:\s|$)')),
+    STAR_SELECTOR: SoupStrainer(class_=re.compile(r'(?:^|\s)starmeter-content(?:\s|$)')),
+}
+
+# IMDb serves a stripped-down page (or a 403) to clients that don't look like a browser, and localizes the
+# labels we match on, so we'll present ourselves as an English-speaking desktop browser.
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64; rv:123.0) Gecko/20100101 Firefox/123.0',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+}
+
+
+def make_session(pool_size: int=10) -> requests.Session:
+    """
+    Builds a requests.Session that presents itself as a browser and holds enough keep-alive connections per host
+    for pool_size concurrent requests.
+
+    Args:
+        pool_size (int, optional): The number of connections to hold per host. Defaults to 10.
+
+    Returns:
+        Session: The session, to be shared by every worker.
+    """
+    session = requests.Session()
+    session.headers.update(HEADERS)
+
+    # Hold enough connections for every worker so that concurrent fetches reuse connections rather than
+    # opening (and TLS-handshaking) new ones.
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class Fetcher(ABC):
+    '''
+    Description: This class is the interface shared by the fetchers.
+    '''
+    name = None
+
+    @abstractmethod
+    def fetch(self, url: str, selector: str) -> str:
+        """
+        Retrieves the outerHTML of the first element matching the selector at the given URL.
+
+        Args:
+            url (str): The URL of the web page to scrape.
+            selector (str): The CSS selector of the fragment to retrieve.
+
+        Returns:
+            str: The outerHTML of the matching element, or None if the page has no such element.
+
+        Raises:
+            Exception: If the page could not be retrieved.  The FetchStrategy's RetryPolicy decides, by the class
+            of the exception, whether to try again.
+        """
+
+
+    def conditional_fetch(self, url: str, selector: str, etag: str=None, modified: str=None) -> tuple:
+        """
+        Retrieves a fragment unless the page is unchanged since it was cached with the given validators.  Fetchers
+        that can't make conditional requests fetch the page as usual.
+
+        Args:
+            url (str): The URL of the web page to scrape.
+            selector (str): The CSS selector of the fragment to retrieve.
+            etag (str, optional): The ETag the page was cached with. Defaults to None.
+            modified (str, optional): The Last-Modified date the page was cached with. Defaults to None.
+
+        Returns:
+            tuple: The fragment (as fetch returns it, or NOT_MODIFIED), and the page's ETag and Last-Modified
+            headers, or None for each if there are none.
+        """
+        return self.fetch(url, selector), None, None
+
+
+class HttpFetcher(Fetcher):
+    '''
+    Description: This class retrieves fragments from the server-rendered HTML over a pooled requests.Session.
+    '''
+    name = 'http'
+
+    def __init__(self, pool_size: int=10, timeout: float=10, parser: str='html.parser',
+                 scheduler: HostScheduler=None, metrics: Metrics=None) -> None:
+        """
+        Initializes the HttpFetcher object.
+
+        Args:
+            pool_size (int, optional): The number of keep-alive connections to hold per host. Defaults to 10.
+            timeout (float, optional): The number of seconds to wait for a response. Defaults to 10.
+            parser (str, optional): The parser backend used to locate fragments, one of parsing.PARSERS. Defaults
+                to 'html.parser'.
+            scheduler (HostScheduler, optional): The scheduler pacing requests to each host. Defaults to None.
+            metrics (Metrics, optional): The metrics the request and parse are timed in. Defaults to METRICS.
+
+        Attributes:
+            session (Session): The session whose connection pool is shared by every request.
+            timeout (float): The number of seconds to wait for a response.
+            parser (str): The parser backend used to locate fragments.
+            scheduler (HostScheduler): The scheduler pacing requests to each host, or None.
+            metrics (Metrics): The metrics the request and parse are timed in.
+        """
+        self.session = make_session(pool_size)
+        self.timeout = timeout
+        self.parser = parser
+        self.scheduler = scheduler
+        self.metrics = metrics if metrics is not None else METRICS
+
+
+    def resize(self, pool_size: int) -> None:
+        """
+        Holds pool_size keep-alive connections per host from now on, e.g. when more threads share the fetcher than
+        it was built for.  The connections already open are closed.
+
+        Args:
+            pool_size (int): The number of connections to hold per host.
+        """
+        self.session.close()
+        self.session = make_session(pool_size)
+
+
+    def fetch(self, url: str, selector: str) -> str:
+        return self.conditional_fetch(url, selector)[0]
+
+
+    def conditional_fetch(self, url: str, selector: str, etag: str=None, modified: str=None) -> tuple:
+        if self.scheduler is not None:
+            self.scheduler.acquire(url)
+
+        headers = {}
+        if etag is not None:
+            headers['If-None-Match'] = etag
+        if modified is not None:
+            headers['If-Modified-Since'] = modified
+
+        with self.metrics.span('http.request'):
+            response = self.session.get(url, timeout=self.timeout, headers=headers)
+
+        # Let the scheduler know how the host responded, so it can back off if we're being throttled.
+        if self.scheduler is not None:
+            self.scheduler.feedback(url, response.status_code, response.headers.get('Retry-After'))
+
+        # Raise an error of the class the retry policy has a rule for.
+        if response.status_code in THROTTLE_STATUSES:
+            raise ThrottledError(url, response.status_code)
+        if response.status_code >= 500:
+            raise ServerError(url, response.status_code)
+        if response.status_code >= 400:
+            raise HttpStatusError(url, response.status_code)
+
+        etag, modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+        if response.status_code == 304:
+            return NOT_MODIFIED, etag, modified
+
+        # If the fragment is rendered client-side it won't be in the response, and we'll return None so the
+        # caller can fall back to a browser.  Only the subtrees that can hold the fragment are parsed.
+        with self.metrics.span('http.select'):
+            return select_fragment(response.text, selector, self.parser, STRAINERS.get(selector)), etag, modified
+
+
+class BrowserFetcher(Fetcher):
+    '''
+    Description: This class retrieves fragments by loading the page in a browser leased from a WebDriverPool.
+    '''
+    name = 'browser'
+
+    def __init__(self, pool: WebDriverPool, timeout: float=10, scheduler: HostScheduler=None,
+                 metrics: Metrics=None) -> None:
+        """
+        Initializes the BrowserFetcher object.
+
+        Args:
+            pool (WebDriverPool): The pool to lease browsers from.
+            timeout (float, optional): The number of seconds to wait for the fragment to appear. Defaults to 10.
+            scheduler (HostScheduler, optional): The scheduler pacing requests to each host. Defaults to None.
+            metrics (Metrics, optional): The metrics the navigation and the wait are timed in. Defaults to METRICS.
+
+        Attributes:
+            pool (WebDriverPool): The pool to lease browsers from.
+            timeout (float): The number of seconds to wait for the fragment to appear.
+            scheduler (HostScheduler): The scheduler pacing requests to each host, or None.
+            metrics (Metrics): The metrics the navigation and the wait are timed in.
+        """
+        self.pool = pool
+        self.timeout = timeout
+        self.scheduler = scheduler
+        self.metrics = metrics if metrics is not None else METRICS
+
+
+    def fetch(self, url: str, selector: str) -> str:
+        if self.scheduler is not None:
+            self.scheduler.acquire(url)
+
+        with self.pool.driver() as driver:
+            with self.metrics.span('browser.navigate'):
+                driver.get(url)
+
+            # WebDriverWait will wait for the presence of the element before attempting to retrieve
+            # the outerHTML attribute, simulating more human-like behavior.
+            with self.metrics.span('browser.wait'):
+                html = WebDriverWait(driver, self.timeout).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, selector))
+                ).get_attribute('outerHTML')
+
+            # As over HTTP, the page data comes with the whole page, so the DOM can be read from it too.
+            if selector == NEXT_DATA_SELECTOR:
+                html = driver.page_source
+
+            # Record what the page cost to load up to this point, so browser profiles can be compared.
+            if stats := page_stats(driver):
+                self.metrics.incr('browser.requests', stats['requests'])
+                self.metrics.incr('browser.bytes', stats['bytes'])
+                self.metrics.observe('browser.page', stats['elapsed'])
+
+        # The browser doesn't expose the response status, so all we can report is a success.
+        if self.scheduler is not None:
+            self.scheduler.feedback(url, 200)
+
+        return html
+
+
+class FetchStrategy:
+    '''
+    Description: This class tries a sequence of fetchers in order until one of them finds the fragment, and
+    records which one served each URL.  If it has a cache, the cache is consulted before any fetcher, and a stale
+    entry with validators is revalidated with a conditional request.  Each fetcher is retried according to the
+    retry policy, within a single deadline per URL.
+    '''
+    def __init__(self, fetchers: list, cache: ResponseCache=None, policy: RetryPolicy=None,
+                 metrics: Metrics=None, history: int=None, revalidate: bool=False) -> None:
+        """
+        Initializes the FetchStrategy object.
+
+        Args:
+            fetchers (list): The fetchers to try, cheapest first.
+            cache (ResponseCache, optional): The cache to consult before fetching. Defaults to None.
+            policy (RetryPolicy, optional): The policy each fetcher is retried under. Defaults to a RetryPolicy
+                with the default rules.
+            metrics (Metrics, optional): The metrics pages, cache hits, retries and failures are counted in.
+                Defaults to METRICS.
+            history (int, optional): The number of most recently fetched URLs served remembers; 0 remembers none,
+                which a run of days should choose, since every URL fetched would otherwise stay in memory.
+                Defaults to None (every URL).
+            revalidate (bool, optional): Whether to revalidate fresh cache entries with the server too, rather than
+                serve them without a request. Defaults to False.
+
+        Attributes:
+            fetchers (list): The fetchers to try, cheapest first.
+            cache (ResponseCache): The cache to consult before fetching, or None.
+            policy (RetryPolicy): The policy each fetcher is retried under.
+            metrics (Metrics): The metrics pages, cache hits, retries and failures are counted in.
+            served (dict): The name of the fetcher that served each of the last history URLs ('cache' for cache
+                hits, 'revalidated' for stale entries the server confirmed unchanged), or None if none of them could.
+            history (int): The number of URLs served remembers, or None for every URL.
+            counts (Counter): The number of URLs served by each fetcher.
+            revalidate (bool): Whether fresh cache entries are revalidated with the server too.
+        """
+        self.fetchers = fetchers
+        self.cache = cache
+        self.policy = policy if policy is not None else RetryPolicy()
+        self.metrics = metrics if metrics is not None else METRICS
+        self.served = {}
+        self.history = history
+        self.counts = Counter()
+        self.revalidate = revalidate
+        self._lock = threading.Lock()
+
+
+    def record(self, url: str, name: str) -> None:
+        """
+        Records which fetcher served a URL: counted always, and remembered in served within the history.
+
+        Args:
+            url (str): The URL.
+            name (str): The name of the fetcher, 'cache', 'revalidated', or None if none of them could.
+        """
+        with self._lock:
+            self.counts[name] += 1
+
+            if self.history == 0:
+                return
+
+            # A URL fetched again moves to the newest end, so the oldest are dropped first.
+            self.served.pop(url, None)
+            self.served[url] = name
+            if self.history is not None and len(self.served) > self.history:
+                del self.served[next(iter(self.served))]
+
+
+    def fetch(self, url: str, selector: str) -> str:
+        """
+        Retrieves the outerHTML of the first element matching the selector, trying each fetcher in turn.
+
+        Args:
+            url (str): The URL of the web page to scrape.
+            selector (str): The CSS selector of the fragment to retrieve.
+
+        Returns:
+            str: The outerHTML of the matching element, or None if every fetcher retrieved the page but none
+            found the element.
+
+        Raises:
+            FetchFailed: If a fetcher failed to retrieve the page and no later fetcher found the element.
+        """
+        # When revalidating, a fresh entry is treated like a stale one: the server confirms it or sends the page.
+        if self.cache is not None and not self.revalidate:
+            if (html := self.cache.get(url, selector)) is not None:
+                self.record(url, 'cache')
+                self.metrics.incr('cache.hits')
+                self.metrics.incr('pages.cache')
+                return html
+            self.metrics.incr('cache.misses')
+
+        # A stale entry with an ETag or a Last-Modified date only needs to be refetched if the page has changed.
+        validators = self.cache.validators(url, selector) if self.cache is not None else None
+        etag, modified, cached = validators if validators is not None else (None, None, None)
+
+        deadline = time.monotonic() + self.policy.deadline
+        error = None
+
+        for fetcher in self.fetchers:
+            try:
+                # The span covers every attempt, including the backoff between them.
+                with self.metrics.span(f'fetch.{fetcher.name}'):
+                    (html, *headers), attempts = self.policy.call(
+                        lambda: fetcher.conditional_fetch(url, selector, etag, modified), deadline
+                    )
+            except Exception as e:
+                # We'll still give the next fetcher a chance before giving up on the URL.
+                print(e)
+                self.metrics.incr('retries', getattr(e, 'attempts', 1) - 1)
+                self.metrics.incr(f'errors.{fetcher.name}')
+                error = e
+                continue
+
+            self.metrics.incr('retries', attempts - 1)
+
+            # The page hasn't changed, so the cached fragment is still good for another ttl.
+            if html is NOT_MODIFIED:
+                self.record(url, 'revalidated')
+                self.metrics.incr('pages.not_modified')
+                self.cache.put(url, selector, cached, etag=headers[0] or etag, modified=headers[1] or modified)
+                return cached
+
+            if html is not None:
+                self.record(url, fetcher.name)
+                self.metrics.incr(f'pages.{fetcher.name}')
+
+                if self.cache is not None:
+                    self.cache.put(url, selector, html, etag=headers[0], modified=headers[1])
+
+                return html
+
+        self.record(url, None)
+        self.metrics.incr('pages.failed')
+
+        if error is not None:
+            raise FetchFailed(url, error, getattr(error, 'attempts', 1))
+
+        return None
+
+
+def build_strategy(mode: str, pool: WebDriverPool, pool_size: int=10, parser: str='html.parser',
+                   cache: ResponseCache=None, scheduler: HostScheduler=None,
+                   policy: RetryPolicy=None, metrics: Metrics=None) -> FetchStrategy:
+    """
+    Builds the FetchStrategy for a fetch mode.
+
+    Args:
+        mode (str): 'auto' to try HTTP first and fall back to a browser, 'http' for HTTP only, or 'browser' for
+            a browser only.
+        pool (WebDriverPool): The pool the browser fetcher leases browsers from.
+        pool_size (int, optional): The number of keep-alive connections the HTTP fetcher holds. Defaults to 10.
+        parser (str, optional): The parser backend the HTTP fetcher uses to locate fragments. Defaults to
+            'html.parser'.
+        cache (ResponseCache, optional): The cache to consult before fetching. Defaults to None.
+        scheduler (HostScheduler, optional): The scheduler both fetchers share to pace requests. Defaults to None.
+        policy (RetryPolicy, optional): The policy each fetcher is retried under. Defaults to None (the default
+            RetryPolicy).
+        metrics (Metrics, optional): The metrics the strategy and its fetchers record to. Defaults to METRICS.
+
+    Returns:
+        FetchStrategy: The strategy for the given mode.
+
+    Raises:
+        ValueError: If the mode is not recognized.
+    """
+    match mode:
+        case 'auto':
+            return FetchStrategy([HttpFetcher(pool_size, parser=parser, scheduler=scheduler, metrics=metrics),
+                                  BrowserFetcher(pool, scheduler=scheduler, metrics=metrics)], cache, policy, metrics)
+        case 'http':
+            return FetchStrategy([HttpFetcher(pool_size, parser=parser, scheduler=scheduler, metrics=metrics)],
+                                 cache, policy, metrics)
+        case 'browser':
+            return FetchStrategy([BrowserFetcher(pool, scheduler=scheduler, metrics=metrics)], cache, policy, metrics)
+        case _:
+            raise ValueError(f'Unknown fetch mode: {mode!r}')
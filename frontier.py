@@ -0,0 +1,183 @@
+'''Description: This file creates a Frontier class that canonicalizes the URLs of a run, so the same title or person
+reached through different links is recognized as one, and tracks whether each is pending, done or failed so that no
+work is repeated within the run.'''
+from collections import Counter
+import re
+import sys
+from typing import Generator
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from records import person_url
+
+# The states of a key in the frontier.
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+# A bare IMDb id, or the URL of a title or person page, with or without the site, a trailing slash, ?ref_=
+# tracking parameters or a fragment.  Other pages of a title (/title/tt.../reviews, ...) don't match.
+IMDB_ID = re.compile(
+    r'^(?:(?:https?://(?:www\.|m\.)?imdb\.com)?/(?:title|name)/)?((?:tt|nm)\d{7,})/?(?:[?#].*)?$', re.I
+)
+
+# The query parameters that only track where a link was followed from.
+TRACKING = re.compile(r'^(?:ref_|utm_\w+|pf_rd_\w+)$')
+
+
+def canonical(url: str) -> str:
+    """
+    Canonicalizes a URL.  IMDb title and person pages become their tconst or nconst; any other URL has its scheme and
+    host lowercased, and its tracking parameters and fragment dropped.
+
+    Args:
+        url (str): The URL, or a bare tconst or nconst.
+
+    Returns:
+        str: The canonical key.
+    """
+    url = url.strip()
+
+    if match := IMDB_ID.match(url):
+        return sys.intern(match[1].lower())
+
+    parts = urlsplit(url)
+    query = urlencode([(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+                       if not TRACKING.match(name)])
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', query, ''))
+
+
+class Frontier:
+    '''
+    Description: This class holds every key a run has admitted, with its state.  A key is admitted once; admitting
+    it again, through whatever URL, is counted as a duplicate and refused.
+    '''
+    def __init__(self, site: str='https://www.imdb.com') -> None:
+        """
+        Initializes an empty Frontier object.
+
+        Args:
+            site (str, optional): The site the URLs of titles and people are built on. Defaults to
+                'https://www.imdb.com'.
+
+        Attributes:
+            title_url (str): The base URL of the title pages.
+            name_url (str): The base URL of the person pages.
+            states (dict): The state of each admitted key.
+            errors (dict): The error recorded with each failed key.
+            duplicates (int): The number of admissions refused as duplicates.
+        """
+        self.title_url = f'{site}/title/'
+        self.name_url = f'{site}/name/'
+        self.states = {}
+        self.errors = {}
+        self.duplicates = 0
+
+
+    def __contains__(self, url: str) -> bool:
+        return canonical(url) in self.states
+
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+
+    def add(self, url: str) -> str:
+        """
+        Admits a URL as pending, unless its key has already been admitted.
+
+        Args:
+            url (str): The URL, or a bare tconst or nconst.
+
+        Returns:
+            str: The key, or None if it was already admitted.
+        """
+        key = canonical(url)
+
+        if key in self.states:
+            self.duplicates += 1
+            return None
+
+        self.states[key] = PENDING
+        return key
+
+
+    def url(self, key: str) -> str:
+        """
+        Builds the URL to fetch a key from.
+
+        Args:
+            key (str): The key.
+
+        Returns:
+            str: The URL of the title or person page, or the key itself if it's a URL.
+        """
+        if key.startswith('tt'):
+            return self.title_url + key
+        if key.startswith('nm'):
+            return person_url(key, self.name_url)
+        return key
+
+
+    def state(self, url: str) -> str:
+        """
+        Looks up the state of a URL.
+
+        Args:
+            url (str): The URL or key.
+
+        Returns:
+            str: PENDING, DONE or FAILED, or None if it hasn't been admitted.
+        """
+        return self.states.get(canonical(url))
+
+
+    def done(self, key: str) -> None:
+        self.states[key] = DONE
+        self.errors.pop(key, None)
+
+
+    def fail(self, key: str, error: object=None) -> None:
+        """
+        Marks a key as failed, so that it isn't tried again within the run.
+
+        Args:
+            key (str): The key.
+            error (object, optional): What went wrong, returned by the errors attribute. Defaults to None.
+        """
+        self.states[key] = FAILED
+        self.errors[key] = error
+
+
+    def retry(self) -> list:
+        """
+        Returns every failed key to pending, e.g. before re-running the failures.
+
+        Returns:
+            list: The keys returned to pending.
+        """
+        keys = [key for key, state in self.states.items() if state == FAILED]
+        for key in keys:
+            self.states[key] = PENDING
+        self.errors.clear()
+        return keys
+
+
+    def pending(self) -> Generator:
+        """
+        Streams the keys still pending.
+
+        Yields:
+            str: The next pending key.
+        """
+        for key, state in self.states.items():
+            if state == PENDING:
+                yield key
+
+
+    def stats(self) -> dict:
+        """
+        Summarizes the frontier.
+
+        Returns:
+            dict: The number of keys in each state, and the number of duplicates refused.
+        """
+        return {**Counter(self.states.values()), 'duplicates': self.duplicates}
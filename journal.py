@@ -0,0 +1,120 @@
+'''Description: This file creates a Journal class that records each scraped title, with its cast and their star
+ratings, to an append-only JSON lines file so that an interrupted run can resume where it stopped.'''
+import json
+import os
+from typing import Generator
+from sinks import open_sink
+
+
+class Journal:
+    '''
+    Description: This class appends one line per completed title to a JSON lines file, and streams the recorded
+    rows back out for export.
+    '''
+    def __init__(self, path: str='../data/journal.jsonl') -> None:
+        """
+        Initializes the Journal object, reading the tconsts already recorded at path.
+
+        Args:
+            path (str, optional): The JSON lines file to append to. Defaults to '../data/journal.jsonl'.
+
+        Attributes:
+            path (str): The JSON lines file to append to.
+            completed (set): The tconsts already recorded.
+        """
+        self.path = path
+        self.completed = set()
+        self._file = None
+
+        if os.path.exists(path):
+            for entry in self._entries():
+                self.completed.add(entry['tconst'])
+
+
+    def __contains__(self, tconst: str) -> bool:
+        return tconst in self.completed
+
+
+    def record_title(self, tconst: str, cast: list) -> None:
+        """
+        Records a completed title.  The line is flushed to disk before returning, so a crash afterwards can't
+        lose it.
+
+        Args:
+            tconst (str): The IMDb id of the title.
+            cast (list): The cast dictionaries of the title.
+        """
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+            # If the last run was killed mid-write, end its truncated line so it doesn't swallow this one.
+            if self._file.tell() and not self._ends_with_newline():
+                self._file.write('\n')
+
+        self._file.write(json.dumps({'tconst': tconst, 'cast': cast}) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.completed.add(tconst)
+
+
+    def rows(self) -> Generator:
+        """
+        Streams the recorded cast rows, one dictionary per cast member per title.  If a title was recorded more
+        than once only its first entry is used.
+
+        Yields:
+            dict: A cast dictionary with the title's tconst.
+        """
+        seen = set()
+        for entry in self._entries():
+            if entry['tconst'] in seen:
+                continue
+            seen.add(entry['tconst'])
+
+            for cast_dict in entry['cast']:
+                yield {'tconst': entry['tconst'], **cast_dict}
+
+
+    def export(self, filename: str='../data/CAST_LIST.xlsx') -> int:
+        """
+        Writes every recorded cast row to a file in a single streaming pass.
+
+        Args:
+            filename (str, optional): The file to write; its extension selects the format (.xlsx, .csv,
+                .parquet, .arrow or .feather). Defaults to '../data/CAST_LIST.xlsx'.
+
+        Returns:
+            int: The number of rows written.
+        """
+        with open_sink(filename) as sink:
+            sink.write_rows(self.rows())
+
+        return sink.rows_written
+
+
+    def close(self) -> None:
+        """
+        Closes the journal file.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, 'rb') as file:
+            file.seek(-1, os.SEEK_END)
+            return file.read(1) == b'\n'
+
+
+    def _entries(self) -> Generator:
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, encoding='utf-8') as file:
+            for line in file:
+                # A run killed mid-write can leave a truncated last line behind; that title simply wasn't completed.
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
@@ -1,38 +1,263 @@
-'''Description: This file contains the main function within which the user is prompted for a scraper method
-and a url to scrape.'''
-from scrapers import StarScraper, DumbScraper
+'''Description: This file contains the command line interface to the scrapers.  Run it with the name of a scraper,
+e.g. `python main.py dumb --urls urls.txt --extract tag:h2 --concurrency 16 --out results.jsonl`, or
+`python main.py star ../data/titles.tsv.gz --workers 4`.'''
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+import json
+import sys
+from typing import Generator
+from bs4 import Tag
+from cache import ResponseCache
+from fetchers import make_session
+from frontier import Frontier
+from journal import Journal
+from memory import MemoryMonitor
+from metrics import Metrics
+from parsing import PARSERS
+from persons import PersonIndex
+from rules import RuleSet, load_rules
+from scrapers import DumbScraper, StarScraper
 
-def main():
-    # Choose a scraper type
-    scraper_choice = int(input("Select a WebScraper | 0 = StarScraper | 1 = DumbScraper |"))
 
-    match scraper_choice:
-        case 0:
-            scraper = StarScraper()
+def read_urls(filename: str) -> Generator:
+    """
+    Streams the URLs of a file, one per line, skipping blank lines and lines starting with '#'.
 
-            # Prompt the user for a url
-            url: str = input("Enter a url: ")
-            
-            # Pass url to make_soup(), yielding parsed html
-            soup = scraper.make_soup(url)
+    Args:
+        filename (str): The file to read, or '-' for standard input.
 
-            # Pretty print
-            print(soup.prettify())
+    Yields:
+        str: The next URL.
+    """
+    file = sys.stdin if filename == '-' else open(filename, encoding='utf-8')
+    try:
+        for line in file:
+            if (url := line.strip()) and not url.startswith('#'):
+                yield url
+    finally:
+        if file is not sys.stdin:
+            file.close()
 
-        case 1:
-            scraper = DumScraper()
 
-            # Prompt the user to select a scraping method
-            method: str = input("Enter index of desired scraping method [ { 0: 'get_span_text', 1: 'get_tag_text', 2: 'get_text' } ]: ")
+def element_html(value: object) -> str:
+    """
+    Serializes the values json can't: the elements a rule with take 'element' returns are written as their HTML.
 
-            # Perform the selected scraping method
-            text: str = scraper.perform_scraping(method=int(method))
+    Raises:
+        TypeError: If the value isn't an element either.
+    """
+    if isinstance(value, Tag):
+        return str(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
 
-            # Print the text
-            print(text)
+
+def scrape_url(url: str, extraction: object, session: object, cache: ResponseCache, parser: str,
+               timeout: float) -> dict:
+    """
+    Scrapes one URL with a DumbScraper.  Errors are reported in the result rather than raised, so one bad page
+    doesn't stop a batch.
+
+    Args:
+        extraction (object): The name of a DumbScraper extraction, or a RuleSet to apply.
+
+    Returns:
+        dict: The url and, either the response status and the extracted result, or the error.
+    """
+    try:
+        scraper = DumbScraper(url, cache=cache, parser=parser, session=session, timeout=timeout)
+
+        if scraper.status is not None and scraper.status >= 400:
+            return {'url': url, 'status': scraper.status, 'error': f'HTTP {scraper.status}'}
+
+        if isinstance(extraction, RuleSet):
+            return {'url': url, 'status': scraper.status, 'result': scraper.apply(extraction)}
+
+        return {'url': url, 'status': scraper.status, 'result': scraper.extract(extraction)}
+    except Exception as e:
+        return {'url': url, 'error': f'{type(e).__name__}: {e}'}
+
+
+def run_dumb(args: argparse.Namespace) -> None:
+    """
+    Scrapes a list of URLs concurrently over one pooled session, writing each result as a JSON line as soon as it
+    finishes.  URLs are read as they're needed, so the list can be any length.
+    """
+    # Check the extraction, or compile the rules, before fetching anything.
+    name = args.extract.partition(':')[0]
+    if args.rules is not None:
+        extraction = load_rules(args.rules)
+    elif name not in DumbScraper.EXTRACTIONS or (name == 'tag' and ':' not in args.extract):
+        raise SystemExit(f'Unknown extraction: {args.extract!r}, expected one of span, tag:<name>, text or title')
+    else:
+        extraction = args.extract
+
+    session = make_session(args.concurrency)
+    cache = ResponseCache(args.cache) if args.cache is not None else None
+    out = sys.stdout if args.out == '-' else open(args.out, 'a', encoding='utf-8')
+    written = failed = 0
+
+    # The same page listed twice, or reached through links with different tracking parameters, is scraped once.
+    frontier = Frontier()
+
+    def write(futures: dict) -> None:
+        nonlocal written, failed
+        for future in as_completed(futures):
+            result = future.result()
+            out.write(json.dumps(result, default=element_html) + '\n')
+            written += 1
+            if 'error' in result:
+                failed += 1
+                frontier.fail(futures[future], result['error'])
+            else:
+                frontier.done(futures[future])
+        out.flush()
+
+    try:
+        with ThreadPoolExecutor(args.concurrency) as executor:
+            pending = {}
+
+            for url in read_urls(args.urls):
+                if (key := frontier.add(url)) is None:
+                    continue
+
+                future = executor.submit(scrape_url, frontier.url(key), extraction, session, cache, args.parser,
+                                         args.timeout)
+                pending[future] = key
+
+                # Keep only a couple of URLs per worker in flight, so memory doesn't grow with the list.
+                if len(pending) >= 2 * args.concurrency:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    write({future: pending.pop(future) for future in done})
+
+            write(pending)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(f'{written} URLs scraped, {failed} failed, {frontier.duplicates} duplicates skipped.', file=sys.stderr)
+
+
+def star_scraper(args: argparse.Namespace, filename: str=None) -> StarScraper:
+    """
+    Builds a StarScraper from the options the star and refresh commands share.
+    """
+    scraper = StarScraper(
+        filename,
+        workers=args.workers,
+        fetch_mode=args.fetch_mode,
+        cache=ResponseCache(args.cache) if args.cache is not None else None,
+        persons=PersonIndex(args.persons),
+        parser=args.parser,
+        extractor=args.extractor,
+        browser_profile=args.browser_profile,
+        journal=Journal(args.journal),
+        metrics=Metrics(args.metrics),
+        **({'start_row': args.start_row, 'stop_row': args.stop_row, 'batch_size': args.batch_size}
+           if filename is not None else {})
+    )
+
+    if args.metrics_port is not None:
+        scraper.metrics.serve(args.metrics_port)
+
+    return scraper
+
+
+def run_star(args: argparse.Namespace) -> None:
+    """
+    Scrapes the STARmeter data of every title in a title list, then exports the journal.
+    """
+    scraper = star_scraper(args, args.filename)
+
+    # A long run lets go of each batch once it's journaled, restarts browsers before they bloat, stops remembering
+    # which fetcher served each URL, and watches memory.  The recycling limits are set on a pool of the scraper's
+    # own, so they don't change the shared pool.
+    if args.long_running:
+        scraper.keep_cast = False
+        pool = scraper.own_pool()
+        pool.max_pages = args.recycle_pages
+        pool.max_rss = args.recycle_mib
+        scraper.fetcher.history = 0
+        scraper.monitor = MemoryMonitor(args.memory_budget, args.browser_budget, args.sample_interval, pool,
+                                        scraper.metrics, args.trace)
+
+    if args.pipeline:
+        scraper.scrape_star_data_pipelined(person_workers=args.person_workers)
+    else:
+        scraper.scrape_star_data()
+    scraper.combine_scraped_data(args.out)
+
+
+def run_refresh(args: argparse.Namespace) -> None:
+    """
+    Refreshes the STARmeter data of the titles already in the journal.
+    """
+    scraper = star_scraper(args)
+    scraper.refresh_star_data(args.max_age * 24 * 3600, args.out, args.diff)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    dumb = commands.add_parser('dumb', help='extract text from every URL in a list')
+    dumb.add_argument('--urls', required=True, help="a file of URLs, one per line, or '-' for standard input")
+    dumb.add_argument('--extract', default='title', help='span, tag:<name> (e.g. tag:h2), text or title')
+    dumb.add_argument('--rules', help='a JSON or YAML file of extraction rules to apply instead of --extract')
+    dumb.add_argument('--concurrency', type=int, default=8, help='the number of URLs fetched at the same time')
+    dumb.add_argument('--out', default='-', help="the JSON lines file to append results to, or '-' for stdout")
+    dumb.add_argument('--parser', default='html.parser', choices=PARSERS)
+    dumb.add_argument('--cache', help='an SQLite file to cache pages in')
+    dumb.add_argument('--timeout', type=float, default=10, help='the seconds to wait for each response')
+    dumb.set_defaults(run=run_dumb)
+
+    # The options the star and refresh commands share.
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--workers', type=int, default=1, help='the number of pages fetched at the same time')
+    common.add_argument('--fetch-mode', default='auto', choices=('auto', 'http', 'browser'))
+    common.add_argument('--extractor', default='json', choices=('json', 'dom'))
+    common.add_argument('--browser-profile', help='the browser profile, e.g. lean')
+    common.add_argument('--parser', default='html.parser', choices=PARSERS)
+    common.add_argument('--cache', help='an SQLite file to cache fragments in')
+    common.add_argument('--persons', default='../data/persons.jsonl', help='the person index file')
+    common.add_argument('--journal', default='../data/journal.jsonl', help='the journal of completed titles')
+    common.add_argument('--metrics', default='../data/metrics.json', help='the file to write the metrics summary to')
+    common.add_argument('--metrics-port', type=int, help='serve Prometheus metrics on this port')
+
+    star = commands.add_parser('star', parents=[common], help='scrape the STARmeter data of a title list')
+    star.add_argument('filename', help='the title list: .xlsx, .csv, .tsv or .tsv.gz')
+    star.add_argument('--out', default='../data/CAST_LIST.xlsx', help='the file to export the journal to')
+    star.add_argument('--batch-size', type=int, default=4, help='the number of titles per batch')
+    star.add_argument('--start-row', type=int, default=0, help='the number of rows to skip')
+    star.add_argument('--stop-row', type=int, help='the row to stop before')
+    star.add_argument('--pipeline', action='store_true',
+                      help='fetch titles and people at the same time, in stages, rather than in alternating batches')
+    star.add_argument('--person-workers', type=int,
+                      help='with --pipeline, the number of person pages fetched at the same time; defaults to --workers')
+    star.add_argument('--long-running', action='store_true',
+                      help='hold memory flat for a run of days: free written batches, recycle browsers, sample RSS')
+    star.add_argument('--memory-budget', type=float, help='with --long-running, alert past this many MiB in python')
+    star.add_argument('--browser-budget', type=float,
+                      help='with --long-running, alert past this many MiB in the browsers')
+    star.add_argument('--recycle-pages', type=int, default=200,
+                      help='with --long-running, restart a browser after this many pages')
+    star.add_argument('--recycle-mib', type=float,
+                      help='with --long-running, restart a browser once it holds this many MiB')
+    star.add_argument('--sample-interval', type=float, default=60,
+                      help='with --long-running, the seconds between memory samples')
+    star.add_argument('--trace', action='store_true',
+                      help='with --long-running, trace allocations so snapshots (on alert, or on SIGUSR1) can be taken')
+    star.set_defaults(run=run_star)
+
+    refresh = commands.add_parser('refresh', parents=[common], help='refresh the STARmeter data in the journal')
+    refresh.add_argument('--max-age', type=float, default=7, help='the age in days past which a person is refetched')
+    refresh.add_argument('--out', help='a file to write the refreshed cast list to')
+    refresh.add_argument('--diff', default='../data/STAR_DIFF.csv', help='the file to write the changes to')
+    refresh.set_defaults(run=run_refresh)
+
+    args = parser.parse_args()
+    args.run(args)
 
 
 # Call the main function
 if __name__ == '__main__':
     main()
-
@@ -0,0 +1,280 @@
+'''Description: This file creates a MemoryMonitor class that samples the resident memory of the scraper and of its
+browsers while a long run goes on, alerts when either goes over budget, and takes tracemalloc snapshots on demand
+to find what's growing.'''
+import os
+import signal
+import threading
+import tracemalloc
+from metrics import METRICS, Metrics
+
+# psutil reads a process tree's memory on any platform; it's optional, and /proc is read on Linux without it.
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+MIB = 2**20
+
+
+def process_rss(pid: int=None) -> int:
+    """
+    Reads the resident set size of a process.
+
+    Args:
+        pid (int, optional): The process id. Defaults to this process.
+
+    Returns:
+        int: The RSS in bytes, or None if it can't be read (the process is gone, or neither psutil nor /proc is
+        available).
+    """
+    pid = os.getpid() if pid is None else pid
+
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return None
+
+    # The second field of statm is the resident size, in pages.
+    try:
+        with open(f'/proc/{pid}/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _children(pid: int) -> list:
+    # Every descendant of a process, read from /proc when psutil isn't there to do it.
+    if psutil is not None:
+        try:
+            return [child.pid for child in psutil.Process(pid).children(recursive=True)]
+        except psutil.Error:
+            return []
+
+    parents = {}
+    for entry in os.listdir('/proc') if os.path.isdir('/proc') else []:
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as file:
+                    # The command name is in parentheses and may contain spaces, so the fields are counted from
+                    # the closing one.
+                    parents[int(entry)] = int(file.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, ValueError, IndexError):
+                continue
+
+    descendants, frontier = [], [pid]
+    while frontier:
+        parent = frontier.pop()
+        children = [child for child, ppid in parents.items() if ppid == parent]
+        descendants += children
+        frontier += children
+    return descendants
+
+
+def tree_rss(pid: int) -> int:
+    """
+    Reads the resident set size of a process and all of its descendants, e.g. a browser and its content
+    processes.  Memory shared between them is counted once per process, so this overstates a little.
+
+    Args:
+        pid (int): The id of the root process.
+
+    Returns:
+        int: The total RSS in bytes, or None if the root process can't be read.
+    """
+    if (total := process_rss(pid)) is None:
+        return None
+
+    return total + sum(rss for child in _children(pid) if (rss := process_rss(child)) is not None)
+
+
+def browser_pid(driver: object) -> int:
+    """
+    Finds the process id of the browser a webdriver controls.
+
+    Args:
+        driver (object): The webdriver object.
+
+    Returns:
+        int: The browser's process id, or the driver service's if the browser doesn't report its own, or None.
+    """
+    # Firefox reports its own process id; otherwise the driver service (e.g. geckodriver) is the browser's parent.
+    if pid := getattr(driver, 'capabilities', {}).get('moz:processID'):
+        return pid
+
+    process = getattr(getattr(driver, 'service', None), 'process', None)
+    return getattr(process, 'pid', None)
+
+
+def browser_rss(driver: object) -> int:
+    """
+    Reads the resident set size of the browser a webdriver controls, with all its processes.
+
+    Args:
+        driver (object): The webdriver object.
+
+    Returns:
+        int: The RSS in bytes, or None if it can't be read.
+    """
+    pid = browser_pid(driver)
+    return tree_rss(pid) if pid is not None else None
+
+
+class MemoryMonitor:
+    '''
+    Description: This class samples the memory of a run from a background thread.  Each sample sets the
+    memory.python and memory.browser gauges (in bytes); going over budget prints an alert and takes a tracemalloc
+    snapshot if tracing is on, and every sample over budget is counted in memory.alerts.  Snapshots can also be
+    taken at any time, from code or by sending the process SIGUSR1, and each is compared to the one before, which is
+    how a leak shows itself.
+    '''
+    def __init__(self, budget: float=None, browser_budget: float=None, interval: float=60, pool: object=None,
+                 metrics: Metrics=METRICS, trace: bool=False, top: int=10) -> None:
+        """
+        Initializes the MemoryMonitor object.
+
+        Args:
+            budget (float, optional): The most MiB the scraper process should hold. Defaults to None (no alert).
+            browser_budget (float, optional): The most MiB the browsers should hold between them. Defaults to None
+                (no alert).
+            interval (float, optional): The number of seconds between samples. Defaults to 60.
+            pool (WebDriverPool, optional): The pool whose browsers are sampled. Defaults to None (no browsers).
+            metrics (Metrics, optional): The metrics the samples and alerts are reported in. Defaults to METRICS.
+            trace (bool, optional): Whether to start tracemalloc, so that snapshots can be taken. Tracing slows
+                allocation down, so it's off unless asked for. Defaults to False.
+            top (int, optional): The number of allocation sites a snapshot reports. Defaults to 10.
+
+        Attributes:
+            budget (int): The most bytes the scraper process should hold, or None.
+            browser_budget (int): The most bytes the browsers should hold between them, or None.
+            interval (float): The number of seconds between samples.
+            pool (WebDriverPool): The pool whose browsers are sampled, or None.
+            metrics (Metrics): The metrics the samples and alerts are reported in.
+            top (int): The number of allocation sites a snapshot reports.
+            alerts (int): The number of samples that were over budget.
+            last (dict): The most recent sample.
+        """
+        self.budget = budget * MIB if budget is not None else None
+        self.browser_budget = browser_budget * MIB if browser_budget is not None else None
+        self.interval = interval
+        self.pool = pool
+        self.metrics = metrics
+        self.top = top
+        self.alerts = 0
+        self.last = {}
+        self._snapshot = None
+        self._over = False
+        self._stop = threading.Event()
+        self._thread = None
+
+        if trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+
+    def sample(self) -> dict:
+        """
+        Samples the memory of the scraper and its browsers, alerting if either is over budget.
+
+        Returns:
+            dict: The python and browser RSS in bytes (None where it couldn't be read), and the number of browsers.
+        """
+        drivers = self.pool.running() if self.pool is not None else []
+        browsers = [rss for rss in map(browser_rss, drivers) if rss is not None]
+        sample = {'python': process_rss(), 'browser': sum(browsers) if browsers else None, 'browsers': len(drivers)}
+
+        for name in ('python', 'browser'):
+            if sample[name] is not None:
+                self.metrics.gauge(f'memory.{name}', sample[name])
+
+        over = [f'{name} {sample[name] / MIB:.0f} MiB > {budget / MIB:.0f} MiB'
+                for name, budget in (('python', self.budget), ('browser', self.browser_budget))
+                if budget is not None and sample[name] is not None and sample[name] > budget]
+
+        # Every sample over budget is counted, but only going over prints an alert and takes a snapshot, so a run
+        # that stays over isn't flooded with them.
+        if over:
+            self.alerts += 1
+            self.metrics.incr('memory.alerts')
+            if not self._over:
+                print(f'Memory over budget: {", ".join(over)}.')
+                if tracemalloc.is_tracing():
+                    self.snapshot()
+        elif self._over:
+            print('Memory back within budget.')
+        self._over = bool(over)
+
+        self.last = sample
+        return sample
+
+
+    def snapshot(self) -> list:
+        """
+        Takes a tracemalloc snapshot and prints the allocation sites holding the most memory, or, after the first
+        snapshot, those that grew the most since the one before.
+
+        Returns:
+            list: The reported statistics, or [] if tracemalloc isn't tracing.
+        """
+        if not tracemalloc.is_tracing():
+            print('tracemalloc is not tracing; start the monitor with trace=True to take snapshots.')
+            return []
+
+        # The monitor's own frames aren't interesting.
+        snapshot = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+
+        if self._snapshot is None:
+            stats = snapshot.statistics('lineno')[:self.top]
+            print(f'Top {len(stats)} allocation sites:')
+        else:
+            stats = snapshot.compare_to(self._snapshot, 'lineno')[:self.top]
+            print(f'Top {len(stats)} allocation sites by growth since the last snapshot:')
+
+        for stat in stats:
+            print(f'  {stat}')
+
+        self._snapshot = snapshot
+        return stats
+
+
+    def start(self) -> 'MemoryMonitor':
+        """
+        Starts sampling from a daemon thread, and takes a snapshot whenever the process receives SIGUSR1 (where
+        there is such a signal and this is the main thread).
+
+        Returns:
+            MemoryMonitor: The monitor, started.
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='memory-monitor', daemon=True)
+        self._thread.start()
+
+        if hasattr(signal, 'SIGUSR1') and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.snapshot())
+
+        return self
+
+
+    def stop(self) -> dict:
+        """
+        Stops sampling, after taking one last sample.
+
+        Returns:
+            dict: The last sample.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return self.sample()
+
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.sample()
+            except Exception as e:
+                # A failed sample shouldn't end the monitoring of a run that may go on for days.
+                print(f'Memory sample failed: {type(e).__name__}: {e}')
+
+            if self._stop.wait(self.interval):
+                return
@@ -0,0 +1,272 @@
+'''Description: This file creates a Metrics class that times spans of the scrape pipeline and counts its events,
+and reports them as a JSON summary or in the Prometheus text format.'''
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import math
+import threading
+import time
+from typing import Generator
+
+# The upper bounds, in seconds, of the latency histogram buckets.  They span a cache hit to a slow browser load.
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, math.inf)
+
+# The quantiles reported for each histogram in the summary.
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class Histogram:
+    '''
+    Description: This class counts observations into fixed buckets, so its memory doesn't grow with the number of
+    observations.  Quantiles are estimated by interpolating within the bucket they fall in.
+    '''
+    def __init__(self, buckets: tuple=BUCKETS) -> None:
+        """
+        Initializes an empty Histogram object.
+
+        Args:
+            buckets (tuple, optional): The ascending upper bounds of the buckets, ending in infinity.
+                Defaults to BUCKETS.
+
+        Attributes:
+            buckets (tuple): The upper bounds of the buckets.
+            counts (list): The number of observations in each bucket (not cumulative).
+            count (int): The number of observations.
+            sum (float): The sum of the observations.
+            max (float): The largest observation.
+        """
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates a quantile of the observations.
+
+        Args:
+            q (float): The quantile, between 0 and 1.
+
+        Returns:
+            float: The estimated value, or None if there are no observations.
+        """
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i else 0.0
+                # The last bucket has no upper bound, so the largest observation stands in for it.
+                upper = min(self.buckets[i], self.max)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+
+        return self.max
+
+
+class Metrics:
+    '''
+    Description: This class collects the timings and counts of a run.  Spans are named after the step they time
+    (make_soup, get_star_info, ...) and counters after the event they count (pages.http, retries, ...).  It's safe
+    to share between worker threads.
+    '''
+    def __init__(self, path: str=None) -> None:
+        """
+        Initializes an empty Metrics object.
+
+        Args:
+            path (str, optional): The file the JSON summary is written to by dump(). Defaults to None (not written).
+
+        Attributes:
+            path (str): The file the JSON summary is written to, or None.
+            counters (Counter): The count of each event.
+            gauges (dict): The last and the largest value of each gauge, keyed by name.
+            histograms (dict): The latency Histogram of each span, keyed by name.
+            started (float): The wall-clock time the metrics were created.
+        """
+        self.path = path
+        self.counters = Counter()
+        self.gauges = {}
+        self.histograms = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+
+    def incr(self, name: str, amount: int=1) -> None:
+        """
+        Adds to a counter.
+
+        Args:
+            name (str): The name of the counter.
+            amount (int, optional): The amount to add. Defaults to 1.
+        """
+        with self._lock:
+            self.counters[name] += amount
+
+
+    def gauge(self, name: str, value: float) -> None:
+        """
+        Sets a gauge, e.g. the depth of a queue, remembering the largest value it's been set to.
+
+        Args:
+            name (str): The name of the gauge.
+            value (float): The current value.
+        """
+        with self._lock:
+            self.gauges[name] = (value, max(value, self.gauges.get(name, (value, value))[1]))
+
+
+    def observe(self, name: str, seconds: float) -> None:
+        """
+        Records a latency.
+
+        Args:
+            name (str): The name of the span.
+            seconds (float): The latency.
+        """
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+            self.histograms[name].observe(seconds)
+
+
+    @contextmanager
+    def span(self, name: str) -> Generator:
+        """
+        Times the body of a with statement, whether or not it raises.
+
+        Args:
+            name (str): The name of the span.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+
+    def summary(self) -> dict:
+        """
+        Summarizes the metrics.
+
+        Returns:
+            dict: The elapsed seconds, the counters, the last and largest value of each gauge, and the count, total,
+            mean, maximum and quantiles (in seconds) of each span.
+        """
+        with self._lock:
+            spans = {}
+            for name, histogram in sorted(self.histograms.items()):
+                spans[name] = {
+                    'count': histogram.count,
+                    'total': histogram.sum,
+                    'mean': histogram.sum / histogram.count,
+                    'max': histogram.max,
+                    **{f'p{round(q * 100)}': histogram.quantile(q) for q in QUANTILES},
+                }
+
+            gauges = {name: {'value': value, 'max': peak} for name, (value, peak) in sorted(self.gauges.items())}
+
+            return {'elapsed': time.time() - self.started, 'counters': dict(sorted(self.counters.items())),
+                    'gauges': gauges, 'spans': spans}
+
+
+    def dump(self) -> dict:
+        """
+        Writes the summary to path, if there is one.
+
+        Returns:
+            dict: The summary.
+        """
+        summary = self.summary()
+
+        if self.path is not None:
+            with open(self.path, 'w', encoding='utf-8') as file:
+                json.dump(summary, file, indent=2)
+
+        return summary
+
+
+    def to_prometheus(self) -> str:
+        """
+        Renders the metrics in the Prometheus text exposition format.  Counters become scraper_<name>_total, gauges
+        scraper_<name> and scraper_<name>_max, and the spans share the scraper_span_seconds histogram, labelled by
+        span.
+
+        Returns:
+            str: The exposition.
+        """
+        lines = []
+
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                metric = f'scraper_{name.replace(".", "_")}_total'
+                lines += [f'# TYPE {metric} counter', f'{metric} {value}']
+
+            for name, (value, peak) in sorted(self.gauges.items()):
+                metric = f'scraper_{name.replace(".", "_")}'
+                lines += [f'# TYPE {metric} gauge', f'{metric} {value}', f'# TYPE {metric}_max gauge',
+                          f'{metric}_max {peak}']
+
+            lines.append('# TYPE scraper_span_seconds histogram')
+            for name, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == math.inf else repr(bound)
+                    lines.append(f'scraper_span_seconds_bucket{{span="{name}",le="{le}"}} {cumulative}')
+                lines.append(f'scraper_span_seconds_sum{{span="{name}"}} {histogram.sum}')
+                lines.append(f'scraper_span_seconds_count{{span="{name}"}} {histogram.count}')
+
+        return '\n'.join(lines) + '\n'
+
+
+    def serve(self, port: int=9100, host: str='127.0.0.1') -> ThreadingHTTPServer:
+        """
+        Serves the metrics at /metrics in the Prometheus text format, from a daemon thread.
+
+        Args:
+            port (int, optional): The port to listen on. Defaults to 9100.
+            host (str, optional): The address to listen on. Defaults to '127.0.0.1'.
+
+        Returns:
+            ThreadingHTTPServer: The server; call its shutdown() method to stop it.
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+
+                body = metrics.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                # Scrapes of the endpoint shouldn't clutter the scraper's output.
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+# The metrics shared by every component that isn't given its own.
+METRICS = Metrics()
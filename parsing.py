@@ -0,0 +1,64 @@
+'''Description: This file contains the helpers that turn HTML into BeautifulSoup objects or fragments with the parser
+backend the caller selects.'''
+from bs4 import BeautifulSoup, SoupStrainer
+from extract import NEXT_DATA_SCRIPT, NEXT_DATA_SELECTOR
+
+# The parser backends that can be selected.  'html.parser' ships with Python; 'lxml' and 'html5lib' are the
+# BeautifulSoup backends of the same names; 'selectolax' locates fragments with selectolax's Lexbor engine and
+# parses the (small) fragments it finds with 'html.parser'.
+PARSERS = ('html.parser', 'lxml', 'html5lib', 'selectolax')
+
+
+def soup_parser(parser: str) -> str:
+    """
+    Maps a parser backend to the BeautifulSoup parser that builds soups for it.
+
+    Args:
+        parser (str): One of PARSERS.
+
+    Returns:
+        str: The name of the BeautifulSoup parser to use.
+
+    Raises:
+        ValueError: If the parser is not one of PARSERS.
+    """
+    if parser not in PARSERS:
+        raise ValueError(f'Unknown parser: {parser!r}, expected one of {PARSERS}')
+
+    return 'html.parser' if parser == 'selectolax' else parser
+
+
+def select_fragment(html: str, selector: str, parser: str='html.parser', strainer: SoupStrainer=None) -> str:
+    """
+    Finds the first element matching a CSS selector in a page and returns its outerHTML.
+
+    Args:
+        html (str): The HTML of the page.
+        selector (str): The CSS selector of the fragment.
+        parser (str, optional): One of PARSERS. Defaults to 'html.parser'.
+        strainer (SoupStrainer, optional): Restricts the BeautifulSoup parsers to the subtrees that can contain
+            the fragment. Ignored by html5lib and selectolax. Defaults to None.
+
+    Returns:
+        str: The outerHTML of the matching element (the whole page for NEXT_DATA_SELECTOR), or None if there is
+        none.
+    """
+    # The page data script has a fixed id and holds nothing but JSON, so we'll find it with a regular expression
+    # rather than parse the page around it, whatever the parser.  The whole page is returned, rather than the
+    # script alone, so that the DOM can still be read from it if the page data isn't shaped as expected.
+    if selector == NEXT_DATA_SELECTOR:
+        return html if NEXT_DATA_SCRIPT.search(html) is not None else None
+
+    if parser == 'selectolax':
+        # selectolax is optional, so we'll only import it when it's asked for.
+        from selectolax.lexbor import LexborHTMLParser
+
+        node = LexborHTMLParser(html).css_first(selector)
+        return node.html if node is not None else None
+
+    # html5lib doesn't support parse_only, and BeautifulSoup warns if it's given one.
+    if parser == 'html5lib':
+        strainer = None
+
+    element = BeautifulSoup(html, soup_parser(parser), parse_only=strainer).select_one(selector)
+    return str(element) if element is not None else None
@@ -0,0 +1,102 @@
+'''Description: This file creates a PersonIndex class that remembers the STARmeter data fetched for each person,
+so that a person appearing in many titles is only fetched once.'''
+import json
+import os
+import threading
+import time
+from typing import NamedTuple
+
+
+class PersonRecord(NamedTuple):
+    rating: int
+    ratingChange: int
+    fetched_at: float
+
+
+class PersonIndex:
+    '''
+    Description: This class maps nconst to the person's rating, rating change and the time it was fetched.  The
+    index lives in memory and, if given a path, is also appended to a JSON lines file so later runs can reuse it.
+    '''
+    def __init__(self, path: str=None, max_age: float=None) -> None:
+        """
+        Initializes the PersonIndex object, loading any records previously persisted to path.
+
+        Args:
+            path (str, optional): The JSON lines file to persist records to. Defaults to None (memory only).
+            max_age (float, optional): The number of seconds a record stays fresh. None keeps records fresh for
+                the lifetime of the index. Defaults to None.
+
+        Attributes:
+            path (str): The JSON lines file records are persisted to, or None.
+            max_age (float): The number of seconds a record stays fresh, or None.
+            records (dict): The PersonRecord for each nconst.
+        """
+        self.path = path
+        self.max_age = max_age
+        self.records = {}
+        self._lock = threading.Lock()
+
+        if path is not None and os.path.exists(path):
+            with open(path) as file:
+                for line in file:
+                    # A run killed mid-write can leave a truncated last line behind; we'll just refetch that person.
+                    try:
+                        nconst, rating, rating_change, fetched_at = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.records[nconst] = PersonRecord(rating, rating_change, fetched_at)
+
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+
+    def __contains__(self, nconst: str) -> bool:
+        return self.lookup(nconst) is not None
+
+
+    def lookup(self, nconst: str) -> PersonRecord:
+        """
+        Retrieves the record for a person if it is still fresh.
+
+        Args:
+            nconst (str): The IMDb id of the person.
+
+        Returns:
+            PersonRecord: The person's record, or None if there is no fresh record.
+        """
+        record = self.records.get(nconst)
+
+        if record is None:
+            return None
+
+        if self.max_age is not None and time.time() - record.fetched_at > self.max_age:
+            return None
+
+        return record
+
+
+    def record(self, nconst: str, rating: int, rating_change: int, fetched_at: float=None) -> PersonRecord:
+        """
+        Stores the data fetched for a person, appending it to the index file if there is one.
+
+        Args:
+            nconst (str): The IMDb id of the person.
+            rating (int): The person's STARmeter rank.
+            rating_change (int): The net change in the person's STARmeter rank.
+            fetched_at (float, optional): The time the data was fetched. Defaults to now.
+
+        Returns:
+            PersonRecord: The stored record.
+        """
+        record = PersonRecord(rating, rating_change, time.time() if fetched_at is None else fetched_at)
+
+        with self._lock:
+            self.records[nconst] = record
+
+            if self.path is not None:
+                with open(self.path, 'a') as file:
+                    file.write(json.dumps([nconst, *record]) + '\n')
+
+        return record
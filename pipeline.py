@@ -0,0 +1,205 @@
+'''Description: This file creates the Stage and Pipeline classes that run the steps of a scrape as concurrent stages
+connected by bounded queues.  Every stage works as soon as there's something in its queue, and a stage that falls
+behind holds back the stages feeding it, rather than letting work pile up in memory.'''
+import queue
+import threading
+from typing import Callable, Iterable
+from metrics import METRICS, Metrics
+
+# Put in a stage's queue once per worker when every stage feeding it has finished.
+_DONE = object()
+
+
+class Stage:
+    '''
+    Description: This class is one step of a Pipeline: a bounded queue of items and the worker threads that take
+    items from it.  The work function hands its results on by putting them to the stages it feeds, which blocks
+    while their queues are full.  An item the work function fails on is handed to the error handler, which can pass
+    a failure on in its place.
+    '''
+    def __init__(self, name: str, work: Callable, workers: int=1, capacity: int=64, outputs: tuple=(),
+                 metrics: Metrics=METRICS, on_error: Callable=None) -> None:
+        """
+        Initializes the Stage object.
+
+        Args:
+            name (str): The name the stage is reported under.
+            work (Callable): Called with each item in the queue.
+            workers (int, optional): The number of threads taking items from the queue. Defaults to 1.
+            capacity (int, optional): The most items the queue holds before put blocks. Defaults to 64.
+            outputs (tuple, optional): The stages the work function puts to. They're closed when this stage
+                finishes. Defaults to ().
+            metrics (Metrics, optional): The metrics the queue depth and the work are reported in.
+                Defaults to METRICS.
+            on_error (Callable, optional): Called with an item and the exception the work function raised on it,
+                from the worker thread, so that it can put a failure to the stages this one feeds. Defaults to None
+                (the error is only printed and counted).
+
+        Attributes:
+            name (str): The name the stage is reported under.
+            work (Callable): Called with each item in the queue.
+            workers (int): The number of threads taking items from the queue.
+            queue (Queue): The items waiting to be worked on.
+            outputs (tuple): The stages the work function puts to.
+            producers (int): The number of stages (or sources) still feeding this one.
+            metrics (Metrics): The metrics the queue depth and the work are reported in.
+            on_error (Callable): Called with an item and the exception the work function raised on it, or None.
+        """
+        self.name = name
+        self.work = work
+        self.workers = workers
+        self.queue = queue.Queue(capacity)
+        self.outputs = tuple(outputs)
+        self.producers = 0
+        self.metrics = metrics
+        self.on_error = on_error
+        self._running = workers
+        self._threads = []
+        self._lock = threading.Lock()
+
+        for output in self.outputs:
+            output.producers += 1
+
+
+    def put(self, item: object) -> None:
+        """
+        Queues an item, blocking while the queue is full.
+
+        Args:
+            item (object): The item.
+        """
+        self.queue.put(item)
+        self.metrics.gauge(f'queue.{self.name}', self.queue.qsize())
+
+
+    def close(self) -> None:
+        """
+        Tells the stage that one of its producers has finished.  Once they all have, the workers stop when the queue
+        is empty.
+        """
+        with self._lock:
+            self.producers -= 1
+            last = self.producers == 0
+
+        if last:
+            for _ in range(self.workers):
+                self.queue.put(_DONE)
+
+
+    def start(self) -> None:
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'{self.name}-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+
+    def join(self) -> None:
+        for thread in self._threads:
+            thread.join()
+
+
+    def _run(self) -> None:
+        while (item := self.queue.get()) is not _DONE:
+            # One bad item shouldn't stop the stage, or everything upstream would block on its full queue.
+            try:
+                with self.metrics.span(f'stage.{self.name}'):
+                    self.work(item)
+            except Exception as e:
+                self.fail(item, e)
+            self.metrics.incr(f'stage.{self.name}.items')
+
+        # The last worker out closes the stages downstream.
+        with self._lock:
+            self._running -= 1
+            last = self._running == 0
+
+        if last:
+            for output in self.outputs:
+                output.close()
+
+
+    def fail(self, item: object, error: Exception) -> None:
+        """
+        Counts an item the work function failed on and hands it to the error handler.
+
+        Args:
+            item (object): The item.
+            error (Exception): The exception the work function raised.
+        """
+        self.metrics.incr(f'stage.{self.name}.errors')
+
+        if self.on_error is not None:
+            # A handler that fails too mustn't take the worker down with it, or the stages downstream never close.
+            try:
+                self.on_error(item, error)
+                return
+            except Exception as e:
+                error = e
+
+        print(f'Stage {self.name} failed: {type(error).__name__}: {error}')
+
+
+class Pipeline:
+    '''
+    Description: This class builds and runs a set of Stages.  Stages are added from the last to the first, so that
+    each can name the stages it feeds, and the items of a source are fed to the first.
+    '''
+    def __init__(self, metrics: Metrics=METRICS) -> None:
+        """
+        Initializes an empty Pipeline object.
+
+        Args:
+            metrics (Metrics, optional): The metrics the stages are reported in. Defaults to METRICS.
+
+        Attributes:
+            stages (list): The stages, in the order they were added.
+            metrics (Metrics): The metrics the stages are reported in.
+        """
+        self.stages = []
+        self.metrics = metrics
+
+
+    def stage(self, name: str, work: Callable, workers: int=1, capacity: int=64, outputs: tuple=(),
+              on_error: Callable=None) -> Stage:
+        """
+        Adds a stage.  See Stage for the arguments.
+
+        Returns:
+            Stage: The stage, for the stages feeding it to name as an output.
+        """
+        stage = Stage(name, work, workers, capacity, outputs, self.metrics, on_error)
+        self.stages.append(stage)
+        return stage
+
+
+    def run(self, source: Iterable, first: Stage) -> None:
+        """
+        Starts every stage, feeds the source's items to the first one, and waits until every stage has finished.
+
+        Args:
+            source (Iterable): The items to feed the first stage.  It's read as the first stage's queue has room,
+                so it can be a stream of any length.
+            first (Stage): The stage to feed.
+        """
+        first.producers += 1
+
+        for stage in self.stages:
+            stage.start()
+
+        try:
+            for item in source:
+                first.put(item)
+        finally:
+            first.close()
+            for stage in self.stages:
+                stage.join()
+
+
+    def depths(self) -> dict:
+        """
+        Reads the current depth of each stage's queue.
+
+        Returns:
+            dict: The number of items waiting in each stage's queue, keyed by name.
+        """
+        return {stage.name: stage.queue.qsize() for stage in self.stages}
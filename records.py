@@ -0,0 +1,188 @@
+'''Description: This file creates a CastRecord dataclass and a CastStore class that holds cast entries column by
+column, so that millions of entries don't each carry the overhead of a dictionary.'''
+from array import array
+from dataclasses import dataclass
+import sys
+from typing import Generator
+
+# The base URL of IMDb's person pages.
+NAME_URL = 'https://www.imdb.com/name/'
+
+# Ratings are stored as machine integers; this value stands in for a missing rating.
+MISSING = -2**63
+
+
+def person_url(nconst: str, base: str=NAME_URL) -> str:
+    """
+    Builds the URL of a person's IMDb page.
+
+    Args:
+        nconst (str): The IMDb id of the person.
+        base (str, optional): The base URL of the person pages. Defaults to NAME_URL.
+
+    Returns:
+        str: The URL of the person's page.
+    """
+    return f'{base}{nconst}/'
+
+
+@dataclass(slots=True)
+class CastRecord:
+    '''
+    Description: This class represents one cast member of one title.
+    '''
+    tconst: str
+    nconst: str
+    actor: str
+    rating: int = None
+    ratingChange: int = None
+
+    @property
+    def url(self) -> str:
+        return person_url(self.nconst)
+
+
+class CastStore:
+    '''
+    Description: This class stores cast entries as parallel columns.  The id and name columns are lists of interned
+    strings, so a title or person repeated across many rows is stored once, and the rating columns are arrays of
+    64-bit integers.
+    '''
+    def __init__(self) -> None:
+        """
+        Initializes an empty CastStore object.
+
+        Attributes:
+            tconst (list): The IMDb id of the title of each entry.
+            nconst (list): The IMDb id of the person of each entry.
+            actor (list): The name of the person of each entry.
+            rating (array): The STARmeter rank of each entry, or MISSING.
+            ratingChange (array): The net change in STARmeter rank of each entry, or MISSING.
+        """
+        self.tconst = []
+        self.nconst = []
+        self.actor = []
+        self.rating = array('q')
+        self.ratingChange = array('q')
+
+
+    def __len__(self) -> int:
+        return len(self.nconst)
+
+
+    def __getitem__(self, i: int) -> CastRecord:
+        return CastRecord(
+            self.tconst[i],
+            self.nconst[i],
+            self.actor[i],
+            self._get(self.rating, i),
+            self._get(self.ratingChange, i)
+        )
+
+
+    def append(self, tconst: str, nconst: str, actor: str, rating: int=None, rating_change: int=None) -> int:
+        """
+        Adds an entry.
+
+        Args:
+            tconst (str): The IMDb id of the title.
+            nconst (str): The IMDb id of the person.
+            actor (str): The name of the person.
+            rating (int, optional): The person's STARmeter rank. Defaults to None.
+            rating_change (int, optional): The net change in the person's STARmeter rank. Defaults to None.
+
+        Returns:
+            int: The index of the new entry.
+        """
+        self.tconst.append(sys.intern(tconst))
+        self.nconst.append(sys.intern(nconst))
+        self.actor.append(sys.intern(actor))
+        self.rating.append(MISSING if rating is None else rating)
+        self.ratingChange.append(MISSING if rating_change is None else rating_change)
+        return len(self.nconst) - 1
+
+
+    def set_rating(self, i: int, rating: int, rating_change: int) -> None:
+        """
+        Sets the STARmeter data of an entry.
+
+        Args:
+            i (int): The index of the entry.
+            rating (int): The person's STARmeter rank, or None.
+            rating_change (int): The net change in the person's STARmeter rank, or None.
+        """
+        self.rating[i] = MISSING if rating is None else rating
+        self.ratingChange[i] = MISSING if rating_change is None else rating_change
+
+
+    def rows(self, start: int=0, stop: int=None) -> Generator:
+        """
+        Streams a range of entries as dictionaries, in the shape the sinks and the journal expect.
+
+        Args:
+            start (int, optional): The index of the first entry. Defaults to 0.
+            stop (int, optional): The index to stop before. Defaults to the end of the store.
+
+        Yields:
+            dict: The entry's tconst, actor, nconst, url, rating and ratingChange.
+        """
+        for i in range(start, len(self) if stop is None else stop):
+            yield {
+                'tconst': self.tconst[i],
+                'actor': self.actor[i],
+                'nconst': self.nconst[i],
+                'url': person_url(self.nconst[i]),
+                'rating': self._get(self.rating, i),
+                'ratingChange': self._get(self.ratingChange, i),
+            }
+
+
+    def clear(self) -> None:
+        """
+        Removes every entry.
+        """
+        self.__init__()
+
+
+    def to_frame(self) -> object:
+        """
+        Converts the store to a pandas DataFrame.  The rating columns are copied as whole buffers (a copy, so the
+        store can keep growing) rather than converted row by row, and become nullable Int64 columns.
+
+        Returns:
+            DataFrame: One row per entry, without the url column.
+        """
+        import numpy as np
+        import pandas as pd
+
+        columns = {'tconst': self.tconst, 'nconst': self.nconst, 'actor': self.actor}
+        for name in ('rating', 'ratingChange'):
+            values = np.frombuffer(getattr(self, name), dtype=np.int64).copy()
+            columns[name] = pd.arrays.IntegerArray(values, values == MISSING)
+
+        return pd.DataFrame(columns)
+
+
+    def to_arrow(self) -> object:
+        """
+        Converts the store to a pyarrow Table.  The rating columns are copied as whole buffers rather than
+        converted row by row.
+
+        Returns:
+            Table: One row per entry, without the url column.
+        """
+        import numpy as np
+        import pyarrow
+
+        columns = {'tconst': self.tconst, 'nconst': self.nconst, 'actor': self.actor}
+        for name in ('rating', 'ratingChange'):
+            values = np.frombuffer(getattr(self, name), dtype=np.int64).copy()
+            columns[name] = pyarrow.array(values, mask=values == MISSING)
+
+        return pyarrow.table(columns)
+
+
+    @staticmethod
+    def _get(column: array, i: int) -> int:
+        value = column[i]
+        return None if value == MISSING else value
@@ -0,0 +1,260 @@
+'''Description: This file creates the retry policy applied to page fetches, the exceptions the fetchers raise, and
+a DeadLetterQueue class that records the titles that still failed so they can be re-run on their own.'''
+from dataclasses import dataclass
+import json
+import os
+import random
+import threading
+import time
+from typing import Callable, Generator
+import requests
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+
+class HttpStatusError(Exception):
+    '''
+    Description: This exception is raised when a host answers with an error status.
+    '''
+    def __init__(self, url: str, status: int) -> None:
+        super().__init__(f'{status} for url: {url}')
+        self.url = url
+        self.status = status
+
+
+class ServerError(HttpStatusError):
+    '''
+    Description: This exception is raised when a host answers with a 5xx status other than 503.
+    '''
+
+
+class ThrottledError(HttpStatusError):
+    '''
+    Description: This exception is raised when a host answers with 429 or 503, asking us to slow down.
+    '''
+
+
+class FetchFailed(Exception):
+    '''
+    Description: This exception is raised when every fetcher has failed to retrieve a page, after retries.
+    '''
+    def __init__(self, url: str, cause: BaseException, attempts: int) -> None:
+        super().__init__(f'{url}: {type(cause).__name__}: {cause} (after {attempts} attempts)')
+        self.url = url
+        self.cause = cause
+        self.attempts = attempts
+
+
+@dataclass(frozen=True)
+class RetryRule:
+    '''
+    Description: This class describes how often, and how patiently, one class of error is retried.
+    '''
+    attempts: int
+    base: float
+    cap: float
+
+
+# The rule for each class of error.  Errors of classes not listed here (a 404, say) aren't retried.
+DEFAULT_RULES = {
+    ThrottledError: RetryRule(attempts=6, base=5.0, cap=120.0),
+    ServerError: RetryRule(attempts=4, base=2.0, cap=30.0),
+    requests.Timeout: RetryRule(attempts=4, base=1.0, cap=30.0),
+    requests.ConnectionError: RetryRule(attempts=4, base=1.0, cap=30.0),
+    TimeoutException: RetryRule(attempts=2, base=2.0, cap=10.0),
+    WebDriverException: RetryRule(attempts=3, base=5.0, cap=30.0),
+}
+
+
+class RetryPolicy:
+    '''
+    Description: This class retries a call with exponential backoff and jitter, according to the rule for the class
+    of error it raised, until it succeeds, runs out of attempts, or passes its deadline.
+    '''
+    def __init__(self, rules: dict=None, deadline: float=120.0, jitter: float=0.5) -> None:
+        """
+        Initializes the RetryPolicy object.
+
+        Args:
+            rules (dict, optional): The RetryRule for each exception class. The rule of the nearest listed base
+                class applies. Defaults to DEFAULT_RULES.
+            deadline (float, optional): The number of seconds after which a URL is given up on, however many
+                attempts remain. Defaults to 120.0.
+            jitter (float, optional): The fraction of each backoff that is randomized, so that workers which
+                failed together don't retry together. Defaults to 0.5.
+
+        Attributes:
+            rules (dict): The RetryRule for each exception class.
+            deadline (float): The number of seconds after which a URL is given up on.
+            jitter (float): The fraction of each backoff that is randomized.
+            retries (int): The number of retries made so far.
+        """
+        self.rules = rules if rules is not None else DEFAULT_RULES
+        self.deadline = deadline
+        self.jitter = jitter
+        self.retries = 0
+        self._lock = threading.Lock()
+
+
+    def rule_for(self, error: BaseException) -> RetryRule:
+        """
+        Finds the rule for an error.
+
+        Args:
+            error (BaseException): The error raised.
+
+        Returns:
+            RetryRule: The rule of the error's nearest listed class, or None if the error isn't retried.
+        """
+        for cls in type(error).__mro__:
+            if cls in self.rules:
+                return self.rules[cls]
+        return None
+
+
+    def backoff(self, rule: RetryRule, attempt: int) -> float:
+        """
+        Computes the delay before a retry.
+
+        Args:
+            rule (RetryRule): The rule for the error.
+            attempt (int): The number of attempts made so far.
+
+        Returns:
+            float: The number of seconds to wait.
+        """
+        delay = min(rule.cap, rule.base * 2 ** (attempt - 1))
+        return delay * (1 - self.jitter * random.random())
+
+
+    def call(self, function: Callable, deadline: float=None) -> tuple:
+        """
+        Calls a function, retrying it according to the rules.
+
+        Args:
+            function (Callable): The function to call, without arguments.
+            deadline (float, optional): The monotonic time to give up at. Defaults to deadline seconds from now.
+
+        Returns:
+            tuple: The function's result and the number of attempts made.
+
+        Raises:
+            Exception: The last error raised, once it isn't retried, attempts run out, or the deadline passes.
+                Its `attempts` attribute holds the number of attempts made.
+        """
+        deadline = time.monotonic() + self.deadline if deadline is None else deadline
+        attempt = 0
+
+        while True:
+            attempt += 1
+            try:
+                return function(), attempt
+            except Exception as e:
+                rule = self.rule_for(e)
+                delay = self.backoff(rule, attempt) if rule is not None else 0.0
+
+                if rule is None or attempt >= rule.attempts or time.monotonic() + delay > deadline:
+                    e.attempts = attempt
+                    raise
+
+            with self._lock:
+                self.retries += 1
+            time.sleep(delay)
+
+
+class DeadLetterQueue:
+    '''
+    Description: This class records the titles that couldn't be completed, with the URL and error that stopped
+    each one, in memory and optionally in a JSON lines file.
+    '''
+    def __init__(self, path: str=None) -> None:
+        """
+        Initializes the DeadLetterQueue object, reading any entries already recorded at path.
+
+        Args:
+            path (str, optional): The JSON lines file to append entries to. Defaults to None (memory only).
+
+        Attributes:
+            path (str): The JSON lines file entries are appended to, or None.
+            entries (list): The recorded entries.
+        """
+        self.path = path
+        self.entries = []
+        self._lock = threading.Lock()
+
+        if path is not None and os.path.exists(path):
+            with open(path, encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        self.entries.append(json.loads(line))
+                    except ValueError:
+                        continue
+
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+    def add(self, tconst: str, url: str, kind: str, error: str, attempts: int=0) -> None:
+        """
+        Records a failure.
+
+        Args:
+            tconst (str): The IMDb id of the title that couldn't be completed.
+            url (str): The URL that failed, the title's own or one of its cast's.
+            kind (str): 'fetch' if the page couldn't be retrieved, 'missing' if it was retrieved without the
+                fragment, or 'extract' if the fragment couldn't be parsed.
+            error (str): A description of the error.
+            attempts (int, optional): The number of attempts made. Defaults to 0.
+        """
+        entry = {'tconst': tconst, 'url': url, 'kind': kind, 'error': error, 'attempts': attempts,
+                 'at': time.time()}
+
+        with self._lock:
+            self.entries.append(entry)
+
+            if self.path is not None:
+                with open(self.path, 'a', encoding='utf-8') as file:
+                    file.write(json.dumps(entry) + '\n')
+
+
+    def tconsts(self) -> Generator:
+        """
+        Streams the distinct titles with recorded failures, in the order they first failed.
+
+        Yields:
+            str: The IMDb id of a title.
+        """
+        yield from dict.fromkeys(entry['tconst'] for entry in self.entries)
+
+
+    def remove(self, entries: list) -> None:
+        """
+        Removes some of the entries, e.g. once the titles they were recorded for have been re-run.  The file is
+        rewritten to a temporary file and swapped in, so a crash part way through leaves the old one whole.
+
+        Args:
+            entries (list): The entries to remove, as found in the entries attribute.
+        """
+        ids = {id(entry) for entry in entries}
+
+        with self._lock:
+            self.entries = [entry for entry in self.entries if id(entry) not in ids]
+
+            if self.path is not None:
+                with open(f'{self.path}.tmp', 'w', encoding='utf-8') as file:
+                    for entry in self.entries:
+                        file.write(json.dumps(entry) + '\n')
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(f'{self.path}.tmp', self.path)
+
+
+    def clear(self) -> None:
+        """
+        Removes every entry.
+        """
+        with self._lock:
+            self.entries = []
+
+            if self.path is not None and os.path.exists(self.path):
+                os.remove(self.path)
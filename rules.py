@@ -0,0 +1,179 @@
+'''Description: This file contains the declarative extraction rules: a spec mapping field names to CSS selectors and
+post-processors, compiled once into a RuleSet that reads every field in a single walk over a document.'''
+import json
+import re
+from typing import Callable, NamedTuple
+from bs4 import BeautifulSoup, Tag
+import soupsieve
+
+
+def number(text: str) -> int:
+    # '1,234' and 'Top 1,234' both read as 1234.
+    digits = re.sub(r'[^\d]', '', text)
+    return int(digits) if digits else None
+
+
+# The post-processors a spec can name.  They're applied to the value taken from each matching element.
+POST = {
+    'strip': str.strip,
+    'lower': str.lower,
+    'int': int,
+    'number': number,
+    'nconst': lambda href: href.split('/')[2],
+}
+
+
+class Rule(NamedTuple):
+    '''
+    Description: This class is one compiled field of a RuleSet.
+    '''
+    name: str
+    selector: soupsieve.SoupSieve
+    many: bool
+    take: str
+    post: Callable
+
+    def value(self, element: Tag) -> object:
+        """
+        Reads the field's value from an element the selector matched.
+
+        Args:
+            element (Tag): The element.
+
+        Returns:
+            object: The element itself, its text, its string or one of its attributes, as take says, passed through
+            the post-processor if there is one.
+        """
+        match self.take:
+            case 'element':
+                value = element
+            case 'text':
+                value = element.get_text()
+            case 'string':
+                value = element.string
+            case _:
+                value = element.get(self.take[1:])
+
+        return self.post(value) if self.post is not None and value is not None else value
+
+
+class RuleSet:
+    '''
+    Description: This class compiles an extraction spec once and applies it to any number of documents.  Each field
+    of the spec is a dict with the keys:
+
+        css: The CSS selector of the elements holding the field (required).
+        many: Whether to collect every match in a list, rather than take the first. Defaults to False.
+        take: 'text', 'string', 'element' or '@<attribute>', what to read from each match. Defaults to 'text'.
+        post: The name of one of POST, or a callable, applied to what was read. Defaults to None.
+
+    The fields' selectors are also joined into one selector list, so that applying the rules walks the document
+    once, however many fields there are; only the elements that selector matches are tested against each field.
+    '''
+    def __init__(self, spec: dict, namespaces: dict=None) -> None:
+        """
+        Initializes the RuleSet object, compiling the spec.
+
+        Args:
+            spec (dict): The fields, keyed by name.
+            namespaces (dict, optional): The namespace prefixes the selectors use. Defaults to None.
+
+        Attributes:
+            rules (list): The compiled Rule of each field, in the spec's order.
+            selector (SoupSieve): The selector list matching every field's elements.
+
+        Raises:
+            ValueError: If a field has no CSS selector, or names an unknown take or post-processor.
+            SelectorSyntaxError: If a selector isn't valid CSS.
+        """
+        self.rules = []
+
+        for name, field in spec.items():
+            if 'css' not in field:
+                # soupsieve only speaks CSS; an XPath would need a second, lxml-built tree and a second walk.
+                raise ValueError(f'Rule {name!r} has no css selector')
+
+            take = field.get('take', 'text')
+            if take not in ('text', 'string', 'element') and not take.startswith('@'):
+                raise ValueError(f"Rule {name!r} has an unknown take: {take!r}, expected text, string, element or "
+                                 f"'@<attribute>'")
+
+            post = field.get('post')
+            if isinstance(post, str):
+                if post not in POST:
+                    raise ValueError(f'Rule {name!r} has an unknown post-processor: {post!r}, expected one of '
+                                     f'{tuple(POST)}')
+                post = POST[post]
+
+            self.rules.append(Rule(name, soupsieve.compile(field['css'], namespaces), field.get('many', False), take,
+                                   post))
+
+        self.selector = soupsieve.compile(', '.join(rule.selector.pattern for rule in self.rules), namespaces)
+
+
+    def apply(self, soup: BeautifulSoup) -> dict:
+        """
+        Reads every field from a document.
+
+        Args:
+            soup (BeautifulSoup): The document, or a fragment of it.
+
+        Returns:
+            dict: The value of each field: a list of values for the many fields, and the first match's value, or
+            None if nothing matched, for the others.
+        """
+        fields = {rule.name: [] if rule.many else None for rule in self.rules}
+        pending = {rule.name for rule in self.rules if not rule.many}
+        collecting = any(rule.many for rule in self.rules)
+
+        for element in self.selector.iselect(soup):
+            for rule in self.rules:
+                if (rule.many or rule.name in pending) and rule.selector.match(element):
+                    if rule.many:
+                        fields[rule.name].append(rule.value(element))
+                    else:
+                        fields[rule.name] = rule.value(element)
+                        pending.discard(rule.name)
+
+            # Once every single field is found there's no need to walk the rest of the document.
+            if not pending and not collecting:
+                break
+
+        return fields
+
+
+def load_rules(filename: str) -> RuleSet:
+    """
+    Loads and compiles a spec from a JSON or YAML file.  YAML needs the optional PyYAML package.
+
+    Args:
+        filename (str): The spec file, .json, .yaml or .yml.
+
+    Returns:
+        RuleSet: The compiled rules.
+    """
+    with open(filename, encoding='utf-8') as file:
+        if filename.endswith(('.yaml', '.yml')):
+            # PyYAML is only needed for YAML specs, so it's imported here.
+            import yaml
+            spec = yaml.safe_load(file)
+        else:
+            spec = json.load(file)
+
+    return RuleSet(spec)
+
+
+# The fields StarScraper reads from the starring cast fragment of a title page: the links to the stars' pages,
+# which follow the 'Stars' label.
+CAST_RULES = RuleSet({
+    'stars': {'css': 'a:-soup-contains-own("Stars") + div a', 'many': True, 'take': 'element'},
+})
+
+# The fields StarScraper reads from the STARmeter fragment of a name page.  The trend icons are only there when the
+# rank has moved, and the difference is the second span after the icon.
+STAR_RULES = RuleSet({
+    'rank': {'css': 'span.starmeter-current-rank'},
+    'up': {'css': 'svg.ipc-icon--popularity-up', 'take': 'element'},
+    'down': {'css': 'svg.ipc-icon--popularity-down', 'take': 'element'},
+    'difference': {'css': 'svg:is(.ipc-icon--popularity-up, .ipc-icon--popularity-down) ~ span:nth-of-type(2)'},
+})
@@ -1,19 +1,52 @@
 '''Description: This file creates a Scraper class that uses beautiful soup to scrape the web for text
 from a url input by the user.'''
 from abc import ABC
+import asyncio
+import contextlib
 import requests
-from typing import Generator
-from bs4 import BeautifulSoup
-from selenium import webdriver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Generator
+from functools import cached_property, partial
+from bs4 import BeautifulSoup, SoupStrainer
 from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
 from selenium.common.exceptions import WebDriverException
-
-WEBDRIVER = webdriver.Firefox()
+from cache import ResponseCache
+from drivers import DRIVER_POOL, BrowserProfile, WebDriverPool, get_profile
+from extract import NEXT_DATA_SELECTOR, next_data, star_meter, title_cast
+from fetchers import CAST_SELECTOR, STAR_SELECTOR, STRAINERS, BrowserFetcher, HttpFetcher, build_strategy, make_session
+from frontier import FAILED, Frontier, canonical
+from journal import Journal
+from memory import MemoryMonitor
+from metrics import Metrics
+from parsing import select_fragment, soup_parser
+from persons import PersonIndex
+from pipeline import Pipeline
+from records import CastStore, person_url
+from retry import DeadLetterQueue, FetchFailed, RetryPolicy
+from rules import CAST_RULES, STAR_RULES, RuleSet
+from sinks import COLUMNS, Sink, open_sink
+from sources import batched, read_rows
+from throttle import HostScheduler
+
+# The ways StarScraper can read a page: from the JSON the page embeds, falling back to the DOM when the JSON is
+# missing or not shaped as expected, or from the DOM alone.
+EXTRACTORS = ('json', 'dom')
+
+# The columns of the diff refresh_star_data writes: each person whose STARmeter data changed, before and after.
+DIFF_COLUMNS = ['nconst', 'actor', 'previousRating', 'rating', 'previousRatingChange', 'ratingChange', 'rankDelta']
+
+# The number of people refresh_star_data fetches per round, which bounds the pages held in memory at once.
+REFRESH_CHUNK = 256
 
 
 class Scraper(ABC):
-    def __init__(Scraper):
-        self.webdriver = WEBDRIVER
+    def __init__(self, pool: WebDriverPool=None) -> None:
+        # Browsers are leased from the pool when a page is loaded, so constructing a scraper never starts one.
+        self.pool = pool if pool is not None else DRIVER_POOL
 
     def make_soup():
         pass
@@ -23,200 +56,457 @@ class StarScraper(Scraper):
     '''
     Description: This class contains methods to scrape star ratings for cast members of a film or tv show.
     '''
-    def __init__(self, filename: str=None, webdriver=None) -> None:
+    def __init__(self, filename: str=None, pool: WebDriverPool=None, workers: int=1,
+                 fetch_mode: str='auto', cache: ResponseCache=None, persons: PersonIndex=None,
+                 start_row: int=0, stop_row: int=None, batch_size: int=4, journal: Journal=None, sink: Sink=None,
+                 parser: str='html.parser', scheduler: HostScheduler=None, retry_policy: RetryPolicy=None,
+                 failures: DeadLetterQueue=None, metrics: Metrics=None, site: str='https://www.imdb.com',
+                 browser_profile: BrowserProfile=None, extractor: str='json', frontier: Frontier=None,
+                 keep_cast: bool=True, monitor: MemoryMonitor=None) -> None:
             """
             Initializes the StarScraper object.
 
             Args:
-                filename (str, optional): The name of the file to save the scraped data. Defaults to None.
-                webdriver (object, optional): The webdriver object to use for scraping. Defaults to None.
+                filename (str, optional): The title list to read the tconst values from: an Excel workbook, a CSV
+                    file, or an IMDb-style TSV file (optionally gzipped). Defaults to None.
+                pool (WebDriverPool, optional): The pool to lease browsers from. Defaults to the shared DRIVER_POOL,
+                    or to a pool of `workers` browsers when more than one worker is requested.
+                workers (int, optional): The number of pages to fetch concurrently. Defaults to 1.
+                fetch_mode (str, optional): 'auto' to try plain HTTP first and fall back to a browser, 'http' for
+                    HTTP only, or 'browser' for a browser only. Defaults to 'auto'.
+                cache (ResponseCache, optional): The cache to consult before fetching a page. Defaults to None.
+                persons (PersonIndex, optional): The index of people already fetched. Defaults to a new in-memory
+                    index, so each person is fetched at most once per run.
+                start_row (int, optional): The number of rows of the title list to skip. Defaults to 0.
+                stop_row (int, optional): The row of the title list to stop before, so that a shard of the list can
+                    be scraped on its own. Defaults to None (the end of the list).
+                batch_size (int, optional): The number of titles scraped and written per batch. Defaults to 4.
+                journal (Journal, optional): The journal completed titles are recorded to. Titles already in it are
+                    skipped, so a restarted run resumes where it stopped. Defaults to '../data/journal.jsonl' when
+                    a filename is given.
+                sink (Sink, optional): A sink each completed title's rows are written to as soon as the title is
+                    recorded. The caller owns the sink and closes it. Defaults to None.
+                parser (str, optional): The parser backend, one of parsing.PARSERS: 'html.parser', 'lxml',
+                    'html5lib' or 'selectolax'. Defaults to 'html.parser'.
+                scheduler (HostScheduler, optional): The scheduler pacing requests to each host, shared by every
+                    worker. Defaults to a new HostScheduler with its default rates.
+                retry_policy (RetryPolicy, optional): The policy failed fetches are retried under. Defaults to a
+                    RetryPolicy with the default rules.
+                failures (DeadLetterQueue, optional): The queue titles that still failed after retries are recorded
+                    to. Defaults to '../data/failures.jsonl' when a filename is given, otherwise an in-memory queue.
+                metrics (Metrics, optional): The metrics each step is timed and counted in. Defaults to metrics whose
+                    summary is written to '../data/metrics.json' when a filename is given, otherwise to nowhere.
+                site (str, optional): The site the title and name pages are fetched from; the benchmarks point it at
+                    a local stand-in. Defaults to 'https://www.imdb.com'.
+                browser_profile (str or BrowserProfile, optional): The profile browsers are started with when no
+                    pool is given: a BrowserProfile, or a name from drivers.PROFILES such as 'lean'. Defaults to None
+                    (a plain Firefox).
+                extractor (str, optional): 'json' to read each page's cast or STARmeter data from the __NEXT_DATA__
+                    JSON it embeds, falling back to the DOM, or 'dom' to read the DOM only. Defaults to 'json'.
+                frontier (Frontier, optional): The frontier tracking the titles and people of the run. Defaults to an
+                    empty one on site.
+                keep_cast (bool, optional): Whether to keep the cast entries of every title in memory, to be returned
+                    by scrape_star_data.  A long run should pass False: the entries of each batch are then freed as
+                    soon as the journal has them on disk, and the journal is the record of the run. Defaults to True.
+                monitor (MemoryMonitor, optional): The monitor sampling the memory of the scraper and its browsers
+                    while a scrape runs. Defaults to None (not sampled).
 
             Attributes:
-                webdriver (object): The webdriver object to use for scraping.
-                parser (str): The parser to use for parsing HTML content.
+                pool (WebDriverPool): The pool to lease browsers from.
+                workers (int): The number of pages to fetch concurrently.
+                executor (ThreadPoolExecutor): The thread pool used to fetch pages when workers > 1, otherwise None.
+                parser (str): The BeautifulSoup parser to use for parsing the fetched fragments.
+                fetcher (FetchStrategy): The strategy used to retrieve pages; fetcher.counts counts the URLs each
+                    path served, and fetcher.served records which path served each URL within fetcher.history.
+                scheduler (HostScheduler): The scheduler pacing requests to each host.
+                failures (DeadLetterQueue): The queue titles that couldn't be completed are recorded to.
+                errors (dict): The (kind, error, attempts) of each URL make_soup couldn't make a soup of, until the
+                    failure is queued.
+                metrics (Metrics): The metrics each step is timed and counted in.
+                extractor (str): 'json' or 'dom', the way pages are read.
+                frontier (Frontier): The state of every title and person the run has admitted, keyed by tconst or
+                    nconst, so that duplicates in the title list and people failed earlier in the run aren't fetched
+                    again.
                 base_url (str): The base URL of the web page to scrape.
+                name_url (str): The base URL of the person pages.
                 filename (str): The name of the file from which to read the tconst values.
-                records (bool): A flag to indicate whether the cast dictionaries have been created.
-                idx (int): An index to keep track of the current position in the data frame.
-                cast_dicts (list): A list of dictionaries containing cast information.
-                df (DataFrame): A pandas DataFrame containing the tconst, director, and cast columns from the Excel file.
+                idx (int): An index to keep track of the current batch.
+                return_to_row (int): The row of the title list to resume from.
+                batch_size (int): The number of titles scraped and written per batch.
+                journal (Journal): The journal completed titles are recorded to, or None.
+                sink (Sink): The sink completed rows are streamed to, or None.
+                batches (Generator): The stream of batches of (tconst, cast) rows read from the title list, less
+                    the titles already in the journal.
+                titles (dict): The (start, stop) range of cast entries of each title fetched in the current batch,
+                    keyed by tconst.
+                batch_start (int): The index of the first cast entry of the current batch.
+                exhausted (bool): A flag to indicate whether the title list has been read to the end.
+                cast (CastStore): The cast entries scraped so far, stored column by column.
+                persons (PersonIndex): The index of people already fetched, keyed by nconst.
+                fetches_saved (int): The number of person fetches skipped because the person was in the index.
+                keep_cast (bool): Whether the cast entries of every title are kept in memory.
+                monitor (MemoryMonitor): The monitor sampling memory while a scrape runs, or None.
             """
-            super.__init__()
-
-            self.parser = 'html.parser'
-            self.base_url = 'https://www.imdb.com/title/'
+            # A pool the caller passed in keeps the cap they gave it; only the scraper's own pool is grown to fit
+            # more workers (see size_pools).
+            self._owns_pool = pool is None
+
+            # Each worker needs a browser of its own, so the shared single-browser pool won't do for concurrent runs,
+            # and the shared pool's browsers are started without a profile.
+            if pool is None and (workers > 1 or browser_profile is not None):
+                factory = get_profile(browser_profile).factory() if browser_profile is not None else None
+                pool = WebDriverPool(factory, max_drivers=workers)
+
+            if extractor not in EXTRACTORS:
+                raise ValueError(f'Unknown extractor: {extractor!r}, expected one of {EXTRACTORS}')
+
+            super().__init__(pool)
+
+            self.workers = workers
+            self.extractor = extractor
+            self.executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+            self.parser = soup_parser(parser)
+            self.scheduler = scheduler if scheduler is not None else HostScheduler()
+            self.metrics = metrics if metrics is not None else Metrics(
+                '../data/metrics.json' if filename is not None else None
+            )
+            self.fetcher = build_strategy(fetch_mode, self.pool, pool_size=workers, parser=parser, cache=cache,
+                                          scheduler=self.scheduler, policy=retry_policy, metrics=self.metrics)
+            self.failures = failures if failures is not None else DeadLetterQueue(
+                '../data/failures.jsonl' if filename is not None else None
+            )
+            self.errors = {}
+            self.base_url = f'{site}/title/'
+            self.name_url = f'{site}/name/'
+            self.frontier = frontier if frontier is not None else Frontier(site)
             self.filename = filename
-            self.records = False
             self.idx = 0
-            self.return_to_row = None
-            self.cast_dicts = None
-            self.df = pd.read_excel(
-                # file to read
-                io=self.filename,
-                # columns to incude in the data frame.
-                usecols=[
-                    'tconst',
-                    'director',
-                    'cast'
-                    ],
-                # spcify the data types of the columns to avoid type inference.
-                dtype={
-                    'tconst': str,
-                    'director': str,
-                    'cast': str
-                    },
-                # engine to use for reading the file.  We'll use openpyxl to avoid the warning message.
-                engine='openpyxl'
-
-                # uncomment the following line and comment out the previous line if you'd like to use the default engine.
-                # engine=None
-            )
+            self.return_to_row = start_row
+            self.batch_size = batch_size
+            self.exhausted = False
+            self.cast = CastStore()
+            self.batch_start = 0
+            self.persons = persons if persons is not None else PersonIndex()
+            self.fetches_saved = 0
+
+            self.titles = {}
+            self.sink = sink
+            self.keep_cast = keep_cast
+            self.monitor = monitor
+            self.journal = journal if journal is not None or filename is None else Journal()
+
+            # The title list is streamed a batch at a time rather than loaded up front, so memory stays flat however
+            # long it is.  Nothing is read until the first batch is requested.  Titles the journal already has are
+            # filtered out of the stream, which is all it takes to resume an interrupted run, and so are titles
+            # listed more than once.
+            if filename is not None:
+                self.batches = batched(self.admit_titles(read_rows(filename, start=start_row, stop=stop_row)),
+                                       batch_size)
+            else:
+                self.batches = iter(())
+
+
+    def size_pools(self, workers: int) -> None:
+            """
+            Sizes the HTTP connection pool and the scraper's own browser pool for a number of threads fetching at
+            the same time, when that's more than the scraper was built for (e.g. the pipeline's title and person
+            workers together).  A browser pool the caller passed in keeps its cap.
 
+            Args:
+                workers (int): The number of threads that will be fetching at the same time.
+            """
+            if workers <= self.workers:
+                return
 
-    def make_soup(self, url: str) -> BeautifulSoup:
+            # The shared single-browser pool can't be grown for one scraper, so the scraper gets a pool of its own.
+            if self._owns_pool:
+                pool = self.own_pool()
+                pool.max_drivers = max(pool.max_drivers, workers)
+
+            for fetcher in self.fetcher.fetchers:
+                if isinstance(fetcher, HttpFetcher):
+                    fetcher.resize(workers)
+
+            self.workers = workers
+
+
+    def own_pool(self) -> WebDriverPool:
+            """
+            Gives the scraper a browser pool of its own in place of the shared DRIVER_POOL, so that its settings can
+            be changed without changing them for every other user of the shared pool.  The new pool starts browsers
+            the same way and recycles them at the same limits; the browser fetcher and the memory monitor are pointed
+            at it.
+
+            Returns:
+                WebDriverPool: The scraper's pool.
+            """
+            if self.pool is not DRIVER_POOL:
+                return self.pool
+
+            self.pool = WebDriverPool(DRIVER_POOL.factory, max_drivers=DRIVER_POOL.max_drivers,
+                                      max_pages=DRIVER_POOL.max_pages, max_rss=DRIVER_POOL.max_rss)
+
+            for fetcher in self.fetcher.fetchers:
+                if isinstance(fetcher, BrowserFetcher):
+                    fetcher.pool = self.pool
+
+            if self.monitor is not None and self.monitor.pool is DRIVER_POOL:
+                self.monitor.pool = self.pool
+
+            return self.pool
+
+
+    def admit_titles(self, rows: Generator) -> Generator:
+            """
+            Admits the titles of a title list to the frontier, passing on only those that are new to the run and not
+            yet in the journal.
+
+            Args:
+                rows (Generator): The (tconst, cast) of each row; the tconst may also be a title URL.
+
+            Yields:
+                tuple: The canonical tconst and the cast of each title to scrape.
+            """
+            for tconst, cast in rows:
+                if (key := self.frontier.add(tconst)) is None:
+                    self.metrics.incr('titles.duplicate')
+                elif key in self.journal:
+                    self.frontier.done(key)
+                else:
+                    yield key, cast
+
+
+    def make_soup(self, url: str, selector: str=None) -> BeautifulSoup:
             """
             Retrieves the HTML content of a web page and returns it as a BeautifulSoup object.
 
             Args:
                 url (str): The URL of the web page to scrape.
+                selector (str, optional): The CSS selector of the fragment to parse. Defaults to the STARmeter
+                    fragment for a person page and the starring cast fragment for a title page.
 
             Returns:
-                BeautifulSoup: A BeautifulSoup object representing the parsed HTML content of the web page.
+                BeautifulSoup: A BeautifulSoup object representing the parsed HTML content of the web page, or None
+                if neither HTTP nor the browser could retrieve it, in which case the reason is kept in self.errors.
+            """
+            selector = selector if selector is not None else self.dom_selector(url)
 
-            Raises:
-                WebDriverException: If there is an exception while retrieving the HTML content.
-                TypeError: If there is a type error while processing the data.
+            with self.metrics.span('make_soup'):
+                if (fragment := self.fetch_fragment(url, selector)) is None:
+                    return None
+
+                # Return the BeautifulSoup object representing the HTML content of the web page.
+                with self.metrics.span('parse'):
+                    return BeautifulSoup(
+                        fragment,
+                        self.parser
+                    )
+
+
+    def dom_selector(self, url: str) -> str:
+            # The fragment is chosen by the kind of page, so title and person pages can be fetched at the same time.
+            return STAR_SELECTOR if url.startswith(self.name_url) else CAST_SELECTOR
+
+
+    def fetch_fragment(self, url: str, selector: str) -> str:
             """
-            # Open the URL in a broswer window using the webdriver object
-            self.webdriver.get(url)
+            Retrieves a fragment of a web page, recording the reason in self.errors if it can't.
 
-            # Check whether the cast dictionaries have been created
-            match self.records:
-                case True:
-                    # Once the cast dictionaries are created, we'll flip the records flag to True, ceasing
-                    # iteration through the title urls.  Instead, we'll iterate through the cast dictionaries and
-                    # open the URLs of the actors in the cast list to retrieve their star ratings.
-                    try:
-                        # WebDriverWait will wait for the presence of the element before attempting to retrieve
-                        # the outerHTML attribute, simulating more human-like behavior.
-                        span = WebDriverWait(self.webdriver, 10).until(
-                            EC.presence_of_element_located((By.CLASS_NAME,
-                                                            'starmeter-content'
-                                                            ))
-                        ).get_attribute('outerHTML')
-
-                        # Return the BeautifulSoup object representing the HTML content of the web page.
-                        return BeautifulSoup(
-                            span,
-                            self.parser
-                        )
-                    except WebDriverException as e:
-                        print(e)
-                        return None
-                    except TypeError as e:
-                        print(e)
-                        return None
+            Args:
+                url (str): The URL of the web page to scrape.
+                selector (str): The CSS selector of the fragment.
 
-                case False:
-                    # If the cast dictionaries have not been created, we'll iterate through, and open, the title URLs.
-                    # We'll use the data from the title URLs to create the cast dictionaries.
-                    try:
-                        # WebDriverWait will wait for the presence of the element before attempting to retrieve
-                        # the outerHTML attribute, simulating more human-like behavior.
-                        cast = WebDriverWait(self.webdriver, 10).until(
-                            EC.presence_of_element_located((By.CLASS_NAME,
-                                                            'ipc-metadata-list__item:last-of-type'
-                                                            ))
-                        ).get_attribute('outerHTML')
-
-                        # Return the BeautifulSoup object representing the HTML content of the web page.
-                        return BeautifulSoup(
-                            cast,
-                            self.parser
-                            )
-                    except WebDriverException as e:
-                        print(e)
-                        return None
-                    except TypeError as e:
-                        print(e)
-                        return None
+            Returns:
+                str: The outerHTML of the fragment, or None.
+            """
+            # The fetch strategy tries the server-rendered HTML first and only loads the page in a browser if the
+            # fragment isn't there.
+            # Each fetcher is retried according to the retry policy before the URL is given up on.
+            try:
+                fragment = self.fetcher.fetch(url, selector)
+            except FetchFailed as e:
+                print(e)
+                self.errors[url] = ('fetch', f'{type(e.cause).__name__}: {e.cause}', e.attempts)
+                return None
 
+            if fragment is None:
+                self.errors[url] = ('missing', f'{selector} not found', 1)
 
-    def get_url_cast(self) -> Generator:
+            return fragment
+
+
+    def make_data(self, url: str) -> str:
             """
-            Retrieves the URL and cast information from the given Excel file.
+            Retrieves a web page that embeds its page data in a __NEXT_DATA__ script.  The whole page is kept, so
+            that if the page data isn't shaped as expected the DOM fragment can be read from the same page.
+
+            Args:
+                url (str): The URL of the web page to scrape.
 
             Returns:
-                A generator that yields tuples of URL and cast information.
+                str: The page, or None if it couldn't be retrieved or has no page data, in which case the reason is
+                kept in self.errors.
+            """
+            with self.metrics.span('make_data'):
+                return self.fetch_fragment(url, NEXT_DATA_SELECTOR)
 
-            Raises:
-                AttributeError: If there is an attribute error while processing the data.
+
+    def make_page(self, url: str) -> object:
             """
-            if self.return_to_row is None:
-                self.return_to_row = 50
+            Retrieves a web page in the form the extractor reads: the page holding its page data, or a soup of its
+            fragment.
+            """
+            return self.make_data(url) if self.extractor == 'json' else self.make_soup(url)
 
-            # Generator to continually yield URL and cast information until the end of the file is reached.
-            if self.df.index.size - self.return_to_row < 4:
-                for idx, row in self.df.iloc[self.return_to_row:, :].iterrows():
-                    print(f'self.idx: {self.idx}, self.row: {self.return_to_row}')
 
-                    try:
-                        tconst = row['tconst']
-                        cast = row['cast'].split(', ')
-                        url = self.base_url + tconst
-                        self.return_to_row += 1
+    def soup_of(self, page: str, selector: str) -> BeautifulSoup:
+            """
+            Parses the fragment matching a selector out of a page already fetched.
+
+            Args:
+                page (str): The page.
+                selector (str): The CSS selector of the fragment.
+
+            Returns:
+                BeautifulSoup: A soup of the fragment, or None if the page has no such fragment.
+            """
+            with self.metrics.span('parse'):
+                if (fragment := select_fragment(page, selector, self.parser, STRAINERS.get(selector))) is None:
+                    return None
+                return BeautifulSoup(fragment, self.parser)
+
+
+    def fetch_soups(self, urls: list, make: Callable=None) -> list:
+            """
+            Retrieves several web pages, concurrently when more than one worker is configured.
+
+            Args:
+                urls (list): The URLs of the web pages to scrape.
+                make (Callable, optional): The method retrieving each page. Defaults to make_soup.
+
+            Returns:
+                list: The pages returned by make, in the same order as the URLs.
+            """
+            make = make if make is not None else self.make_soup
+
+            if self.executor is None:
+                return [make(url) for url in urls]
 
-                        yield url, cast
+            # executor.map yields the results in input order, however the fetches happen to finish.
+            return list(self.executor.map(make, urls))
 
-                    except AttributeError as e:
+
+    def extract(self, url: str, page: object, from_json: Callable, from_dom: Callable) -> object:
+            """
+            Reads the fields of a page from its page data, falling back to the DOM if the page data is missing or
+            not shaped as expected, or from its soup when the scraper reads the DOM only.
+
+            Args:
+                url (str): The URL of the page.
+                page (object): The page returned by make_page, or None if it couldn't be retrieved.
+                from_json (Callable): Reads the fields from the page data.
+                from_dom (Callable): Reads the fields from a soup of the page's fragment.
+
+            Returns:
+                object: The fields, or None if the page couldn't be retrieved, in which case the reason is kept in
+                self.errors.
+
+            Raises:
+                AttributeError, IndexError, ValueError: If the fields couldn't be read from the DOM.
+            """
+            if self.extractor == 'json':
+                if page is not None:
+                    try:
+                        fields = from_json(next_data(page))
+                        self.metrics.incr('extract.json')
+                        return fields
+                    except (KeyError, TypeError, ValueError) as e:
                         print(e)
-                        continue
+                elif self.errors.get(url, ('fetch',))[0] == 'fetch':
+                    # The page itself couldn't be retrieved, so there's no DOM to fall back to either.
+                    return None
+                else:
+                    del self.errors[url]
+
+                # The DOM fragment is read from the page already fetched.  Only if it isn't there (a page without
+                # page data, or one a browser returned before rendering the fragment) does the fallback cost a
+                # request.
+                self.metrics.incr('extract.fallback')
+                if (page := self.soup_of(page, self.dom_selector(url)) if page is not None else None) is None:
+                    self.metrics.incr('extract.refetch')
+                    if (page := self.make_soup(url)) is None:
+                        return None
 
-            for idx, row in self.df.iloc[self.return_to_row:(row_num_cieling := self.return_to_row + 4), :].iterrows():
-                if idx == row_num_cieling - 1:
-                    self.return_to_row = row_num_cieling 
-                print(f'self.idx: {self.idx}, self.row: {self.return_to_row}')
+            if page is None:
+                return None
 
-                try:
-                    tconst = row['tconst']
-                    cast = row['cast'].split(', ')
-                    url = self.base_url + tconst
+            self.metrics.incr('extract.dom')
+            return from_dom(page)
 
-                    yield url, cast
 
-                except AttributeError as e:
-                    print(e)
-                    continue
+    def get_url_cast(self) -> Generator:
+            """
+            Retrieves the URL and cast information for the next batch of rows of the title list.
+
+            Returns:
+                A generator that yields tuples of URL and cast information.
+            """
+            # Take the next batch from the stream.  An empty batch means we've reached the end of the file.
+            with self.metrics.span('read_batch'):
+                batch = next(self.batches, [])
+            if not batch:
+                self.exhausted = True
 
+            for tconst, cast in batch:
+                self.metrics.incr('titles.read')
+                self.return_to_row += 1
 
-    def get_starring_links(self, soup: BeautifulSoup) -> list:
+                yield self.frontier.url(tconst), cast
+
+
+    def get_starring_links(self, soup: BeautifulSoup, strict: bool=False) -> list:
         """
         Get the links of the starring actors/actresses from the given BeautifulSoup object.
 
         Args:
             soup (BeautifulSoup): The BeautifulSoup object representing the HTML page.
+            strict (bool, optional): Whether to raise, rather than print, the error if the links are not found.
+                Defaults to False.
 
         Returns:
             list: A list of links to the starring actors/actresses.
         """
-        try:
-            return [link for link in soup.find(
-                name='a',
-                text='Stars'
-                ).find_next(name='div').find_all('a')
-                ]
+        # The links are read with the compiled CAST_RULES rather than a chain of finds.
+        if links := CAST_RULES.apply(soup)['stars']:
+            return links
 
-        except AttributeError as e:
-            print(e)
-            return []
+        e = AttributeError('No starring cast found.')
+        if strict:
+            raise e
+        print(e)
+        return []
+
+
+    def starring_cast(self, soup: BeautifulSoup) -> list:
+        """
+        Reads the imdb id and name of the starring actors/actresses from the DOM, raising if they're not found.
+
+        Args:
+            soup (BeautifulSoup): The BeautifulSoup object representing the HTML page.
+
+        Returns:
+            list: The (nconst, name) of each star.
+        """
+        return [(canonical(link['href']), link.get_text()) for link in self.get_starring_links(soup, strict=True)]
 
 
-    def get_star_info(self, soup: BeautifulSoup=None) -> tuple:
+    def get_star_info(self, soup: BeautifulSoup=None, strict: bool=False) -> tuple:
         """
         Extracts star information from the given BeautifulSoup object.
 
         Args:
             soup (BeautifulSoup): The BeautifulSoup object representing the HTML page.
+            strict (bool, optional): Whether to raise, rather than print, the errors below. Defaults to False.
 
         Returns:
             tuple: A tuple containing the star rank and star count. If the star information is not found,
@@ -226,9 +516,13 @@ class StarScraper(Scraper):
             AttributeError: If a matching element is not found in the BeautifulSoup object.
         """
         try:
+            # The fields are read in one pass over the fragment with the compiled STAR_RULES.
+            fields = STAR_RULES.apply(soup)
+
             # We'll first check whether the rating is available.  If it's not, we'll return None for both the rating
             # and the net change.
-            star_string = soup.find('span', {'class': 'starmeter-current-rank'}).get_text()
+            if (star_string := fields['rank']) is None:
+                raise AttributeError('No STARmeter rank found.')
 
             if star_string.lower() == 'see rank':
                 return None, None
@@ -236,79 +530,156 @@ class StarScraper(Scraper):
             # extract the star rating
             star_rating = star_string.split(' ')[1].replace(',','')
 
-            # check whether the star rating is trending up or down
-            trending = False if (trendingPath := soup.find('svg', {'class': 'ipc-icon--popularity-down'})) else True
+            # If the rank hasn't moved there's no trend icon at all, and the net change is zero.
+            if fields['up'] is None and fields['down'] is None:
+                return int(star_rating), 0
 
             # extract the magnitude of the rating change
-            rating_change_magnitude = trendingPath.find_all_next('span')[1].get_text() if not trending else soup.find('svg', {'class': 'ipc-icon--popularity-up'}).find_all_next('span')[1].get_text()
+            if (rating_change_magnitude := fields['difference']) is None:
+                raise IndexError('No STARmeter difference found.')
 
             # set the net change to the magnitude of the rating change if the star rating is trending up,
             # otherwise we'll set it to the negative of the magnitude of the rating change.
-            net_change = rating_change_magnitude if trending else '-' + rating_change_magnitude
+            net_change = rating_change_magnitude if fields['down'] is None else '-' + rating_change_magnitude
 
             return int(star_rating), int(net_change)
 
         # if an IndexError is raised, we'll catch it, print it to stdout, and return None for both the rating and the net change.
         except IndexError as e:
+            if strict:
+                raise
             print(e)
             return None, None
         # if a matching element is not found, we'll catch the AttributeError, print it to stdout, and return None for both the rating
         # and the net change.
         except AttributeError as e:
+            if strict:
+                raise
             print(e)
             return None, None
 
 
     def write_to_file(self, cast_dicts: list=None, filename: str='data/star_info.xlsx'):
         """
-        Writes the cast dictionaries to an Excel file.
+        Writes the cast dictionaries to a file, streaming them through the sink matching its extension.
 
         Args:
             cast_dicts (list): A list of dictionaries containing cast information.
-            filename (str): The name of the Excel file to write the data to. Default is 'data/star_info.xlsx'.
-
-        Raises:
-            NameError: If there is no data to write to the file.
+            filename (str): The name of the file to write the data to; .xlsx, .csv, .parquet, .arrow and .feather
+                are supported. Default is 'data/star_info.xlsx'.
         """
-        try:
-            pd.DataFrame(cast_dicts).to_excel(filename, index=False)
-            print('Data written to file.')
-        except NameError:
+        if not cast_dicts:
             print('No data to write to file.')
+            return
+
+        with self.metrics.span('write_to_file'), open_sink(filename) as sink:
+            sink.write_rows(cast_dicts)
+
+        print('Data written to file.')
 
     
     def insert_star_data(self):
             """
             Retrieves star ratings and rating change data for actors in the cast list.
-            Iterates through the cast dictionaries and opens the URLs of the actors to retrieve the data.
-            Updates the cast dictionaries with the retrieved data.
+            Iterates through the cast entries of the current batch and opens the URLs of the actors to retrieve
+            the data. Updates the cast entries with the retrieved data.
+            """
+            # Ensure that that we are not retrieving duplicate data.  Anyone with a fresh record in the index was
+            # fetched for an earlier title (or an earlier run), and anyone listed twice in this batch is fetched once.
+            # Anyone who already failed in this run fails again without a fetch, until the failures are re-run.
+            to_fetch = {}
+            failed_before = {}
+            for nconst in self.cast.nconst[self.batch_start:]:
+                if nconst in to_fetch or nconst in failed_before or nconst in self.persons:
+                    self.fetches_saved += 1
+                elif (state := self.frontier.state(nconst)) == FAILED:
+                    failed_before[nconst] = self.frontier.errors[nconst]
+                    self.fetches_saved += 1
+                else:
+                    if state is None:
+                        self.frontier.add(nconst)
+                    to_fetch[nconst] = self.frontier.url(nconst)
+
+            failed = self.fetch_persons(to_fetch) | failed_before
+
+            # A title with a person we couldn't complete is queued, with the person's error, and left out of the
+            # journal, rather than written with a hole in it.
+            for tconst, (start, stop) in list(self.titles.items()):
+                missing = dict.fromkeys(n for n in self.cast.nconst[start:stop] if n in failed)
+                for nconst in missing:
+                    self.failures.add(tconst, *failed[nconst])
+                    self.metrics.incr(f'failures.{failed[nconst][1]}')
+                if missing:
+                    self.frontier.fail(tconst)
+                    del self.titles[tconst]
+
+            # Update each cast entry in the current batch with the star rating and rating change data.
+            for i in range(self.batch_start, len(self.cast)):
+                if (record := self.persons.lookup(self.cast.nconst[i])) is not None:
+                    self.cast.set_rating(i, record.rating, record.ratingChange)
+
+
+    def fetch_persons(self, to_fetch: dict) -> dict:
             """
-            # Iterate through the cast dictionaries and open the URLs of the actors to retrieve the star ratings and rating change data.
-            for i, cast_dict in enumerate(self.cast_dicts[self.idx]):
+            Fetches the STARmeter data of several people and records it in the person index.
 
-                # Ensure that that we are not retrieving duplicate data.
-                if cast_dict not in self.cast_dicts[self.idx:-1:-1]:
+            Args:
+                to_fetch (dict): The URL of each person's page, keyed by nconst.
 
-                    # Get the soup object for the URL
-                    soup = self.make_soup(cast_dict['url'])
+            Returns:
+                dict: The (url, kind, error, attempts) of each person that couldn't be completed, keyed by nconst.
+            """
+            # Open the URLs of the actors to retrieve the star ratings and rating change data, spreading the
+            # fetches across the workers.
+            pages = self.fetch_soups(list(to_fetch.values()), self.make_page)
+            failed = {}
 
-                    # If the soup object is not None, we'll retrieve the star rating and rating change data.
-                    (star_rating, rating_change) = self.get_star_info(soup)
-                    print(star_rating, rating_change)
+            for (nconst, url), page in zip(to_fetch.items(), pages):
+                if (failure := self.record_person(nconst, url, page)) is not None:
+                    failed[nconst] = failure
 
-                    # Update the cast dictionary at the current [self.idx][index] with the star rating and rating change data.
-                    self.cast_dicts[self.idx][i].update(
-                            {
-                                'rating': star_rating,
-                                'ratingChange': rating_change
-                            }
-                    )
-                
+            return failed
+
+
+    def record_person(self, nconst: str, url: str, page: object) -> tuple:
+            """
+            Reads a person's STARmeter data from their page and records it in the person index.
+
+            Args:
+                nconst (str): The IMDb id of the person.
+                url (str): The URL of the person's page.
+                page (object): The page returned by make_page, or None if it couldn't be retrieved.
+
+            Returns:
+                tuple: The (url, kind, error, attempts) of the failure, or None if the person was recorded.
+            """
+            # Retrieve the star rating and rating change data, from the page data if we can.
+            try:
+                with self.metrics.span('get_star_info'):
+                    info = self.extract(url, page, star_meter, lambda soup: self.get_star_info(soup, strict=True))
+            except (AttributeError, IndexError, ValueError) as e:
+                print(e)
+                failure = (url, 'extract', f'{type(e).__name__}: {e}', 1)
+                self.frontier.fail(nconst, failure)
+                return failure
+
+            # If the page couldn't be retrieved we won't record anything, so the person is retried next time.
+            if info is None:
+                failure = (url, *self.errors.pop(url, ('fetch', 'unknown error', 0)))
+                self.frontier.fail(nconst, failure)
+                return failure
+
+            (star_rating, rating_change) = info
+            print(star_rating, rating_change)
+
+            self.persons.record(nconst, star_rating, rating_change)
+            self.frontier.done(nconst)
+            return None
 
 
     def generate_cast_dicts(self) -> None:
             """
-            Generates a list of dictionaries containing information about the cast of a movie.
+            Generates the cast entries of the next batch of titles, recording each actor's title, imdb id and name.
 
             Returns:
             None
@@ -318,130 +689,541 @@ class StarScraper(Scraper):
 
             TODO: incorporate cast list from netflix data
             """
-            # Iterate through the title URLs and create the cast dictionaries,
-            # recording the actor's name, imdb id, URL, star rating and rating change.
-            for url, _ in self.get_url_cast():
-                tmpList = []
+            # Fetch every title page in the batch up front, spreading the fetches across the workers.
+            urls = [url for url, _ in self.get_url_cast()]
+            pages = self.fetch_soups(urls, self.make_page)
+            self.titles = {}
+            self.batch_start = len(self.cast)
+
+            # Iterate through the title pages and create the cast entries,
+            # recording the actor's name and imdb id; the URL is derived from the imdb id when it's needed.
+            for url, page in zip(urls, pages):
+                tconst = url.removeprefix(self.base_url)
+
                 try:
-                    # Get the soup object for the URL
-                    soup = self.make_soup(url)
-
-                    # Get the links of the starring actors/actresses
-                    starring_links = self.get_starring_links(soup)
-
-                    # Iterate through the starring links and add the actor's name,
-                    # imdb id, and URL to the cast_dicts list.
-                    for link in starring_links:
-                        # if link.get_text() not in [cast_dict['actor'] for title_cast in self.cast_dicts for cast_dict in title_cast]:
-                            tmpList.append({
-                                'actor': link.get_text(),
-                                'nconst': link['href'].split('/')[2],
-                                'url': 'https://www.imdb.com' + link['href'],
-                                'rating': None,
-                                'ratingChange': None
-                            })
-
-                    # Extend the cast_dicts list at the current index with the tmpList list.
-                    self.cast_dicts[self.idx].extend(tmpList)
-
-                except AttributeError as e:
+                    # Get the imdb id and name of the starring actors/actresses, from the page data if we can.
+                    with self.metrics.span('get_starring_links'):
+                        tmpList = self.extract(url, page, title_cast, self.starring_cast)
+
+                except (AttributeError, IndexError) as e:
                     print(e)
+                    self.failures.add(tconst, url, 'extract', f'{type(e).__name__}: {e}', 1)
+                    self.metrics.incr('failures.extract')
+                    self.frontier.fail(tconst)
                     continue
-                except IndexError as e:
-                    print(e)
+
+                # If the title page couldn't be retrieved, we'll queue the failure and leave the title out of the
+                # journal so that it's retried on the next run.
+                if tmpList is None:
+                    kind, error, attempts = self.errors.pop(url, ('fetch', 'unknown error', 0))
+                    self.failures.add(tconst, url, kind, error, attempts)
+                    self.metrics.incr(f'failures.{kind}')
+                    self.frontier.fail(tconst)
                     continue
-            
-            # Append a new empty list to the cast_dicts list.
-            self.cast_dicts.append([])
 
+                # Add the title's cast to the store, remembering where it starts and stops.
+                start = len(self.cast)
+                for nconst, actor in tmpList:
+                    self.cast.append(tconst, nconst, actor)
+                self.titles[tconst] = (start, len(self.cast))
 
-    def scrape_star_data(self):
+
+    def scrape_star_data(self) -> CastStore:
             """
-            Scrapes star data for a movie.
+            Scrapes star data for every title in the title list.
 
-            This method generates a list of dictionaries containing information about the cast of a movie.
-            Each dictionary represents an actor in the cast and contains the following keys: 'actor', 'nconst', 'url', 'rating', 'ratingChange'.
+            This method generates the cast entries of each title, one batch at a time, and fills in each actor's
+            star rating and rating change.  Each entry records the 'tconst', 'nconst', 'actor', 'rating' and
+            'ratingChange'; the actor's 'url' is derived from the nconst.
 
             Returns:
-            cast_dicts (list): A list of dictionaries representing the cast of the movie.
+            cast (CastStore): The cast entries of the titles scraped in this run, or none if keep_cast is False.
             """
-            # If the cast_dicts list is None, we'll initialize it as a non-empty list with a dummy value
-            # so that we can pass it through the loop gate below.
-            if self.cast_dicts is None:
-                self.cast_dicts = [[]]
+            if self.monitor is not None:
+                self.monitor.start()
 
-            # While the length of the cast_dicts list is less than the maximum length of the data frame index,
-            # we'll continue to generate cast dictionaries and insert star data in batches of 10 (set in
-            # the get_url_cast method), and writing the batches to file.
-            while self.idx < self.df.index.size:
+            # Until the title list has been read to the end, we'll continue to generate cast entries and insert
+            # star data in batches of batch_size titles, and write the batches to file.
+            while not self.exhausted:
 
-                # Generate a batch of 5 cast dictionaries
+                # Generate a batch of cast entries
                 self.generate_cast_dicts()
 
-                # Flip the records flag to True so self.get_soup() will retrieve the star rating and rating change data
-                self.records = True
+                # If there were no titles left to read, there's nothing to insert or write.
+                if self.exhausted:
+                    break
 
-                # Insert star data into the cast dictionaries
+                # Insert star data into the cast entries
                 self.insert_star_data()
 
-                # Flip the records flag to False so we can continue to iterate through the title URLs.
-                self.records = False
-                
-                # write the cast dictionaries to file. Ultimately, we'll write the entire cast_dicts list to file.
-                self.write_to_file(self.cast_dicts[self.idx],
-                                    filename=f'../data/batch{self.idx}stars.xlsx')
-                
-                # Increment self.idx by 10, allowing access to the next batch of 10 titles.
+                # Record each completed title in the journal.  Ultimately, we'll export the whole journal to file.
+                for tconst, (start, stop) in self.titles.items():
+                    cast = list(self.cast.rows(start, stop))
+                    with self.metrics.span('journal'):
+                        self.journal.record_title(tconst, cast)
+                    self.frontier.done(tconst)
+                    self.metrics.incr('titles.completed')
+
+                    # Stream the rows straight to the sink, if there is one, rather than rebuilding a table per batch.
+                    if self.sink is not None:
+                        with self.metrics.span('write'):
+                            self.sink.write_rows(cast)
+
+                # Increment self.idx by 1, allowing access to the next batch of titles.
                 self.idx += 1
 
-                # Print a message to the console indicating that a batch of 10 titles has been written.
-                print('Batch of 4 titles written.')
-            
+                # Print a message to the console indicating that a batch of titles has been written.
+                print(f'Batch of {len(self.titles)} titles written.')
+
+                # The journal has synced the batch to disk, so a long run can let go of it.
+                if not self.keep_cast:
+                    self.cast.clear()
 
-            return self.cast_dicts
+            self.report()
+            return self.cast
+
+
+    def scrape_star_data_pipelined(self, title_workers: int=None, person_workers: int=None,
+                                   capacity: int=64) -> CastStore:
+            """
+            Scrapes star data for every title in the title list, like scrape_star_data, but as a pipeline of stages
+            connected by bounded queues rather than in alternating batches:
+
+                title fetch -> cast extraction -> person fetch -> STARmeter extraction -> sink
+
+            Every stage runs at the same time, so the people of the first title are fetched as soon as its cast is
+            read, while later titles are still being fetched.  A title is written (or its failure queued) once
+            everyone in its cast has been fetched, so the journal holds the same titles as scrape_star_data would
+            write, in the order they were completed rather than the order of the title list.  A full queue blocks
+            the stage feeding it, which holds memory to a few queues' worth of pages.
+
+            Args:
+                title_workers (int, optional): The number of title pages fetched at the same time. Defaults to
+                    workers.
+                person_workers (int, optional): The number of person pages fetched at the same time. Defaults to
+                    workers.
+                capacity (int, optional): The most items each stage's queue holds. Defaults to 64.
+
+            Returns:
+            cast (CastStore): The cast entries of the titles scraped in this run, or none if keep_cast is False.
+            """
+            pipeline = Pipeline(self.metrics)
+            lock = threading.Lock()
+
+            # The cast, the people still being fetched, and the failures of each title waiting on its people, and the
+            # titles waiting on each person being fetched.  The cast and STARmeter stages share them under the lock.
+            waiting_titles = {}
+            waiting_on = {}
+
+            def titles() -> Generator:
+                for batch in self.batches:
+                    for tconst, _ in batch:
+                        self.metrics.incr('titles.read')
+                        self.return_to_row += 1
+                        yield tconst
+
+            def fetch_title(tconst: str) -> None:
+                url = self.frontier.url(tconst)
+                cast_stage.put((tconst, url, self.make_page(url)))
+
+            def title_failed(tconst: str, error: Exception) -> None:
+                # The title is passed on as one that couldn't be retrieved, so its failure is queued.
+                print(error)
+                url = self.frontier.url(tconst)
+                self.errors[url] = ('fetch', f'{type(error).__name__}: {error}', 1)
+                cast_stage.put((tconst, url, None))
+
+            def read_cast(item: tuple) -> None:
+                tconst, url, page = item
+
+                try:
+                    # Get the imdb id and name of the starring actors/actresses, from the page data if we can.
+                    with self.metrics.span('get_starring_links'):
+                        cast = self.extract(url, page, title_cast, self.starring_cast)
+                except (AttributeError, IndexError) as e:
+                    print(e)
+                    sink_stage.put((tconst, [], [(url, 'extract', f'{type(e).__name__}: {e}', 1)]))
+                    return
+
+                if cast is None:
+                    sink_stage.put((tconst, [], [(url, *self.errors.pop(url, ('fetch', 'unknown error', 0)))]))
+                    return
+
+                # Work out who needs fetching.  Anyone with a fresh record, anyone another title is already waiting
+                # on, and anyone who failed earlier in the run isn't fetched again.
+                to_fetch = []
+                remaining = set()
+                failed = []
+                with lock:
+                    for nconst, _ in cast:
+                        if nconst in remaining or nconst in self.persons:
+                            self.fetches_saved += 1
+                        elif (state := self.frontier.state(nconst)) == FAILED:
+                            failed.append(self.frontier.errors[nconst])
+                            self.fetches_saved += 1
+                        elif nconst in waiting_on:
+                            waiting_on[nconst].append(tconst)
+                            remaining.add(nconst)
+                            self.fetches_saved += 1
+                        else:
+                            if state is None:
+                                self.frontier.add(nconst)
+                            waiting_on[nconst] = [tconst]
+                            remaining.add(nconst)
+                            to_fetch.append(nconst)
+
+                    if remaining:
+                        waiting_titles[tconst] = (cast, remaining, failed)
+
+                # The puts happen outside the lock, since they block while the person stage is behind, and the
+                # STARmeter stage needs the lock to catch up.
+                for nconst in to_fetch:
+                    person_stage.put(nconst)
+
+                if not remaining:
+                    sink_stage.put((tconst, cast, failed))
+
+            def cast_failed(item: tuple, error: Exception) -> None:
+                tconst, url, _ = item
+                print(error)
+                sink_stage.put((tconst, [], [(url, 'extract', f'{type(error).__name__}: {error}', 1)]))
+
+            def fetch_person(nconst: str) -> None:
+                url = self.frontier.url(nconst)
+                star_stage.put((nconst, url, self.make_page(url)))
+
+            def person_failed(nconst: str, error: Exception) -> None:
+                # The person is passed on as one that couldn't be retrieved, so the titles waiting on them are
+                # released with the failure rather than left waiting.
+                print(error)
+                url = self.frontier.url(nconst)
+                self.errors[url] = ('fetch', f'{type(error).__name__}: {error}', 1)
+                star_stage.put((nconst, url, None))
+
+            def read_star(item: tuple) -> None:
+                release(item[0], self.record_person(*item))
+
+            def star_failed(item: tuple, error: Exception) -> None:
+                nconst, url, _ = item
+                print(error)
+                failure = (url, 'extract', f'{type(error).__name__}: {error}', 1)
+                self.frontier.fail(nconst, failure)
+                release(nconst, failure)
+
+            def release(nconst: str, failure: tuple) -> None:
+                # Hands on the titles that were waiting only on this person, with the person's failure if any.
+                finished = []
+                with lock:
+                    for tconst in waiting_on.pop(nconst, ()):
+                        cast, remaining, failed = waiting_titles[tconst]
+                        remaining.discard(nconst)
+                        if failure is not None:
+                            failed.append(failure)
+                        if not remaining:
+                            finished.append((tconst, cast, failed))
+                            del waiting_titles[tconst]
+
+                for title in finished:
+                    sink_stage.put(title)
+
+            def write_title(item: tuple) -> None:
+                tconst, cast, failed = item
+
+                # A title with a person we couldn't complete is queued, with the person's error, and left out of the
+                # journal, rather than written with a hole in it.
+                if failed:
+                    for failure in failed:
+                        self.failures.add(tconst, *failure)
+                        self.metrics.incr(f'failures.{failure[1]}')
+                    self.frontier.fail(tconst)
+                    return
+
+                start = len(self.cast)
+                for nconst, actor in cast:
+                    record = self.persons.lookup(nconst)
+                    self.cast.append(tconst, nconst, actor, *((record.rating, record.ratingChange) if record else ()))
+
+                rows = list(self.cast.rows(start, len(self.cast)))
+                with self.metrics.span('journal'):
+                    self.journal.record_title(tconst, rows)
+                self.frontier.done(tconst)
+                self.metrics.incr('titles.completed')
+
+                if self.sink is not None:
+                    with self.metrics.span('write'):
+                        self.sink.write_rows(rows)
+
+                # The journal has synced the title to disk, so a long run can let go of it.
+                if not self.keep_cast:
+                    self.cast.clear()
+
+            # The stages are added from the last to the first, so that each can name the stages it feeds.  The cast
+            # and STARmeter extractions and the sink keep one worker each, so the shared state and the journal are
+            # only written from one thread at a time.  Titles reach the sink as their casts are completed, which
+            # isn't the order of the title list once pages are fetched concurrently.  A stage that fails on an item
+            # passes a failure on in its place, so every title still reaches the sink, to be journaled or queued.
+            title_workers = title_workers or self.workers
+            person_workers = person_workers or self.workers
+
+            # Both fetch stages hold connections and browsers at the same time, so the pools must fit them all.
+            self.size_pools(title_workers + person_workers)
+            sink_stage = pipeline.stage('sink', write_title, 1, capacity)
+            star_stage = pipeline.stage('star', read_star, 1, capacity, (sink_stage,), star_failed)
+            person_stage = pipeline.stage('person', fetch_person, person_workers, capacity, (star_stage,),
+                                          person_failed)
+            cast_stage = pipeline.stage('cast', read_cast, 1, capacity, (person_stage, sink_stage), cast_failed)
+            title_stage = pipeline.stage('title', fetch_title, title_workers, capacity, (cast_stage,), title_failed)
+
+            if self.monitor is not None:
+                self.monitor.start()
+
+            pipeline.run(titles(), title_stage)
+            self.exhausted = True
+
+            self.report()
+            return self.cast
+
+
+    def report(self) -> dict:
+            """
+            Prints a summary of the run and where the time went, and writes the metrics to file if they have a path.
+
+            Returns:
+                dict: The metrics summary.
+            """
+            if self.monitor is not None:
+                sample = self.monitor.stop()
+                print(f'Memory: {(sample["python"] or 0) / 2**20:.0f} MiB in python, '
+                      f'{(sample["browser"] or 0) / 2**20:.0f} MiB in {sample["browsers"]} browsers; '
+                      f'{self.monitor.alerts} samples over budget, {self.pool.recycled} browsers recycled.')
+
+            print(f'{self.fetches_saved} person fetches saved by the person index, '
+                  f'{self.frontier.duplicates} duplicate titles skipped.')
+
+            if self.failures:
+                print(f'{len(self.failures)} failures queued; call rerun_failures() to retry them.')
+
+            # Summarize where the time went, writing the summary to file if the metrics have a path.
+            summary = self.metrics.dump()
+            for name, span in summary['spans'].items():
+                print(f'{name:<20}{span["count"]:>8} x {span["mean"] * 1000:>9.1f} ms'
+                      f'  (p99 {span["p99"] * 1000:.1f} ms)')
+
+            for name, gauge in summary['gauges'].items():
+                print(f'{name:<20}{gauge["max"]:>8} at most')
+
+            return summary
+
+
+    def rerun_failures(self) -> CastStore:
+            """
+            Scrapes again only the titles in the failure queue.  Titles that fail again are queued again; titles
+            the journal has since recorded are skipped.  A title's old entries are only removed from the queue once
+            it has been journaled or queued again, so a re-run that crashes part way through loses nothing.
+
+            Returns:
+            cast (CastStore): The cast entries of every title scraped by this scraper, including the re-run ones.
+            """
+            # Group the old entries by title.  Titles the journal has since recorded are done with already.
+            entries = {}
+            for entry in list(self.failures.entries):
+                entries.setdefault(entry['tconst'], []).append(entry)
+
+            done = [tconst for tconst in entries if tconst in self.journal]
+            self.failures.remove([entry for tconst in done for entry in entries.pop(tconst)])
+
+            # The people and titles that failed earlier in the run are worth trying again now.
+            self.frontier.retry()
+
+            def batches() -> Generator:
+                for batch in batched(((tconst, []) for tconst in entries), self.batch_size):
+                    yield batch
+
+                    # The next batch is only asked for once this one has been journaled or queued again, so its
+                    # old entries can go.
+                    self.failures.remove([entry for tconst, _ in batch for entry in entries[tconst]])
+
+            # Feed the queued titles through the same batching as the title list; their cast is re-read from the
+            # title pages, so the rows don't need one.
+            self.batches = batches()
+            self.exhausted = False
+
+            return self.scrape_star_data()
 
     
-    def combine_scraped_data(self):
+    def refresh_star_data(self, max_age: float=7 * 24 * 3600, filename: str=None,
+                          diff_filename: str='../data/STAR_DIFF.csv') -> dict:
+            """
+            Refreshes the STARmeter data of the titles in the journal without fetching any title page: the cast of
+            each title is taken from the journal, and only the people whose data is older than max_age (or who
+            aren't in the person index) are fetched again.  With a cache, every one of their pages is revalidated
+            with the server, even if the cache holds it as fresh; pages whose validators show them to be unchanged
+            aren't downloaded again.
+
+            Args:
+                max_age (float, optional): The age in seconds past which a person's data is fetched again.
+                    Defaults to one week.
+                filename (str, optional): A file to write the refreshed cast rows of every title to. Defaults to
+                    None (not written).
+                diff_filename (str, optional): The file to write the people whose data changed to, with their
+                    data before and after. Defaults to '../data/STAR_DIFF.csv'.
+
+            Returns:
+                dict: The number of people in the journal, fetched again, changed, and failed.
+            """
+            # The journal holds the rows as they were last written; a newer person record supersedes them as the
+            # data we're comparing against.
+            previous, actors = {}, {}
+            for row in self.journal.rows():
+                if row['nconst'] not in previous:
+                    previous[row['nconst']] = (row['rating'], row['ratingChange'])
+                    actors[row['nconst']] = row['actor']
+
+            now = time.time()
+            stale = []
+            for nconst in previous:
+                record = self.persons.records.get(nconst)
+                if record is not None:
+                    previous[nconst] = (record.rating, record.ratingChange)
+                if record is None or now - record.fetched_at > max_age:
+                    stale.append(nconst)
+
+            print(f'{len(stale)} of {len(previous)} people are older than {max_age / 3600:.0f} hours.')
+
+            # Fetch the stale people a chunk at a time.  A cached page may be as old as the cache's ttl, which can be
+            # older than max_age, so none is taken on trust: the server confirms it or sends it again, and only then
+            # is the person recorded as fetched now.
+            failed = {}
+            revalidate, self.fetcher.revalidate = self.fetcher.revalidate, True
+            try:
+                for chunk in batched(stale, REFRESH_CHUNK):
+                    with self.metrics.span('refresh_chunk'):
+                        failed.update(self.fetch_persons(
+                            {nconst: person_url(nconst, self.name_url) for nconst in chunk}
+                        ))
+            finally:
+                self.fetcher.revalidate = revalidate
+
+            for kind in (error[1] for error in failed.values()):
+                self.metrics.incr(f'failures.{kind}')
+
+            # Write the people whose data changed.
+            changed = 0
+            with open_sink(diff_filename, DIFF_COLUMNS) as diff:
+                for nconst in stale:
+                    if nconst in failed:
+                        continue
+
+                    record = self.persons.lookup(nconst)
+                    (rating, rating_change) = previous[nconst]
+                    if (record.rating, record.ratingChange) == (rating, rating_change):
+                        continue
+
+                    changed += 1
+                    diff.write_row({
+                        'nconst': nconst,
+                        'actor': actors[nconst],
+                        'previousRating': rating,
+                        'rating': record.rating,
+                        'previousRatingChange': rating_change,
+                        'ratingChange': record.ratingChange,
+                        # A positive delta is a move up the STARmeter, towards rank 1.
+                        'rankDelta': rating - record.rating if None not in (rating, record.rating) else None,
+                    })
+
+            # Write every title's cast with the refreshed data, if asked to.
+            if filename is not None:
+                with open_sink(filename, COLUMNS) as sink:
+                    for row in self.journal.rows():
+                        if (record := self.persons.records.get(row['nconst'])) is not None:
+                            row['rating'], row['ratingChange'] = record.rating, record.ratingChange
+                        sink.write_row(row)
+
+            summary = {'persons': len(previous), 'fetched': len(stale), 'changed': changed, 'failed': len(failed)}
+            print(f'{changed} people changed; diff written to {diff_filename}. {len(failed)} people failed.')
+            self.metrics.dump()
+
+            return summary
+
+
+    def combine_scraped_data(self, filename: str='../data/CAST_LIST.xlsx') -> None:
         """
-        Combines the scraped data from batch files into a single DataFrame and saves it to a file.
+        Exports every title recorded in the journal to a single file in one streaming pass.
+
+        Args:
+            filename (str): The name of the file to write the data to; its extension selects the format.
+                Default is '../data/CAST_LIST.xlsx'.
 
         Returns:
             None
         """
-        df = pd.DataFrame()
-
-        # combine the batch files
-        for file in (dirContents := os.listdir('../data')):
-            if file.endswith('stars.xlsx'):
-                df = pd.concat([df, pd.read_excel(f'../data/{file}')])
-
-        # write the combined data to file
-        df.to_excel('../data/CAST_LIST.xlsx', index=False)
-
-        # remove the batch files
-        for file in dirContents:
-            if file.endswith('stars.xlsx'):
-                os.remove(os.path.abspath(f'../data/{file}'))
+        count = self.journal.export(filename)
+        print(f'{count} rows written to {filename}.')
     
 
 class DumbScraper(Scraper):
-    def __init__(self, url: str) -> None:
+    # The extractions extract() can perform, by name; 'tag' takes the tag name after a colon, e.g. 'tag:h2'.
+    EXTRACTIONS = ('span', 'tag', 'text', 'title')
+
+    def __init__(self, url: str, pool: WebDriverPool=None, cache: ResponseCache=None,
+                 parser: str='html.parser', session: requests.Session=None, timeout: float=10, html: str=None,
+                 status: int=None) -> None:
         """
         Initializes a Scraper object.
 
         Args:
             url (str): The URL to scrape.
+            pool (WebDriverPool, optional): The pool to lease browsers from. Defaults to the shared DRIVER_POOL.
+            cache (ResponseCache, optional): The cache to consult before fetching the page. Defaults to None.
+            parser (str, optional): The parser backend, one of parsing.PARSERS. Defaults to 'html.parser'.
+            session (Session, optional): The session to fetch the page with, so that many scrapers can share its
+                connection pool. Defaults to None (a one-off request).
+            timeout (float, optional): The number of seconds to wait for a response. Defaults to 10.
+            html (str, optional): The page, if it has already been fetched (e.g. by AsyncDumbScraper).
+                Defaults to None (fetch it).
+            status (int, optional): The response status of the already fetched page. Defaults to None.
 
         Attributes:
+            pool (WebDriverPool): The pool to lease browsers from.
+            parser (str): The BeautifulSoup parser to use for parsing HTML content.
             url (str): The URL to scrape.
+            status (int): The response status, or None if the page came from the cache.
             html (str): The HTML content of the webpage.
-            soup (BeautifulSoup): The BeautifulSoup object representing the parsed HTML.
-            text (str): The text content extracted from the webpage.
+            soup (BeautifulSoup): The BeautifulSoup object representing the parsed HTML, built on first access.
+            text (str): The text content extracted from the webpage, built on first access.
         """
+        super().__init__(pool)
+
+        self.parser = soup_parser(parser)
         self.url = url
-        self.html = requests.get(url).text
-        self.soup = BeautifulSoup(self.html, 'html.parser')
-        self.text = self.soup.get_text()
+
+        # Only go to the network if the page wasn't handed to us and isn't already cached.  Error pages aren't
+        # cached.
+        self.html = html if html is not None or cache is None else cache.get(url)
+        self.status = status
+        if self.html is None:
+            response = (session if session is not None else requests).get(url, timeout=timeout)
+            self.html = response.text
+            self.status = response.status_code
+            if cache is not None and response.ok:
+                cache.put(url, '', self.html)
+
+    @cached_property
+    def soup(self) -> BeautifulSoup:
+        # The full soup is only built if an extractor needs the whole document.
+        return BeautifulSoup(self.html, self.parser)
+
+    @cached_property
+    def text(self) -> str:
+        return self.soup.get_text()
+
+    def _soup_for(self, name: str) -> BeautifulSoup:
+        # If the full soup has already been built we'll reuse it; otherwise we'll only parse the elements we need.
+        # html5lib can't parse selectively, so it always gets the full soup.
+        if 'soup' in self.__dict__ or self.parser == 'html5lib':
+            return self.soup
+
+        return BeautifulSoup(self.html, self.parser, parse_only=SoupStrainer(name))
 
     def get_span_text(self) -> list:
         """
@@ -450,21 +1232,22 @@ class DumbScraper(Scraper):
         Returns:
             list: The text content extracted from the span tags at the URL.
         """
-        span_texts = [span.get_text() for span in self.soup.find_all('span')]
+        span_texts = [span.get_text() for span in self._soup_for('span').find_all('span')]
 
         return span_texts
 
-    def get_tag_text(self) -> list:
+    def get_tag_text(self, tag: str) -> list:
         """
         Retrieves the text content of HTML elements with a specified tag from a given URL.
 
+        Args:
+            tag (str): The name of the tag, e.g. 'h2'.
+
         Returns:
             list: A list of strings containing the text content of the HTML elements.
         """
-        # Prompt the user for a tag
-        tag = input("Enter a tag: ")
         # Get all the text from the html
-        text = self.soup.find_all(tag)
+        text = [element.get_text() for element in self._soup_for(tag).find_all(tag)]
         # Return the text
         return text
 
@@ -476,7 +1259,7 @@ class DumbScraper(Scraper):
             str: The text content extracted from the URL.
         """
         # Get all the text from the html
-        text = self.soup.get_text()
+        text = self.text
         # Return the text
         return text
 
@@ -488,19 +1271,52 @@ class DumbScraper(Scraper):
             str: The title of the URL.
         """
         # Get the title from the html
-        title = self.soup.title.string
+        title = self._soup_for('title').title.string
         # Return the title
         return title
 
-    def perform_scraping(self, method: int) -> str:
-        # Convert the method to an int
-        method: int = int(method)
-        if method == 0:
-            return self.get_span_text()
-        elif method == 1:
-            return self.get_tag_text()
-        elif method == 2:
-            return self.get_text()
+    def apply(self, rules: RuleSet) -> dict:
+        """
+        Reads the fields of a RuleSet from the page, in one pass over it.
+
+        Args:
+            rules (RuleSet): The compiled rules, e.g. from rules.load_rules.
+
+        Returns:
+            dict: The value of each field.
+        """
+        return rules.apply(self.soup)
+
+    def perform_scraping(self, method: int, tag: str=None) -> str:
+        # The old numeric codes of the span, tag and text extractions.
+        return self.extract(('span', f'tag:{tag}', 'text')[int(method)])
+
+    def extract(self, extraction: str) -> object:
+        """
+        Performs an extraction given by name: 'span', 'tag:<name>', 'text' or 'title'.
+
+        Args:
+            extraction (str): The extraction, as the command line takes it.
+
+        Returns:
+            object: The extracted text, or list of texts.
+
+        Raises:
+            ValueError: If the extraction isn't one of EXTRACTIONS, or 'tag' is given without a tag name.
+        """
+        name, _, tag = extraction.partition(':')
+
+        match name:
+            case 'span':
+                return self.get_span_text()
+            case 'tag' if tag:
+                return self.get_tag_text(tag)
+            case 'text':
+                return self.get_text()
+            case 'title':
+                return self.get_title()
+
+        raise ValueError(f'Unknown extraction: {extraction!r}, expected one of span, tag:<name>, text or title')
 
     def make_soup(self, url: str) -> BeautifulSoup:
             """
@@ -516,17 +1332,18 @@ class DumbScraper(Scraper):
                 WebDriverException: If there is an exception while retrieving the HTML content.
                 TypeError: If there is a type error while processing the data.
             """
-            # Open the URL in a broswer window using the webdriver object
-            self.webdriver.get(url)
-
             try:
-                # WebDriverWait will wait for the presence of the element before attempting to retrieve
-                # the outerHTML attribute, simulating more human-like behavior.
-                span = WebDriverWait(self.webdriver, 10).until(
-                    EC.presence_of_element_located((By.CLASS_NAME,
-                                                    'starmeter-content'
-                                                    ))
-                ).get_attribute('outerHTML')
+                # Lease a browser from the pool and open the URL in a broswer window
+                with self.pool.driver() as driver:
+                    driver.get(url)
+
+                    # WebDriverWait will wait for the presence of the element before attempting to retrieve
+                    # the outerHTML attribute, simulating more human-like behavior.
+                    span = WebDriverWait(driver, 10).until(
+                        EC.presence_of_element_located((By.CLASS_NAME,
+                                                        'starmeter-content'
+                                                        ))
+                    ).get_attribute('outerHTML')
 
                 # Return the BeautifulSoup object representing the HTML content of the web page.
                 return BeautifulSoup(
@@ -560,3 +1377,123 @@ class DumbScraper(Scraper):
             #except TypeError as e:
                 #print(e)
                 #return None 
+
+
+class AsyncDumbScraper:
+    '''
+    Description: This class fetches many URLs concurrently from asyncio code, over one session whose keep-alive
+    connections are reused from page to page, and hands back a DumbScraper for each page so that the same
+    extractors (get_span_text, get_tag_text, get_text, get_title) work on the results.  Use it as an async context
+    manager, or call close() when done, so that its threads are shut down.
+    '''
+    def __init__(self, concurrency: int=10, timeout: float=10, cache: ResponseCache=None,
+                 parser: str='html.parser', session: requests.Session=None) -> None:
+        """
+        Initializes an AsyncDumbScraper object.
+
+        Args:
+            concurrency (int, optional): The most requests in flight at the same time, which is also the number of
+                connections held per host. Defaults to 10.
+            timeout (float, optional): The number of seconds each request may take in all. Defaults to 10.
+            cache (ResponseCache, optional): The cache to consult before fetching each page. Defaults to None.
+            parser (str, optional): The parser backend, one of parsing.PARSERS. Defaults to 'html.parser'.
+            session (Session, optional): The session to fetch with. Defaults to a new one holding concurrency
+                connections per host.
+
+        Attributes:
+            concurrency (int): The most requests in flight at the same time.
+            timeout (float): The number of seconds each request may take in all.
+            cache (ResponseCache): The cache to consult before fetching each page, or None.
+            parser (str): The parser backend.
+            session (Session): The session every request is made over.
+        """
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.cache = cache
+        self.parser = parser
+        self.session = session if session is not None else make_session(concurrency)
+        self._owns_session = session is None
+
+        # The loop's default executor holds too few threads for a large concurrency, so we bring our own.  It's
+        # started on the first fetch, and close() shuts it down.
+        self._executor = None
+
+    async def __aenter__(self) -> 'AsyncDumbScraper':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Shuts down the scraper's threads, and closes the session if the scraper made it.  Requests still queued are
+        cancelled, but a request that timed out is still running in its thread until the session's own connect and
+        read timeouts end it; close doesn't wait for those threads.  The scraper can be used again afterwards.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+        if self._owns_session:
+            self.session.close()
+
+    async def fetch(self, url: str, semaphore: asyncio.Semaphore=None) -> DumbScraper:
+        """
+        Fetches one page.
+
+        Args:
+            url (str): The URL to fetch.
+            semaphore (Semaphore, optional): The semaphore bounding the requests in flight. Defaults to None.
+
+        Returns:
+            DumbScraper: The scraper holding the page.
+
+        Raises:
+            TimeoutError: If the request takes longer than timeout.
+            RequestException: If the request fails.
+        """
+        if self.cache is not None and (html := self.cache.get(url)) is not None:
+            return DumbScraper(url, parser=self.parser, html=html)
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.concurrency)
+
+        async with semaphore or contextlib.nullcontext():
+            # requests blocks, so each request runs in one of our threads; the session's connection pool is
+            # thread-safe and the semaphore keeps the requests in flight within its size.  The connect and read
+            # timeouts bound the thread, and wait_for bounds the request as a whole.  wait_for can only cancel the
+            # awaitable, not the thread: a request that times out keeps its thread until the session gives up on
+            # it, while the semaphore admits the next request, which then waits for a free thread, and that wait
+            # counts against its own timeout.
+            request = asyncio.get_running_loop().run_in_executor(
+                self._executor, partial(self.session.get, url, timeout=self.timeout)
+            )
+            response = await asyncio.wait_for(request, self.timeout)
+
+        if self.cache is not None and response.ok:
+            self.cache.put(url, '', response.text)
+
+        return DumbScraper(url, parser=self.parser, html=response.text, status=response.status_code)
+
+    async def fetch_many(self, urls: list) -> list:
+        """
+        Fetches many pages, at most concurrency at a time.
+
+        Args:
+            urls (list): The URLs to fetch.
+
+        Returns:
+            list: A DumbScraper for each URL, in the order given.  A URL that couldn't be fetched has the exception
+            in its place, as asyncio.gather(return_exceptions=True) would give.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        return await asyncio.gather(*(self.fetch(url, semaphore) for url in urls), return_exceptions=True)
+
+    def run(self, urls: list) -> list:
+        """
+        Fetches many pages from synchronous code, closing the scraper afterwards.  See fetch_many.
+        """
+        try:
+            return asyncio.run(self.fetch_many(urls))
+        finally:
+            self.close()
@@ -0,0 +1,249 @@
+'''Description: This file splits a title list into shards of consecutive rows, runs a StarScraper over each shard in
+a process pool (or one shard per machine), and merges the shards' journals into a single output.  Run it with the
+name of a step, e.g. `python shards.py run ../data/titles.tsv.gz --shards 8`.'''
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import glob
+import math
+import multiprocessing
+import os
+from typing import NamedTuple
+from journal import Journal
+from persons import PersonIndex
+from sinks import open_sink
+from sources import count_rows
+
+# The directory the shards' journals, person indexes, failure queues and metrics are kept in.
+SHARD_DIR = '../data/shards'
+
+
+class Shard(NamedTuple):
+    '''
+    Description: This class describes one shard of a title list: the rows it covers and where its files are kept.
+    '''
+    index: int
+    count: int
+    start: int
+    stop: int
+    directory: str = SHARD_DIR
+
+    def path(self, kind: str) -> str:
+        """
+        Builds the path of one of the shard's files.
+
+        Args:
+            kind (str): 'journal', 'persons', 'failures' or 'metrics'.
+
+        Returns:
+            str: The path.
+        """
+        extension = 'json' if kind == 'metrics' else 'jsonl'
+        return os.path.join(self.directory, f'shard-{self.index:03d}-of-{self.count:03d}-{kind}.{extension}')
+
+
+def plan_shards(filename: str, count: int, directory: str=SHARD_DIR) -> list:
+    """
+    Splits a title list into shards of (nearly) equal numbers of rows.  The plan only depends on the file and the
+    count, so every machine of a multi-machine run computes the same one.
+
+    Args:
+        filename (str): The title list.
+        count (int): The number of shards.
+        directory (str, optional): The directory the shards' files are kept in. Defaults to SHARD_DIR.
+
+    Returns:
+        list: The Shards, in row order.  There are fewer than count if the list has fewer rows than that.
+    """
+    total = count_rows(filename)
+    size = max(1, math.ceil(total / count))
+
+    return [Shard(i, count, start, min(total, start + size), directory)
+            for i, start in enumerate(range(0, total, size))]
+
+
+def run_shard(filename: str, shard: Shard, share: int=1, rate: float=2.0, max_rate: float=8.0,
+              **options) -> dict:
+    """
+    Scrapes one shard of a title list.  The shard's journal lets an interrupted shard be re-run, and its person
+    index lets a re-run skip the people already fetched.
+
+    Args:
+        filename (str): The title list.
+        shard (Shard): The shard to scrape.
+        share (int, optional): The number of shards running at the same time; the request rates are divided
+            between them so that the run as a whole keeps to them. Defaults to 1.
+        rate (float, optional): The starting requests per second to each host, for the whole run. Defaults to 2.0.
+        max_rate (float, optional): The highest requests per second to each host, for the whole run.
+            Defaults to 8.0.
+        **options: Further StarScraper arguments, e.g. fetch_mode, workers or extractor.
+
+    Returns:
+        dict: The shard's index, rows, the number of titles completed and the number of failures queued.
+    """
+    # The scraper is imported here so that the planning and merging steps don't need selenium.
+    from metrics import Metrics
+    from retry import DeadLetterQueue
+    from scrapers import StarScraper
+    from throttle import HostScheduler
+
+    os.makedirs(shard.directory, exist_ok=True)
+
+    scraper = StarScraper(
+        filename,
+        start_row=shard.start,
+        stop_row=shard.stop,
+        journal=Journal(shard.path('journal')),
+        persons=PersonIndex(shard.path('persons')),
+        failures=DeadLetterQueue(shard.path('failures')),
+        metrics=Metrics(shard.path('metrics')),
+        scheduler=HostScheduler(rate=rate / share, min_rate=0.1 / share, max_rate=max_rate / share),
+        **options
+    )
+
+    try:
+        scraper.scrape_star_data()
+    finally:
+        scraper.journal.close()
+        scraper.pool.close()
+
+    return {'shard': shard.index, 'rows': (shard.start, shard.stop), 'titles': len(scraper.journal.completed),
+            'failures': len(scraper.failures)}
+
+
+def run_shards(filename: str, count: int, processes: int=None, directory: str=SHARD_DIR, **options) -> list:
+    """
+    Scrapes every shard of a title list in a process pool.
+
+    Args:
+        filename (str): The title list.
+        count (int): The number of shards.
+        processes (int, optional): The number of shards scraped at the same time. Defaults to count.
+        directory (str, optional): The directory the shards' files are kept in. Defaults to SHARD_DIR.
+        **options: Further run_shard arguments.
+
+    Returns:
+        list: The result of each shard, in shard order.
+    """
+    shards = plan_shards(filename, count, directory)
+    processes = min(processes or len(shards), len(shards))
+    results = []
+
+    # Spawned processes don't inherit the parent's threads or open browsers, which forking would copy mid-flight.
+    context = multiprocessing.get_context('spawn')
+
+    with ProcessPoolExecutor(processes, mp_context=context) as executor:
+        futures = {executor.submit(run_shard, filename, shard, processes, **options): shard for shard in shards}
+
+        for future in as_completed(futures):
+            shard = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # One shard failing shouldn't stop the others; re-running it resumes from its journal.
+                print(f'Shard {shard.index} failed: {type(e).__name__}: {e}')
+                continue
+
+            print(f'Shard {shard.index} (rows {shard.start}-{shard.stop}): {result["titles"]} titles, '
+                  f'{result["failures"]} failures.')
+            results.append(result)
+
+    return sorted(results, key=lambda result: result['shard'])
+
+
+def merge_shards(filename: str, directory: str=SHARD_DIR) -> int:
+    """
+    Merges the shards' journals into a single file in one streaming pass.  A title recorded by more than one shard
+    is written once, a person listed twice for the same title is written once, and each person's STARmeter data is
+    taken from the most recent fetch of them by any shard, so the same person doesn't carry different ranks in
+    different rows.
+
+    Args:
+        filename (str): The file to write; its extension selects the format.
+        directory (str, optional): The directory the shards' files are kept in. Defaults to SHARD_DIR.
+
+    Returns:
+        int: The number of rows written.
+    """
+    persons = {}
+    for path in sorted(glob.glob(os.path.join(directory, 'shard-*-persons.jsonl'))):
+        for nconst, record in PersonIndex(path).records.items():
+            if nconst not in persons or record.fetched_at > persons[nconst].fetched_at:
+                persons[nconst] = record
+
+    titles = set()
+    duplicates = 0
+
+    with open_sink(filename) as sink:
+        for path in sorted(glob.glob(os.path.join(directory, 'shard-*-journal.jsonl'))):
+            journal = Journal(path)
+            merged = journal.completed - titles
+            current, cast = None, set()
+
+            for row in journal.rows():
+                # Journal.rows yields each title's cast together, so the people seen so far only need to cover the
+                # current title.
+                if row['tconst'] != current:
+                    current, cast = row['tconst'], set()
+
+                if row['tconst'] not in merged or row['nconst'] in cast:
+                    duplicates += 1
+                    continue
+                cast.add(row['nconst'])
+
+                if (record := persons.get(row['nconst'])) is not None:
+                    row['rating'], row['ratingChange'] = record.rating, record.ratingChange
+                sink.write_row(row)
+
+            titles |= merged
+
+    print(f'{len(titles)} titles and {len(persons)} people merged; {duplicates} duplicate rows dropped.')
+    return sink.rows_written
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    steps = parser.add_subparsers(dest='step', required=True)
+
+    plan = steps.add_parser('plan', help='print the row range of each shard')
+    plan.add_argument('filename', help='the title list')
+    plan.add_argument('--shards', type=int, required=True, help='the number of shards')
+
+    run = steps.add_parser('run', help='scrape every shard in a process pool, or a single shard with --shard')
+    run.add_argument('filename', help='the title list')
+    run.add_argument('--shards', type=int, required=True, help='the number of shards')
+    run.add_argument('--shard', type=int, help="the one shard to scrape, e.g. this machine's share of the list")
+    run.add_argument('--processes', type=int, help='the number of shards scraped at the same time')
+    run.add_argument('--dir', default=SHARD_DIR, help='the directory the shard files are kept in')
+    run.add_argument('--workers', type=int, default=1, help='the number of concurrent fetches per shard')
+    run.add_argument('--fetch-mode', default='auto', choices=('auto', 'http', 'browser'))
+    run.add_argument('--extractor', default='json', choices=('json', 'dom'))
+    run.add_argument('--browser-profile', help='the browser profile, e.g. lean')
+    run.add_argument('--rate', type=float, default=2.0, help='the starting requests per second per host, in all')
+
+    merge = steps.add_parser('merge', help="merge the shards' journals into one file")
+    merge.add_argument('--dir', default=SHARD_DIR, help='the directory the shard files are kept in')
+    merge.add_argument('--out', default='../data/CAST_LIST.xlsx', help='the file to write')
+
+    args = parser.parse_args()
+
+    match args.step:
+        case 'plan':
+            for shard in plan_shards(args.filename, args.shards):
+                print(f'shard {shard.index}: rows {shard.start}-{shard.stop}')
+
+        case 'run':
+            options = {'workers': args.workers, 'fetch_mode': args.fetch_mode, 'extractor': args.extractor,
+                       'browser_profile': args.browser_profile, 'rate': args.rate}
+            if args.shard is None:
+                run_shards(args.filename, args.shards, args.processes, args.dir, **options)
+            else:
+                shard = plan_shards(args.filename, args.shards, args.dir)[args.shard]
+                print(run_shard(args.filename, shard, **options))
+
+        case 'merge':
+            print(f'{merge_shards(args.out, args.dir)} rows written to {args.out}.')
+
+
+# Call the main function
+if __name__ == '__main__':
+    main()
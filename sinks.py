@@ -0,0 +1,220 @@
+'''Description: This file creates sink classes that write cast rows to CSV, Excel, Parquet or Arrow IPC files as
+the rows arrive, rather than building the whole table in memory first.'''
+from abc import ABC, abstractmethod
+import csv
+import openpyxl
+
+# The columns of the cast list, in order.
+COLUMNS = ['tconst', 'actor', 'nconst', 'url', 'rating', 'ratingChange']
+
+# The columns the Parquet and Arrow IPC sinks store as 64-bit integers; the rest are strings.
+INT_COLUMNS = {'rating', 'ratingChange', 'previousRating', 'previousRatingChange', 'rankDelta'}
+
+
+class Sink(ABC):
+    '''
+    Description: This class is the interface shared by the sinks.  Sinks are context managers; leaving the
+    with-block closes the file.
+    '''
+    def __init__(self, filename: str, columns: list=COLUMNS) -> None:
+        """
+        Initializes the Sink object.
+
+        Args:
+            filename (str): The file to write.
+            columns (list, optional): The columns to write, in order. Defaults to COLUMNS.
+
+        Attributes:
+            filename (str): The file to write.
+            columns (list): The columns to write, in order.
+            rows_written (int): The number of rows written so far.
+        """
+        self.filename = filename
+        self.columns = columns
+        self.rows_written = 0
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+    @abstractmethod
+    def write_row(self, row: dict) -> None:
+        """
+        Writes one row.  Keys not in columns are ignored and missing keys are written as empty values.
+
+        Args:
+            row (dict): The row to write.
+        """
+
+
+    def write_rows(self, rows) -> None:
+        """
+        Writes every row of an iterable.
+
+        Args:
+            rows (Iterable): The rows to write.
+        """
+        for row in rows:
+            self.write_row(row)
+
+
+    def flush(self) -> None:
+        """
+        Pushes any buffered rows to the file.
+        """
+
+
+    @abstractmethod
+    def close(self) -> None:
+        """
+        Flushes any buffered rows and closes the file.
+        """
+
+
+class CsvSink(Sink):
+    '''
+    Description: This class writes rows to a CSV file.
+    '''
+    def __init__(self, filename: str, columns: list=COLUMNS) -> None:
+        super().__init__(filename, columns)
+        self._file = open(filename, 'w', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=columns, extrasaction='ignore')
+        self._writer.writeheader()
+
+
+    def write_row(self, row: dict) -> None:
+        self._writer.writerow(row)
+        self.rows_written += 1
+
+
+    def flush(self) -> None:
+        self._file.flush()
+
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ExcelSink(Sink):
+    '''
+    Description: This class writes rows to an Excel workbook using openpyxl's write-only mode, which streams rows
+    to a temporary file instead of holding the sheet in memory.  Excel caps a sheet at 1,048,576 rows.
+    '''
+    def __init__(self, filename: str, columns: list=COLUMNS) -> None:
+        super().__init__(filename, columns)
+        self._workbook = openpyxl.Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet()
+        self._sheet.append(columns)
+
+
+    def write_row(self, row: dict) -> None:
+        self._sheet.append([row.get(column) for column in self.columns])
+        self.rows_written += 1
+
+
+    def close(self) -> None:
+        # The workbook is only assembled into an .xlsx file on save.
+        self._workbook.save(self.filename)
+
+
+class _ArrowSink(Sink):
+    '''
+    Description: This class buffers rows column by column and hands them to a pyarrow writer in batches.
+    '''
+    def __init__(self, filename: str, columns: list=COLUMNS, batch_size: int=65536) -> None:
+        # pyarrow is only needed by the columnar sinks, so we'll only import it when one is used.
+        import pyarrow
+
+        super().__init__(filename, columns)
+        self.pa = pyarrow
+        self.batch_size = batch_size
+        self.schema = pyarrow.schema([
+            (column, pyarrow.int64() if column in INT_COLUMNS else pyarrow.string()) for column in columns
+        ])
+        self._buffer = {column: [] for column in columns}
+        self._buffered = 0
+        self._writer = self._open_writer()
+
+
+    @abstractmethod
+    def _open_writer(self) -> object:
+        pass
+
+
+    def write_row(self, row: dict) -> None:
+        for column in self.columns:
+            self._buffer[column].append(row.get(column))
+
+        self._buffered += 1
+        self.rows_written += 1
+
+        if self._buffered >= self.batch_size:
+            self.flush()
+
+
+    def flush(self) -> None:
+        if not self._buffered:
+            return
+
+        self._writer.write_batch(self.pa.RecordBatch.from_pydict(self._buffer, schema=self.schema))
+        self._buffer = {column: [] for column in self.columns}
+        self._buffered = 0
+
+
+    def close(self) -> None:
+        self.flush()
+        self._writer.close()
+
+
+class ParquetSink(_ArrowSink):
+    '''
+    Description: This class writes rows to a Parquet file, one row group per batch_size rows.
+    '''
+    def _open_writer(self) -> object:
+        import pyarrow.parquet
+
+        return pyarrow.parquet.ParquetWriter(self.filename, self.schema)
+
+
+class ArrowSink(_ArrowSink):
+    '''
+    Description: This class writes rows to an Arrow IPC (Feather v2) file, one record batch per batch_size rows.
+    '''
+    def _open_writer(self) -> object:
+        return self.pa.ipc.new_file(self.filename, self.schema)
+
+
+# The sink used for each file extension.
+SINKS = {
+    '.csv': CsvSink,
+    '.xlsx': ExcelSink,
+    '.parquet': ParquetSink,
+    '.arrow': ArrowSink,
+    '.feather': ArrowSink,
+}
+
+
+def open_sink(filename: str, columns: list=COLUMNS) -> Sink:
+    """
+    Opens the sink matching a file's extension.
+
+    Args:
+        filename (str): The file to write.
+        columns (list, optional): The columns to write, in order. Defaults to COLUMNS.
+
+    Returns:
+        Sink: The sink writing to filename.
+
+    Raises:
+        ValueError: If the extension is not recognized.
+    """
+    for extension, sink in SINKS.items():
+        if filename.lower().endswith(extension):
+            return sink(filename, columns)
+
+    raise ValueError(f'Unrecognized output format: {filename}')
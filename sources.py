@@ -0,0 +1,117 @@
+'''Description: This file contains generators that stream (tconst, cast) rows out of the title lists StarScraper
+reads, without loading the whole file into memory.'''
+import csv
+import gzip
+import itertools
+from typing import Generator
+import openpyxl
+
+# IMDb's TSV datasets mark missing values with a literal \N.
+MISSING = ('', '\\N', None)
+
+
+def read_rows(filename: str, start: int=0, stop: int=None) -> Generator:
+    """
+    Streams the rows of a title list, choosing the reader from the file extension.
+
+    Supported formats are Excel workbooks (.xlsx), CSV files (.csv) and IMDb-style TSV files, optionally gzipped
+    (.tsv, .tsv.gz).  The first row must be a header with a 'tconst' column; a 'cast' column holding a
+    comma-separated list of names is optional.
+
+    Args:
+        filename (str): The file to read.
+        start (int, optional): The number of data rows to skip. Defaults to 0.
+        stop (int, optional): The data row to stop before. Defaults to None (the end of the file).
+
+    Yields:
+        tuple: The tconst and the list of cast names of each row.
+
+    Raises:
+        ValueError: If the file extension is not recognized, or the file has no tconst column.
+    """
+    rows = _raw_rows(filename)
+
+    # The first row the readers yield is the header; we'll use it to find the columns we need.
+    header = [str(column).strip() if column is not None else '' for column in next(rows, [])]
+    if 'tconst' not in header:
+        rows.close()
+        raise ValueError(f'{filename} has no tconst column.')
+
+    tconst_col = header.index('tconst')
+    cast_col = header.index('cast') if 'cast' in header else None
+
+    try:
+        for row in itertools.islice(rows, start, stop):
+            tconst = row[tconst_col] if tconst_col < len(row) else None
+            if tconst in MISSING:
+                continue
+
+            cast = row[cast_col] if cast_col is not None and cast_col < len(row) else None
+            yield str(tconst), str(cast).split(', ') if cast not in MISSING else []
+    finally:
+        rows.close()
+
+
+def count_rows(filename: str) -> int:
+    """
+    Counts the data rows of a title list, the rows that read_rows' start and stop index.
+
+    Args:
+        filename (str): The file to read.
+
+    Returns:
+        int: The number of rows after the header.
+    """
+    rows = _raw_rows(filename)
+    try:
+        return max(0, sum(1 for _ in rows) - 1)
+    finally:
+        rows.close()
+
+
+def batched(rows: Generator, size: int) -> Generator:
+    """
+    Groups a stream of rows into lists of at most size rows.
+
+    Args:
+        rows (Generator): The rows to group.
+        size (int): The number of rows per batch.
+
+    Yields:
+        list: The next batch of rows.  Only the last batch may be shorter than size.
+    """
+    rows = iter(rows)
+    while batch := list(itertools.islice(rows, size)):
+        yield batch
+
+
+def _raw_rows(filename: str) -> Generator:
+    # Choose the reader from the file extension; the first row it yields is the header.
+    name = filename.lower()
+
+    if name.endswith(('.xlsx', '.xlsm')):
+        return _xlsx_rows(filename)
+    elif name.endswith('.csv'):
+        return _delimited_rows(open(filename, newline='', encoding='utf-8'), ',')
+    elif name.endswith(('.tsv.gz', '.gz')):
+        return _delimited_rows(gzip.open(filename, 'rt', newline='', encoding='utf-8'), '\t')
+    elif name.endswith('.tsv'):
+        return _delimited_rows(open(filename, newline='', encoding='utf-8'), '\t')
+
+    raise ValueError(f'Unrecognized title list format: {filename}')
+
+
+def _xlsx_rows(filename: str) -> Generator:
+    # Read-only mode streams the sheet's XML rather than building every cell in memory.
+    workbook = openpyxl.load_workbook(filename, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _delimited_rows(file, delimiter: str) -> Generator:
+    # IMDb's TSVs aren't quoted, and titles can contain stray quote characters, so quoting is off for tabs.
+    quoting = csv.QUOTE_NONE if delimiter == '\t' else csv.QUOTE_MINIMAL
+    with file:
+        yield from csv.reader(file, delimiter=delimiter, quoting=quoting)
@@ -0,0 +1,144 @@
+'''Description: This file tests the WebDriverPool with a fake factory in place of Firefox: the cap on running
+browsers, reuse, recycling after max_pages or past max_rss, and replacing a browser that crashed.  Run it with
+`python -m unittest test_drivers` or `python -m pytest test_drivers.py`.'''
+import os
+import threading
+import unittest
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from drivers import WebDriverPool
+
+
+class FakeDriver:
+    '''
+    Description: This class stands in for a webdriver; it only records whether it was quit.
+    '''
+    def __init__(self, pid: int=None) -> None:
+        self.quit_called = False
+        self.capabilities = {'moz:processID': pid} if pid is not None else {}
+
+    def quit(self) -> None:
+        self.quit_called = True
+
+
+class WebDriverPoolTest(unittest.TestCase):
+    def setUp(self) -> None:
+        # The drivers the factory has made, and the process id they report.
+        self.made = []
+        self.pid = None
+
+    def pool(self, **kwargs) -> WebDriverPool:
+        def factory() -> FakeDriver:
+            self.made.append(FakeDriver(self.pid))
+            return self.made[-1]
+
+        pool = WebDriverPool(factory, **kwargs)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_no_browser_is_started_until_one_is_leased(self) -> None:
+        pool = self.pool()
+        self.assertEqual(self.made, [])
+
+        with pool.driver():
+            pass
+        self.assertEqual(len(self.made), 1)
+
+    def test_idle_browsers_are_reused(self) -> None:
+        pool = self.pool(max_drivers=2)
+
+        for _ in range(3):
+            with pool.driver() as driver:
+                pass
+
+        self.assertEqual(self.made, [driver])
+        self.assertEqual(pool.started, 1)
+
+    def test_the_cap_holds_leases_until_a_browser_is_released(self) -> None:
+        pool = self.pool(max_drivers=2)
+        first, second = pool.acquire(), pool.acquire()
+
+        leased = []
+        waiter = threading.Thread(target=lambda: leased.append(pool.acquire()))
+        waiter.start()
+        waiter.join(0.2)
+
+        # A third browser would go over the cap, so the lease waits.
+        self.assertTrue(waiter.is_alive())
+        self.assertEqual(pool.started, 2)
+
+        pool.release(first)
+        waiter.join(1)
+        self.assertEqual(leased, [first])
+        self.assertEqual(pool.started, 2)
+
+        for driver in (second, first):
+            pool.release(driver)
+
+    def test_browsers_are_recycled_after_max_pages(self) -> None:
+        pool = self.pool(max_pages=2)
+
+        for _ in range(2):
+            with pool.driver() as first:
+                pass
+
+        self.assertTrue(first.quit_called)
+        self.assertEqual(pool.recycled, 1)
+
+        with pool.driver() as second:
+            pass
+        self.assertIsNot(second, first)
+        self.assertEqual(pool.started, 2)
+
+    def test_browsers_are_recycled_past_max_rss(self) -> None:
+        # The fake browser reports this process as its own, which holds far more than a thousandth of a MiB.
+        self.pid = os.getpid()
+        pool = self.pool(max_pages=0, max_rss=0.001)
+
+        with pool.driver() as first:
+            pass
+
+        self.assertTrue(first.quit_called)
+        self.assertEqual(pool.recycled, 1)
+        self.assertEqual(pool.running(), [])
+
+    def test_a_crashed_browser_is_replaced(self) -> None:
+        pool = self.pool()
+
+        with self.assertRaises(WebDriverException):
+            with pool.driver() as crashed:
+                raise WebDriverException('browser crashed')
+
+        self.assertTrue(crashed.quit_called)
+        # A crash isn't counted as a recycle.
+        self.assertEqual(pool.recycled, 0)
+
+        with pool.driver() as replacement:
+            pass
+        self.assertIsNot(replacement, crashed)
+        self.assertEqual(pool.started, 2)
+
+    def test_a_timeout_keeps_the_browser(self) -> None:
+        pool = self.pool()
+
+        with self.assertRaises(TimeoutException):
+            with pool.driver() as driver:
+                raise TimeoutException('fragment never appeared')
+
+        self.assertFalse(driver.quit_called)
+        with pool.driver() as again:
+            pass
+        self.assertIs(again, driver)
+
+    def test_close_quits_idle_browsers_and_refuses_leases(self) -> None:
+        pool = self.pool()
+        with pool.driver() as driver:
+            pass
+
+        pool.close()
+        self.assertTrue(driver.quit_called)
+        with self.assertRaises(RuntimeError):
+            pool.acquire()
+
+
+if __name__ == '__main__':
+    unittest.main()
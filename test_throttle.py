@@ -0,0 +1,126 @@
+'''Description: This file tests the HostScheduler against a local stub server that answers with scripted statuses,
+so the backoff on 429 and 503, the Retry-After pause and the ramp back up are checked over real HTTP.  Run it with
+`python -m unittest test_throttle` or `python -m pytest test_throttle.py`.'''
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+import unittest
+from fetchers import HttpFetcher
+from retry import ThrottledError
+from throttle import HostScheduler
+
+
+class StubServer(ThreadingHTTPServer):
+    '''
+    Description: This class answers each request with the next scripted (status, headers), and with a plain 200
+    once the script runs out.
+    '''
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.site = f'http://127.0.0.1:{self.server_port}'
+        self.script = []
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self) -> None:
+        status, headers = self.server.script.pop(0) if self.server.script else (200, {})
+        body = b'<div class="starmeter-content">1</div>' if status == 200 else b''
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class HostSchedulerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = StubServer()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self) -> None:
+        # Throttling empties the bucket, so the rates are high enough that refilling it doesn't slow the tests down,
+        # and a pause the server doesn't ask for is long enough to notice.
+        self.scheduler = HostScheduler(rate=40.0, min_rate=5.0, max_rate=80.0, burst=100, increase=5.0,
+                                       decrease=0.5, backoff=60)
+        self.fetcher = HttpFetcher(pool_size=1, timeout=5, scheduler=self.scheduler)
+        self.url = f'{self.server.site}/name/nm0000001/'
+        self.server.script = []
+
+    def fetch(self, status: int=200, headers: dict=None) -> None:
+        # Fetches the URL with the next response scripted; throttling responses raise, as the retry policy expects.
+        self.server.script.append((status, headers or {}))
+        try:
+            self.fetcher.fetch(self.url, '.starmeter-content')
+        except ThrottledError:
+            self.assertIn(status, (429, 503))
+
+    def rate(self) -> float:
+        return self.scheduler.rates()[self.server.site.removeprefix('http://')]
+
+    def pause(self) -> float:
+        bucket = self.scheduler.buckets[self.server.site.removeprefix('http://')]
+        return bucket.paused_until - time.monotonic()
+
+    def test_throttling_halves_the_rate(self) -> None:
+        self.fetch(429, {'Retry-After': '0'})
+        self.assertEqual(self.rate(), 20.0)
+
+        self.fetch(503, {'Retry-After': '0'})
+        self.assertEqual(self.rate(), 10.0)
+
+        # The rate is never cut below min_rate.
+        for _ in range(3):
+            self.fetch(503, {'Retry-After': '0'})
+        self.assertEqual(self.rate(), 5.0)
+        self.assertEqual(self.scheduler.throttled, 5)
+
+    def test_retry_after_seconds_pauses_the_host(self) -> None:
+        self.fetch(429, {'Retry-After': '1'})
+        self.assertAlmostEqual(self.pause(), 1.0, delta=0.2)
+
+        # The next request to the host waits out the pause.
+        self.assertGreaterEqual(self.scheduler.acquire(self.url), 0.8)
+
+    def test_retry_after_date_pauses_the_host(self) -> None:
+        # An HTTP date has whole-second resolution, so the pause is between one and two seconds.
+        self.fetch(503, {'Retry-After': formatdate(time.time() + 2, usegmt=True)})
+        self.assertTrue(0.8 <= self.pause() <= 2.1, self.pause())
+
+        self.assertGreaterEqual(self.scheduler.acquire(self.url), 0.8)
+
+    def test_missing_retry_after_uses_the_backoff(self) -> None:
+        self.fetch(429)
+        self.assertAlmostEqual(self.pause(), 60, delta=1)
+
+    def test_successes_ramp_the_rate_back_up(self) -> None:
+        self.fetch(429, {'Retry-After': '0'})
+        self.assertEqual(self.rate(), 20.0)
+
+        # Each success adds increase, until max_rate.
+        for expected in (25.0, 30.0, 35.0):
+            self.fetch()
+            self.assertEqual(self.rate(), expected)
+
+        for _ in range(20):
+            self.fetch()
+        self.assertEqual(self.rate(), 80.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+'''Description: This file creates a HostScheduler class that paces requests to each host with a token bucket,
+backing off when the host signals throttling and ramping back up while requests succeed.'''
+from email.utils import parsedate_to_datetime
+import threading
+import time
+from urllib.parse import urlsplit
+
+# The response statuses a host uses to tell us to slow down.
+THROTTLE_STATUSES = (429, 503)
+
+
+class TokenBucket:
+    '''
+    Description: This class holds the pacing state of one host.
+    '''
+    def __init__(self, rate: float, burst: float) -> None:
+        """
+        Initializes a full TokenBucket object.
+
+        Args:
+            rate (float): The number of tokens added per second.
+            burst (float): The maximum number of tokens held.
+
+        Attributes:
+            rate (float): The number of tokens added per second.
+            burst (float): The maximum number of tokens held.
+            tokens (float): The number of tokens currently held.
+            updated (float): The monotonic time tokens was last brought up to date.
+            paused_until (float): The monotonic time before which no tokens are handed out.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+
+    def take(self, now: float) -> float:
+        """
+        Takes a token if one is available.
+
+        Args:
+            now (float): The current monotonic time.
+
+        Returns:
+            float: 0 if a token was taken, otherwise the number of seconds to wait before trying again.
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if now < self.paused_until:
+            return self.paused_until - now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+
+        return (1 - self.tokens) / self.rate
+
+
+class HostScheduler:
+    '''
+    Description: This class paces requests per host.  Each host's rate is cut multiplicatively when it returns a
+    throttling status and raised additively after each success, between min_rate and max_rate.  One scheduler is
+    meant to be shared by every worker, so the limit applies to the run as a whole.
+    '''
+    def __init__(self, rate: float=2.0, min_rate: float=0.1, max_rate: float=8.0, burst: float=2.0,
+                 increase: float=0.05, decrease: float=0.5, backoff: float=30.0) -> None:
+        """
+        Initializes the HostScheduler object.
+
+        Args:
+            rate (float, optional): The starting requests per second for each host. Defaults to 2.0.
+            min_rate (float, optional): The lowest requests per second a host is cut to. Defaults to 0.1.
+            max_rate (float, optional): The highest requests per second a host is raised to. Defaults to 8.0.
+            burst (float, optional): The number of requests that may be made back to back. Defaults to 2.0.
+            increase (float, optional): The requests per second added after each success. Defaults to 0.05.
+            decrease (float, optional): The factor the rate is multiplied by when throttled. Defaults to 0.5.
+            backoff (float, optional): The seconds to pause a throttled host that sends no Retry-After header.
+                Defaults to 30.0.
+
+        Attributes:
+            buckets (dict): The TokenBucket of each host.
+            throttled (int): The number of throttling responses seen.
+        """
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase = increase
+        self.decrease = decrease
+        self.backoff = backoff
+        self.buckets = {}
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+
+    def _bucket(self, url: str) -> TokenBucket:
+        # Called with the lock held.
+        host = urlsplit(url).netloc
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(self.rate, self.burst)
+        return self.buckets[host]
+
+
+    def acquire(self, url: str) -> float:
+        """
+        Blocks until a request may be made to the URL's host.
+
+        Args:
+            url (str): The URL about to be requested.
+
+        Returns:
+            float: The number of seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                wait = self._bucket(url).take(time.monotonic())
+
+            if not wait:
+                return waited
+
+            # Sleep outside the lock so that requests to other hosts aren't held up.
+            time.sleep(wait)
+            waited += wait
+
+
+    def feedback(self, url: str, status: int, retry_after: str=None) -> None:
+        """
+        Adjusts the URL's host's rate after a response.
+
+        Args:
+            url (str): The URL that was requested.
+            status (int): The response status; any status other than a throttling one counts as a success.
+            retry_after (str, optional): The response's Retry-After header. Defaults to None.
+        """
+        with self._lock:
+            bucket = self._bucket(url)
+
+            if status in THROTTLE_STATUSES:
+                self.throttled += 1
+                bucket.rate = max(self.min_rate, bucket.rate * self.decrease)
+                bucket.tokens = 0
+                bucket.paused_until = max(bucket.paused_until, time.monotonic() + self._pause(retry_after))
+            else:
+                bucket.rate = min(self.max_rate, bucket.rate + self.increase)
+
+
+    def rates(self) -> dict:
+        """
+        Reports the current rate of each host.
+
+        Returns:
+            dict: The requests per second of each host.
+        """
+        with self._lock:
+            return {host: bucket.rate for host, bucket in self.buckets.items()}
+
+
+    def _pause(self, retry_after: str) -> float:
+        # Retry-After is either a number of seconds or an HTTP date.
+        if retry_after is None:
+            return self.backoff
+
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+
+        try:
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return self.backoff